@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Facility batch benchmark.
+
+Starts a mock PUMAPI server for each facility, with its own latency,
+and processes the newest final invoice of every facility with
+`threads._runProfile` one facility after another and then all at once
+with `threads._runBatch`:
+
+    python -m benchmarks.bench_batch --facilities 2 4 --latency 0.05
+
+The batch should take about as long as the slowest facility on its
+own rather than the sum of them.
+"""
+
+import argparse
+import io
+import os
+import tempfile
+import time
+from contextlib import ExitStack, redirect_stdout
+
+from ppms_invoice_client.ui import threads
+from ppms_invoice_client.ui.settings import Settings
+
+from .mock_pumapi import InvoiceGenerator, MockPumapi
+from .run import FACILITY_INFO
+
+
+def make_profiles(servers, folder):
+    """A Settings snapshot for each facility, each with its own folder"""
+    return {
+        "facility{}".format(i): Settings(
+            ppms_url=server.url, ppms_key="benchmark",
+            invoice_folder=os.path.join(folder, "facility{}".format(i)),
+            facility_code="NIC@KCL", facility_name=FACILITY_INFO["name"],
+        )
+        for i, server in enumerate(servers)
+    }
+
+
+def timed(func):
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func()
+        return result, time.perf_counter() - start
+
+
+def run(facilities, bcodes, sessions, latency):
+    with ExitStack() as stack:
+        # facility i answers (i + 1) times slower than the first
+        servers = [
+            stack.enter_context(MockPumapi(
+                InvoiceGenerator(bcodes, sessions), latency=latency * (i + 1)
+            ))
+            for i in range(facilities)
+        ]
+        sequential = {}
+        outputs = []
+        with tempfile.TemporaryDirectory() as folder:
+            for name, settings in make_profiles(servers, folder).items():
+                output, sequential[name] = timed(
+                    lambda: threads._runProfile(name, settings)
+                )
+                outputs.append(output)
+        with tempfile.TemporaryDirectory() as folder:
+            results, batch = timed(
+                lambda: threads._runBatch(make_profiles(servers, folder))
+            )
+    errors = [r["error"] for r in results.values() if "error" in r]
+    if errors:
+        raise RuntimeError("Batch failed: {}".format(errors))
+    items = [r["items"] for r in outputs + list(results.values())]
+    if any(n != bcodes for n in items):
+        raise RuntimeError("Fetched {} invoice items for {} account "
+                           "codes".format(items, bcodes))
+    return {
+        "facilities": facilities,
+        "slowest": max(sequential.values()),
+        "sequential": sum(sequential.values()),
+        "batch": batch,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--facilities", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--bcodes", type=int, default=50)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="seconds added to each PUMAPI response of "
+                             "the fastest facility")
+    args = parser.parse_args()
+
+    print("{:>11}{:>18}{:>18}{:>12}".format(
+        "facilities", "slowest alone s", "one by one s", "batch s"))
+    for n in args.facilities:
+        r = run(n, args.bcodes, args.sessions, args.latency)
+        print("{:>11}{:>18.3f}{:>18.3f}{:>12.3f}".format(
+            r["facilities"], r["slowest"], r["sequential"], r["batch"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of the email send pipeline.
+
+Invoices are sent through `send_email.send` to an in-memory mail
+transport with a configurable per-message latency, and the messages
+per second and per-message latency percentiles are reported:
+
+    python -m benchmarks.bench_email --recipients 10 100 1000 --latency 0.005
+
+Use `--folder` to write the messages to disk as .eml files as well.
+"""
+
+import argparse
+import io
+import statistics
+import time
+from contextlib import redirect_stdout
+
+from ppms_invoice_client.ui.models import InvoiceItem
+from ppms_invoice_client.utils.recipient import recipient_from_group
+from ppms_invoice_client.utils.mail_transport import SinkTransport
+from ppms_invoice_client.utils import send_email
+
+from .mock_pumapi import InvoiceGenerator
+from .run import EMAIL_SETTINGS
+
+
+class Timestamps:
+    """Stands in for the progress signal and records when each
+    message has been sent"""
+    def __init__(self):
+        self.times = []
+
+    def emit(self, event):
+        if event.completed:
+            self.times.append(time.perf_counter())
+
+
+def make_items(n, html_size):
+    generator = InvoiceGenerator(bcodes=n)
+    html = "<p>{}</p>".format("x" * html_size)
+    items = []
+    for i in range(n):
+        group = recipient_from_group(generator.group_json(generator.group(i)))
+        group.bcode = generator.bcode(i)
+        item = InvoiceItem(group.bcode, group)
+        item.html = html
+        items.append(item)
+    return items
+
+
+def percentile(values, p):
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+def run(n, latency, html_size, folder=None):
+    items = make_items(n, html_size)
+    transport = SinkTransport(folder=folder, latency=latency)
+    timestamps = Timestamps()
+
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        send_email.send(
+            items, "PPMS2-NICatKings-20200101", EMAIL_SETTINGS,
+            progress=timestamps, transport=transport
+        )
+        elapsed = time.perf_counter() - start
+
+    times = [start] + timestamps.times
+    latencies = [b - a for a, b in zip(times, times[1:])]
+    return {
+        "recipients": n,
+        "sent": len(transport.sent),
+        "seconds": elapsed,
+        "rate": len(transport.sent) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "mean": statistics.mean(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--recipients", type=int, nargs="+",
+                        default=[10, 100, 1000])
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds each message takes to send")
+    parser.add_argument("--html-size", type=int, default=20000,
+                        help="characters of html in each message")
+    parser.add_argument("--folder", help="also write messages to this folder")
+    args = parser.parse_args()
+
+    print("{:>10}{:>14}{:>12}{:>12}{:>12}{:>12}".format(
+        "messages", "messages/s", "p50 (ms)", "p95 (ms)", "p99 (ms)", "max (ms)"))
+    for n in args.recipients:
+        r = run(n, args.latency, args.html_size, args.folder)
+        print("{:>10}{:>14.1f}{:>12.2f}{:>12.2f}{:>12.2f}{:>12.2f}".format(
+            r["sent"], r["rate"], r["p50"] * 1000, r["p95"] * 1000,
+            r["p99"] * 1000, r["max"] * 1000))
+
+
+if __name__ == "__main__":
+    main()
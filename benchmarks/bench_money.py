@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Money formatting benchmark.
+
+Compares rounding and formatting the money columns of an invoice one
+value at a time, as the sessions and the invoice template used to,
+with the column-wise pass of `utils.money`:
+
+    python -m benchmarks.bench_money --rows 10000 100000 --accounts 1000
+
+The number of values each way rounds differently from exact decimal
+rounding of the amounts is also reported. Then the per account code
+totals are summed as floats and in whole pence, and the account codes
+whose total doesn't match the sum of its rounded sessions, as on the
+invoice, are counted.
+"""
+
+import argparse
+import math
+import time
+from decimal import Decimal, ROUND_CEILING, ROUND_HALF_UP
+
+import numpy as np
+import pandas as pd
+
+from ppms_invoice_client.utils import money
+
+
+def make_amounts(n, seed=0):
+    """Amounts in pounds with up to 3 decimal places, some negative"""
+    rng = np.random.default_rng(seed)
+    pence = rng.integers(-5000, 500000, n) / 100.0
+    return np.round(pence + rng.integers(0, 10, n) / 1000.0, 3)
+
+
+def per_value(amounts):
+    """The rounding of `round_final_amount` and `round(2, 'ceil')`"""
+    final = [
+        "{0:.2f}".format(int((a * 100) + 0.5) / float(100)) for a in amounts
+    ]
+    fees = [str(math.ceil(a * 100) / 100) for a in amounts]
+    total = 0.0
+    for a in amounts:
+        total += a
+    total = "{0:.2f}".format(int((total * 100) + 0.5) / float(100))
+    return final, fees, total
+
+
+def column_wise(amounts):
+    final = money.format_money(amounts, money.ROUND_HALF_UP)
+    fees = money.format_money(amounts, money.ROUND_CEILING)
+    total = money.format_pence([money.total_pence(amounts)])[0]
+    return final, fees, total
+
+
+def exact(amounts):
+    """Decimal rounding of the amounts as written, the reference"""
+    cent = Decimal("0.01")
+    decimals = [Decimal(repr(a)) for a in amounts]
+    final = [str(d.quantize(cent, rounding=ROUND_HALF_UP)) for d in decimals]
+    fees = [str(d.quantize(cent, rounding=ROUND_CEILING)) for d in decimals]
+    return final, fees
+
+
+def errors(values, reference):
+    """Values that differ from the reference as amounts"""
+    return sum(
+        Decimal(v) != Decimal(r) for v, r in zip(values, reference)
+    )
+
+
+def run(rows, repeat):
+    amounts = make_amounts(rows).tolist()
+    final, fees = exact(amounts)
+    results = []
+    for name, func in (("per value", per_value), ("column-wise", column_wise)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = func(amounts)
+        elapsed = (time.perf_counter() - start) / repeat
+        results.append({
+            "method": name,
+            "rows": rows,
+            "seconds": elapsed,
+            "final_errors": errors(result[0], final),
+            "fee_errors": errors(result[1], fees),
+        })
+    return results
+
+
+def float_totals(frame):
+    """Totals summed as floats and rounded, as the summary used to"""
+    totals = frame.groupby("Account number")["Final Amount"].sum()
+    return ["{0:.2f}".format(int((t * 100) + 0.5) / float(100))
+            for t in totals]
+
+
+def pence_totals(frame):
+    pence = frame.assign(Pence=money.to_pence(frame["Final Amount"]))
+    return money.format_pence(pence.groupby("Account number")["Pence"].sum())
+
+
+def run_totals(rows, accounts, repeat):
+    amounts = make_amounts(rows)
+    frame = pd.DataFrame({
+        "Account number": np.arange(rows) % accounts,
+        "Final Amount": amounts,
+    })
+    # what the invoice shows: the sum of each session rounded
+    rounded = frame.assign(Pence=money.to_pence(amounts))
+    invoices = money.format_pence(
+        rounded.groupby("Account number")["Pence"].sum()
+    )
+    results = []
+    for name, func in (("float sums", float_totals),
+                       ("pence sums", pence_totals)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            totals = func(frame)
+        elapsed = (time.perf_counter() - start) / repeat
+        results.append({
+            "method": name,
+            "rows": rows,
+            "seconds": elapsed,
+            "mismatches": sum(t != i for t, i in zip(totals, invoices)),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, nargs="+",
+                        default=[10000, 100000])
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print("{:>10}  {:<14}{:>10}{:>16}{:>14}".format(
+        "rows", "method", "ms", "amount errors", "fee errors"))
+    for n in args.rows:
+        for r in run(n, args.repeat):
+            print("{:>10}  {:<14}{:>10.1f}{:>16}{:>14}".format(
+                r["rows"], r["method"], r["seconds"] * 1000,
+                r["final_errors"], r["fee_errors"]))
+
+    print()
+    print("{:>10}  {:<14}{:>10}{:>30}".format(
+        "rows", "totals", "ms", "accounts not matching invoice"))
+    for n in args.rows:
+        for r in run_totals(n, args.accounts, args.repeat):
+            print("{:>10}  {:<14}{:>10.1f}{:>30}".format(
+                r["rows"], r["method"], r["seconds"] * 1000,
+                r["mismatches"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Invoice email payload size benchmark.
+
+Renders the invoice of one account code with a given number of
+sessions using the inline-styled template and the compact template,
+with every column and with the template dialog's default columns, and
+reports the size of the html, its gzip compressed size and the render
+time:
+
+    python -m benchmarks.bench_payload --sessions 100 2000
+"""
+
+import argparse
+import gzip
+import tempfile
+import time
+
+from ppms_invoice_client.ui import threads
+from ppms_invoice_client.utils.recipient import recipient_from_group
+
+from .mock_pumapi import InvoiceGenerator
+from .run import FACILITY_INFO, INVOICE_COLUMNS, MESSAGE_TEXT
+
+
+# the columns checked by default in the template dialog
+DEFAULT_COLUMNS = {
+    c: c in (
+        "session_chk", "user_chk", "type_chk", "system_chk", "date_chk",
+        "start_chk", "booked_chk", "final_amount_chk",
+    )
+    for c in INVOICE_COLUMNS
+}
+LAYOUTS = [
+    ("inline, all columns", INVOICE_COLUMNS),
+    ("compact, all columns", dict(INVOICE_COLUMNS, compact_layout=True)),
+    ("compact, default columns", dict(DEFAULT_COLUMNS, compact_layout=True)),
+]
+
+
+def make_item(sessions):
+    generator = InvoiceGenerator(bcodes=1, sessions=sessions)
+    ref = generator.invoice_refs(draft=False)[-1]
+    details = threads._parseInvoiceDetails(generator.invoice_details(ref))
+    bcode = generator.bcode(0)
+    group = recipient_from_group(generator.group_json(generator.group(0)))
+    item = threads._invoiceItem(bcode, details, group.for_bcode(bcode))
+    return ref, item
+
+
+def run(sessions, repeat):
+    ref, item = make_item(sessions)
+    folder = tempfile.mkdtemp()
+    results = []
+    for name, columns in LAYOUTS:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            html = threads._messageForBcode(
+                item, ref, folder, MESSAGE_TEXT, FACILITY_INFO, columns
+            )["html"]
+        elapsed = (time.perf_counter() - start) / repeat
+        data = html.encode("utf-8")
+        results.append({
+            "layout": name,
+            "sessions": sessions,
+            "bytes": len(data),
+            "gzip": len(gzip.compress(data)),
+            "seconds": elapsed,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, nargs="+",
+                        default=[100, 500, 2000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print("{:>10}  {:<26}{:>12}{:>12}{:>12}".format(
+        "sessions", "layout", "KB", "gzip KB", "render ms"))
+    for n in args.sessions:
+        for r in run(n, args.repeat):
+            print("{:>10}  {:<26}{:>12.1f}{:>12.1f}{:>12.1f}".format(
+                r["sessions"], r["layout"], r["bytes"] / 1024.0,
+                r["gzip"] / 1024.0, r["seconds"] * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Background render benchmark.
+
+Sends every account code of an invoice with `threads._sendEmail` to an
+in-memory mail transport, once rendering each invoice as it is sent
+and once with the invoices already rendered into a RenderCache, as the
+background render after a fetch leaves them. Reports how long sending
+takes to transmit its first message and to finish:
+
+    python -m benchmarks.bench_prerender --bcodes 50 200 --sessions 100
+"""
+
+import argparse
+import io
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+from ppms_invoice_client.ui import threads
+from ppms_invoice_client.ui.models import Invoice
+from ppms_invoice_client.utils.mail_transport import SinkTransport
+from ppms_invoice_client.utils.recipient import recipient_from_group
+from ppms_invoice_client.utils.render_cache import RenderCache
+
+from .mock_pumapi import InvoiceGenerator
+from .run import EMAIL_SETTINGS, FACILITY_INFO, INVOICE_COLUMNS, MESSAGE_TEXT
+
+
+class FirstMessage:
+    """Stands in for the progress signal and records when the first
+    message has been sent"""
+    def __init__(self):
+        self.time = None
+
+    def emit(self, event):
+        if event.stage == 'send' and self.time is None:
+            self.time = time.perf_counter()
+
+
+def send(invoice, folder, render_cache=None):
+    first = FirstMessage()
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        threads._sendEmail(
+            invoice.items, 0, invoice.ref, folder, MESSAGE_TEXT,
+            FACILITY_INFO, INVOICE_COLUMNS, EMAIL_SETTINGS,
+            transport=SinkTransport(), render_cache=render_cache,
+            progress_callback=first
+        )
+        elapsed = time.perf_counter() - start
+    return first.time - start, elapsed
+
+
+def make_invoice(bcodes, sessions):
+    """An Invoice with an item for every account code"""
+    generator = InvoiceGenerator(bcodes=bcodes, sessions=sessions)
+    ref = generator.invoice_refs(draft=False)[-1]
+    details = threads._parseInvoiceDetails(generator.invoice_details(ref))
+    invoice = Invoice(ref)
+    for i in range(bcodes):
+        bcode = generator.bcode(i)
+        group = recipient_from_group(generator.group_json(generator.group(i)))
+        invoice.append(threads._invoiceItem(
+            bcode, details[details['Account number'] == bcode],
+            group.for_bcode(bcode)
+        ))
+    return invoice
+
+
+def run(bcodes, sessions):
+    folder = tempfile.mkdtemp()
+    invoice = make_invoice(bcodes, sessions)
+    if len(invoice.items) != bcodes:
+        raise RuntimeError("Built {} invoice items for {} account "
+                           "codes".format(len(invoice.items), bcodes))
+    ref = invoice.ref
+
+    cache = RenderCache()
+    start = time.perf_counter()
+    for item in invoice.items:
+        threads._prerenderItem(
+            item, ref, folder, MESSAGE_TEXT, FACILITY_INFO,
+            INVOICE_COLUMNS, cache, cache.generation
+        )
+    prerender = time.perf_counter() - start
+
+    results = []
+    for name, render_cache in (("render on send", None),
+                               ("prerendered", cache)):
+        first, total = send(invoice, folder, render_cache)
+        results.append({
+            "method": name,
+            "bcodes": len(invoice.items),
+            "first": first,
+            "total": total,
+            "prerender": prerender if render_cache else 0.0,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--bcodes", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--sessions", type=int, default=100)
+    args = parser.parse_args()
+
+    print("{:>8}  {:<16}{:>18}{:>12}{:>20}".format(
+        "bcodes", "send", "first message s", "total s",
+        "background render s"))
+    for n in args.bcodes:
+        for r in run(n, args.sessions):
+            print("{:>8}  {:<16}{:>18.3f}{:>12.3f}{:>20.3f}".format(
+                r["bcodes"], r["method"], r["first"], r["total"],
+                r["prerender"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Process pool benchmark.
+
+Runs a consolidated finance export, which parses, sums and writes
+several invoices, on a thread as `threads.Worker` does and in the
+process pool `threads.ProcessWorker` uses. Meanwhile the main thread
+wakes every few milliseconds, as the GUI event loop would, and how
+late it wakes is reported as well as how long the export takes:
+
+    python -m benchmarks.bench_process --invoices 6 --bcodes 200 --sessions 100
+
+The invoices are archived in the snapshot store first and the mock
+PUMAPI stopped, so the export only does CPU work.
+"""
+
+import argparse
+import io
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+
+from ppms_invoice_client.ui import threads
+from ppms_invoice_client.utils.column_store import COLUMN_DIR
+from ppms_invoice_client.utils.process_pool import get_pool
+
+from .mock_pumapi import InvoiceGenerator, MockPumapi
+
+
+TICK = 0.005
+
+
+class Signals:
+    """Stands in for WorkerSignals, the events are not needed"""
+    class _Signal:
+        def emit(self, value):
+            pass
+
+    progress = _Signal()
+    custom_callback = _Signal()
+
+
+def archive(invoices, bcodes, sessions, folder):
+    """Fetch the final invoices into the snapshot store"""
+    generator = InvoiceGenerator(bcodes, sessions, months=invoices)
+    with MockPumapi(generator) as server:
+        url = server.url
+        refs = generator.invoice_refs(draft=False)
+        with redirect_stdout(io.StringIO()):
+            threads._writeConsolidated(url, "benchmark", refs, "X", folder)
+    return url, refs
+
+
+def ticks_while(job):
+    """Run `job` on a thread and tick on this one until it finishes.
+    Returns the seconds the job took and how late each tick was."""
+    thread = threading.Thread(target=job)
+    late = []
+    start = time.perf_counter()
+    thread.start()
+    while thread.is_alive():
+        before = time.perf_counter()
+        time.sleep(TICK)
+        late.append(time.perf_counter() - before - TICK)
+    thread.join()
+    return time.perf_counter() - start, late
+
+
+def run(invoices, bcodes, sessions, repeat):
+    folder = tempfile.mkdtemp()
+    url, refs = archive(invoices, bcodes, sessions, folder)
+    columns = os.path.join(folder, COLUMN_DIR)
+
+    def export(run_job):
+        # without the column store the invoices are parsed again
+        shutil.rmtree(columns, ignore_errors=True)
+        with redirect_stdout(io.StringIO()):
+            run_job(threads._writeConsolidated, url, "benchmark", refs,
+                    "X", folder)
+
+    start = time.perf_counter()
+    export(lambda *args: get_pool().run(Signals(), *args))
+    startup = time.perf_counter() - start
+
+    methods = (
+        ("thread", lambda *args: args[0](*args[1:])),
+        ("process pool", lambda *args: get_pool().run(Signals(), *args)),
+    )
+    results = []
+    for name, run_job in methods:
+        seconds, late = [], []
+        for _ in range(repeat):
+            elapsed, job_late = ticks_while(lambda: export(run_job))
+            seconds.append(elapsed)
+            late.extend(job_late)
+        late.sort()
+        results.append({
+            "method": name,
+            "seconds": statistics.median(seconds),
+            "p50": late[len(late) // 2],
+            "p99": late[int(len(late) * 0.99)],
+            "max": late[-1],
+        })
+    shutil.rmtree(folder, ignore_errors=True)
+    return startup, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--invoices", type=int, default=6)
+    parser.add_argument("--bcodes", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    startup, results = run(
+        args.invoices, args.bcodes, args.sessions, args.repeat
+    )
+    print("first job in the process pool, with startup: {:.2f}s".format(
+        startup))
+    print("{:<14}{:>10}{:>16}{:>16}{:>16}".format(
+        "export", "s", "tick late p50", "tick late p99", "tick late max"))
+    for r in results:
+        print("{:<14}{:>10.3f}{:>14.1f}ms{:>14.1f}ms{:>14.1f}ms".format(
+            r["method"], r["seconds"], r["p50"] * 1000, r["p99"] * 1000,
+            r["max"] * 1000))
+    get_pool().shutdown()
+
+
+if __name__ == "__main__":
+    main()
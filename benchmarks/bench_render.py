@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Session table render benchmark.
+
+Compares rendering the rows of the autonomous session table with a
+jinja loop, which checks every column setting and formats every value
+row by row as the invoice template used to, with
+`html_convert.render_rows`, which resolves the column settings once and
+fills in a pre-rendered row for each session:
+
+    python -m benchmarks.bench_render --sessions 1000 10000
+
+The time to render the whole invoice with `create_html` is also
+reported.
+"""
+
+import argparse
+import re
+import tempfile
+import time
+
+from jinja2 import Environment, FileSystemLoader
+
+from ppms_invoice_client.ui import threads
+from ppms_invoice_client.utils import html_convert
+from ppms_invoice_client.utils.invoice_schema import format_date
+from ppms_invoice_client.utils.money import format_amount
+
+from .bench_payload import DEFAULT_COLUMNS, make_item
+from .run import FACILITY_INFO, INVOICE_COLUMNS, MESSAGE_TEXT
+
+
+# the row macro's values as the template used to write them, with
+# the money rounding of `utils.money`
+JINJA_VALUES = {
+    "date": "session.date|session_date",
+    "initial_amount": "session.initial_amount|money('ceiling')",
+    "fee": "session.fee|money('ceiling')",
+    "final_amount": "session.round_final_amount()",
+}
+COLUMNS = [
+    ("all columns", INVOICE_COLUMNS),
+    ("default columns", DEFAULT_COLUMNS),
+]
+
+
+def jinja_loop_template():
+    """The autonomous row macro as a per-row jinja loop"""
+    environment = Environment(
+        autoescape=False,
+        loader=FileSystemLoader(html_convert.TEMPLATE_PATH),
+        trim_blocks=False)
+    environment.filters["session_date"] = format_date
+    environment.filters["money"] = format_amount
+    source = environment.loader.get_source(
+        environment, html_convert.ROW_TEMPLATE)[0]
+    body = re.search(
+        r"{% macro autonomous_row\(row, columns\) %}(.*?){% endmacro %}",
+        source, re.S).group(1)
+    body = re.sub(
+        r"row\.(\w+)",
+        lambda m: JINJA_VALUES.get(m.group(1), "session." + m.group(1)),
+        body)
+    return environment.from_string(
+        "{% for session in sessions %}" + body + "{% endfor %}")
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def run(sessions, repeat):
+    ref, item = make_item(sessions)
+    rows = item.filter_by_session_type("autonomous")
+    template = jinja_loop_template()
+    folder = tempfile.mkdtemp()
+    results = []
+    for name, columns in COLUMNS:
+        html_convert._row_formats.clear()
+        before, loop_time = timed(
+            lambda: template.render(sessions=rows, columns=columns), repeat)
+        after, rows_time = timed(
+            lambda: html_convert.render_rows(
+                "autonomous_row", rows, columns), repeat)
+        if before != after:
+            raise AssertionError("render_rows differs from the jinja loop")
+        _, invoice_time = timed(
+            lambda: threads._messageForBcode(
+                item, ref, folder, MESSAGE_TEXT, FACILITY_INFO, columns),
+            repeat)
+        results.append({
+            "columns": name,
+            "sessions": len(rows),
+            "jinja_loop": loop_time,
+            "render_rows": rows_time,
+            "invoice": invoice_time,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, nargs="+",
+                        default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print("{:>10}  {:<18}{:>14}{:>14}{:>10}{:>14}".format(
+        "sessions", "columns", "jinja loop ms", "rows ms", "speedup",
+        "invoice ms"))
+    for n in args.sessions:
+        for r in run(n, args.repeat):
+            print("{:>10}  {:<18}{:>14.1f}{:>14.1f}{:>9.1f}x{:>14.1f}".format(
+                r["sessions"], r["columns"], r["jinja_loop"] * 1000,
+                r["render_rows"] * 1000, r["jinja_loop"] / r["render_rows"],
+                r["invoice"] * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Finance voucher export benchmark.
+
+Compares building the whole voucher as a pandas DataFrame before
+writing it, as `_writeToExcel` used to, with streaming rows straight
+from the InvoiceItems, for each output format:
+
+    python -m benchmarks.bench_voucher --rows 100000
+
+Time and peak Python memory (from tracemalloc) are reported.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import pandas as pd
+
+from ppms_invoice_client.utils.voucher import (
+    VOUCHER_COLUMNS, VOUCHER_SHEET, voucher_rows, write_voucher
+)
+
+
+def make_items(n):
+    """Minimal stand-ins for InvoiceItems, enough for the voucher"""
+    return [
+        SimpleNamespace(
+            bcode="AC{0:06d}".format(i),
+            final_amount=round(10 + (i % 997) * 1.37, 2),
+            group=SimpleNamespace(heademail="head{}@example.ac.uk".format(i)),
+        )
+        for i in range(n)
+    ]
+
+
+def dataframe_export(path, items, facility_code, month, year):
+    """Build the voucher in memory as a DataFrame then write it"""
+    rows = list(voucher_rows(items, facility_code, month, year))
+    df = pd.DataFrame(rows, columns=VOUCHER_COLUMNS)
+    if path.endswith(".xlsx"):
+        df.to_excel(path, sheet_name=VOUCHER_SHEET, index=False)
+    elif path.endswith(".csv"):
+        df.to_csv(path, index=False)
+    else:
+        df.to_parquet(path, index=False)
+
+
+def streaming_export(path, items, facility_code, month, year):
+    write_voucher(path, voucher_rows(items, facility_code, month, year))
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=100000,
+                        help="voucher rows, two per invoice item")
+    parser.add_argument("--formats", nargs="+", default=["xlsx", "csv", "parquet"])
+    args = parser.parse_args()
+
+    items = make_items(args.rows // 2)
+    print("{:<10}{:<12}{:>10}{:>16}".format("format", "method", "time (s)", "peak (MB)"))
+    with tempfile.TemporaryDirectory() as folder:
+        for fmt in args.formats:
+            for name, func in [("dataframe", dataframe_export),
+                               ("streaming", streaming_export)]:
+                path = os.path.join(folder, "{}.{}".format(name, fmt))
+                try:
+                    elapsed, peak = measure(
+                        func, path, items, "NIC@KCL", "December", "2019"
+                    )
+                except ImportError as e:
+                    print("{:<10}{:<12}  skipped: {}".format(fmt, name, str(e).splitlines()[0]))
+                    continue
+                print("{:<10}{:<12}{:>10.2f}{:>16.1f}".format(
+                    fmt, name, elapsed, peak / 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+A local stand-in for the PPMS PUMAPI which serves synthetic invoices.
+
+Only the actions used by the client are implemented - `getinvoicelist`,
+`getinvoicedetails` and `getgroup` - and the responses mirror the format
+the client parses. Latency and errors can be injected to see how the
+client behaves with a slow or unreliable server.
+
+Run a server the app can be pointed at with:
+
+    python -m benchmarks.mock_pumapi --port 8080 --bcodes 50 --sessions 100
+
+and set the PPMS URL in the app to http://localhost:8080/pumapi/
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+FACILITY = "PPMS2-NICatKings-"
+
+AUTO_COLUMNS = [
+    "Reference", "Session Type", "User", "Account number", "Group",
+    "System Type", "System", "Date", "Start time", "Duration (booked)",
+    "Duration (used)", "Notes", "Fee", "Subsidy", "Rebate", "Final Amount",
+]
+TRAIN_COLUMNS = [
+    "Reference", "Session Type", "User", "Account number", "Group",
+    "System Type", "System", "Date", "Start time", "Duration",
+    "Final Amount",
+]
+SYSTEMS = [
+    ("Confocal", "Nikon A1R"),
+    ("Widefield", "Nikon Ti2"),
+    ("Super resolution", "Nikon N-SIM"),
+    ("Light sheet", "Zeiss Z1"),
+]
+
+
+class InvoiceGenerator:
+    """
+    Generates reproducible synthetic invoices.
+
+    Attributes
+    -----------
+    bcodes : int
+        Number of account codes on each invoice
+    sessions : int
+        Number of sessions charged to each account code
+    groups : int
+        Number of PPMS groups the account codes belong to, by default
+        one group per account code
+    mix : dict
+        Relative weights of the `autonomous`, `assisted` and
+        `training` session types
+    months : int
+        Number of final invoices in the invoice list, a draft for
+        the current month is always included
+    seed : int
+        Seed for the random number generator
+    """
+    def __init__(self, bcodes=20, sessions=50, groups=None, mix=None,
+                 months=12, seed=0):
+        self.bcodes = bcodes
+        self.sessions = sessions
+        self.groups = groups or bcodes
+        self.mix = mix or {"autonomous": 0.7, "assisted": 0.2, "training": 0.1}
+        self.months = months
+        self.seed = seed
+
+    def invoice_refs(self, draft):
+        """Invoice references, oldest first as PPMS lists them"""
+        if draft:
+            return [FACILITY + "20200101-DRAFT"]
+
+        refs = []
+        year, month = 2020, 1
+        for i in range(self.months):
+            month -= 1
+            if month == 0:
+                month = 12
+                year -= 1
+            refs.append(FACILITY + "{0}{1:02d}01".format(year, month))
+        return refs[::-1]
+
+    def bcode(self, i):
+        return "AC{0:05d}".format(i)
+
+    def group(self, i):
+        return "Group{0:04d}".format(i % self.groups)
+
+    def group_json(self, unitlogin):
+        group_id = unitlogin[len("Group"):]
+        group = {
+            "unitlogin": unitlogin,
+            "unitname": "Group {}".format(group_id),
+            "headname": "Head {}".format(group_id),
+            "heademail": "head{}@example.ac.uk".format(group_id),
+            "unitbcode": "",
+            "department": "Imaging",
+            "institution": "Example University",
+            "address": "1 Example Road|London",
+            "affiliation": "",
+            "ext": "false",
+            "active": "true",
+            "admname": "Admin {}".format(group_id),
+            "admemail": "admin{}@example.ac.uk".format(group_id),
+            "creationdate": "2015/01/01",
+        }
+        return json.dumps(group)
+
+    def sessions_for(self, ref):
+        """All sessions on an invoice split into autonomous/assisted
+        and training rows"""
+        rand = random.Random("{}-{}".format(self.seed, ref))
+        types = list(self.mix)
+        weights = [self.mix[t] for t in types]
+        start = datetime.strptime(ref[17:25], "%Y%m%d") - timedelta(days=28)
+
+        auto_rows = []
+        train_rows = []
+        n = 0
+        for b in range(self.bcodes):
+            for s in range(self.sessions):
+                n += 1
+                session_type = rand.choices(types, weights)[0]
+                system_type, system = rand.choice(SYSTEMS)
+                date = start + timedelta(days=rand.randrange(28))
+                row = {
+                    "Reference": n,
+                    "Session Type": session_type,
+                    "User": "User {}".format(rand.randrange(10 * self.bcodes)),
+                    "Account number": self.bcode(b),
+                    "Group": self.group(b),
+                    "System Type": system_type,
+                    "System": system,
+                    "Date": date.strftime("%d/%m/%Y"),
+                    "Start time": "{:02d}:00".format(rand.randrange(8, 18)),
+                }
+                booked = rand.randrange(30, 480, 30)
+                amount = round(booked / 60.0 * 25.0, 2)
+                if session_type == "training":
+                    row["Duration"] = booked
+                    row["Final Amount"] = amount
+                    train_rows.append(row)
+                else:
+                    fee = 10.0 if rand.random() < 0.05 else 0.0
+                    subsidy = round(amount * 0.1, 2) if rand.random() < 0.1 else 0.0
+                    row["Duration (booked)"] = booked
+                    row["Duration (used)"] = max(0, booked - rand.randrange(0, 60, 15))
+                    row["Notes"] = "cancelled too late" if fee else ""
+                    row["Fee"] = fee
+                    row["Subsidy"] = subsidy
+                    row["Rebate"] = subsidy
+                    row["Final Amount"] = round(amount + fee - subsidy, 2)
+                    auto_rows.append(row)
+        return auto_rows, train_rows
+
+    def invoice_details(self, ref, bcode=None):
+        """The invoice in the csv format returned by `getinvoicedetails`"""
+        auto_rows, train_rows = self.sessions_for(ref)
+        if bcode:
+            auto_rows = [r for r in auto_rows if r["Account number"] == bcode]
+            train_rows = [r for r in train_rows if r["Account number"] == bcode]
+
+        lines = ["Invoice details", ref]
+        if train_rows:
+            # the autonomous header directly follows the section title
+            # when both sections are present
+            lines = ["Invoice details for {}".format(ref)]
+        lines.append("Autonomous and assisted sessions")
+        lines.append(_csv_line(AUTO_COLUMNS))
+        lines.extend(_csv_line(r[c] for c in AUTO_COLUMNS) for r in auto_rows)
+        if train_rows:
+            lines.append("Training sessions")
+            lines.append(_csv_line(TRAIN_COLUMNS))
+            lines.extend(_csv_line(r[c] for c in TRAIN_COLUMNS) for r in train_rows)
+        return "\r\n".join(lines) + "\r\n"
+
+
+def _csv_line(values):
+    out = []
+    for v in values:
+        v = str(v)
+        if "," in v or '"' in v:
+            v = '"{}"'.format(v.replace('"', '""'))
+        out.append(v)
+    return ",".join(out)
+
+
+class MockPumapi:
+    """
+    A threaded HTTP server answering PUMAPI calls from an InvoiceGenerator.
+
+    Attributes
+    -----------
+    generator : InvoiceGenerator
+        Source of the invoices served
+    latency : float
+        Seconds added to every response
+    error_rate : float
+        Fraction of calls answered with an HTTP 500 error
+    calls : dict
+        Number of calls received for each action
+    """
+    def __init__(self, generator=None, host="127.0.0.1", port=0,
+                 latency=0.0, error_rate=0.0, seed=0):
+        self.generator = generator or InvoiceGenerator()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._details_cache = {}
+        self._server = ThreadingHTTPServer((host, port), _handler_for(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}/pumapi/".format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def respond(self, form):
+        """The status and body of the response to a PUMAPI call"""
+        action = form.get("action", "")
+        with self._lock:
+            self.calls[action] = self.calls.get(action, 0) + 1
+            fail = self._random.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            return 500, ""
+
+        if action == "getinvoicelist":
+            refs = self.generator.invoice_refs(form.get("draft") == "true")
+            return 200, "".join(r + "\r\n" for r in refs)
+        if action == "getinvoicedetails":
+            key = (form.get("invoiceid"), form.get("bcode"))
+            with self._lock:
+                if key not in self._details_cache:
+                    self._details_cache[key] = self.generator.invoice_details(*key)
+            return 200, self._details_cache[key]
+        if action == "getgroup":
+            return 200, self.generator.group_json(form.get("unitlogin", ""))
+        return 400, ""
+
+
+def _handler_for(mock):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length).decode("utf-8")
+            form = {k: v[0] for k, v in parse_qs(body).items()}
+            status, text = mock.respond(form)
+            payload = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--bcodes", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=50,
+                        help="sessions per account code")
+    parser.add_argument("--groups", type=int, default=None)
+    parser.add_argument("--mix", default="0.7,0.2,0.1",
+                        help="autonomous,assisted,training weights")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds added to each response")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    weights = [float(w) for w in args.mix.split(",")]
+    mix = dict(zip(["autonomous", "assisted", "training"], weights))
+    generator = InvoiceGenerator(args.bcodes, args.sessions, args.groups, mix)
+    mock = MockPumapi(generator, args.host, args.port,
+                      args.latency, args.error_rate)
+    print("Serving PUMAPI at {}".format(mock.url))
+    try:
+        mock._server.serve_forever()
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end throughput benchmarks for the invoice client.
+
+Every stage of a monthly run is timed against a local mock PUMAPI server
+and an in-memory mail transport at several invoice sizes:
+
+    python -m benchmarks.run --scales 10x10 50x100 200x200 --repeat 3
+
+Scales are given as `<account codes>x<sessions per account code>`. Use
+`--output` to save the results as json so runs can be compared and
+`--spans` to break each stage down by the timing spans recorded inside it.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import io
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+from ppms_invoice_client.ui import threads
+from ppms_invoice_client.utils.mail_transport import SinkTransport
+from ppms_invoice_client.utils.metrics import Recorder, set_recorder
+
+from .mock_pumapi import InvoiceGenerator, MockPumapi
+
+
+FACILITY_INFO = {
+    "name": "Nikon Imaging Centre",
+    "email": "nic@example.ac.uk",
+    "manager_name": "Manager",
+    "manager_email": "manager@example.ac.uk",
+}
+INVOICE_COLUMNS = {
+    c: True for c in [
+        "session_chk", "user_chk", "type_chk", "system_chk", "date_chk",
+        "start_chk", "booked_chk", "used_chk", "notes_chk",
+        "init_amount_chk", "fees_chk",
+        "final_amount_chk",
+    ]
+}
+EMAIL_SETTINGS = {
+    "username": "user",
+    "password": "password",
+    "server": "localhost",
+    "from_address": "nic@example.ac.uk",
+    "test_mode": False,
+    "test_address": "",
+    "copy_manager": True,
+    "manager_address": "manager@example.ac.uk",
+}
+MESSAGE_TEXT = "Charges for {MONTH} {YEAR} from {F_NAME}.\nContact {M_NAME}."
+
+
+def timeit(func, repeat, errors=None, stage=None):
+    """
+    Run `func` `repeat` times and return the timings of the successful
+    runs and the last result. Failed runs are counted in `errors`.
+    """
+    timings = []
+    result = None
+    for i in range(repeat):
+        # the thread functions print progress, keep the report readable
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            try:
+                result = func()
+            except Exception:
+                if errors is None:
+                    raise
+                errors[stage] = errors.get(stage, 0) + 1
+                continue
+            timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def run_scale(bcodes, sessions, repeat, latency, error_rate, folder,
+              spans=False):
+    generator = InvoiceGenerator(bcodes, sessions)
+    recorder = Recorder() if spans else None
+    set_recorder(recorder)
+    results = {}
+    errors = {}
+    with MockPumapi(generator, latency=latency, error_rate=error_rate) as server:
+        url = server.url
+        key = "benchmark"
+
+        results["connect"], refs = timeit(
+            lambda: threads._connect(url, key), repeat, errors, "connect"
+        )
+        if refs is None:
+            raise RuntimeError("Every connect failed, lower --error-rate")
+        ref = refs[0]
+
+        results["fetch"], invoice = timeit(
+            lambda: threads._fetchInvoice(url, key, ref), repeat, errors, "fetch"
+        )
+        if invoice is None:
+            raise RuntimeError("Every fetch failed, lower --error-rate")
+        if len(invoice.items) != bcodes:
+            raise RuntimeError("Fetched {} invoice items for {} account "
+                               "codes".format(len(invoice.items), bcodes))
+
+        def render():
+            for item in invoice.items:
+                threads._messageForBcode(
+                    item, ref, folder, MESSAGE_TEXT,
+                    FACILITY_INFO, INVOICE_COLUMNS
+                )
+        results["render"], _ = timeit(render, repeat)
+
+        def excel():
+            os.makedirs(os.path.join(folder, invoice.invoice_date["invoice_year"]),
+                        exist_ok=True)
+            threads._writeToExcel(ref, invoice, "NIC@KCL", folder)
+        results["excel"], _ = timeit(excel, repeat)
+
+        def send():
+            threads._sendEmail(
+                invoice.items, 0, ref, folder, MESSAGE_TEXT,
+                FACILITY_INFO, INVOICE_COLUMNS, EMAIL_SETTINGS,
+                transport=SinkTransport()
+            )
+        results["send"], _ = timeit(send, repeat)
+
+        calls = dict(server.calls)
+
+    set_recorder(None)
+    n_sessions = sum(len(item.sessions) for item in invoice.items)
+    return {
+        "bcodes": bcodes,
+        "sessions_per_bcode": sessions,
+        "items": len(invoice.items),
+        "sessions": n_sessions,
+        "pumapi_calls": calls,
+        "errors": errors,
+        "timings": results,
+        "spans": recorder.summary() if recorder else {},
+    }
+
+
+def report(result):
+    print("\n{bcodes} account codes x {sessions_per_bcode} sessions "
+          "({items} invoice items, {sessions} sessions)".format(**result))
+    print("{:<10}{:>12}{:>12}{:>12}{:>16}".format(
+        "stage", "min (s)", "median (s)", "max (s)", "sessions/s"))
+    for stage, timings in result["timings"].items():
+        if not timings:
+            continue
+        best = min(timings)
+        rate = result["sessions"] / best if best else float("inf")
+        print("{:<10}{:>12.4f}{:>12.4f}{:>12.4f}{:>16.0f}".format(
+            stage, best, statistics.median(timings), max(timings), rate))
+    if result["errors"]:
+        print("failed runs: {}".format(result["errors"]))
+    if result["spans"]:
+        print("\n{:<26}{:>8}{:>12}{:>12}{:>12}".format(
+            "span", "count", "total (s)", "p50 (ms)", "p95 (ms)"))
+        for name, s in result["spans"].items():
+            print("{:<26}{:>8}{:>12.4f}{:>12.2f}{:>12.2f}".format(
+                name, s["count"], s["total"], s["p50"] * 1000, s["p95"] * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scales", nargs="+", default=["10x10", "50x100", "200x200"],
+                        help="<account codes>x<sessions per account code>")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds added to each PUMAPI response")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of PUMAPI calls that fail")
+    parser.add_argument("--output", help="write the results to a json file")
+    parser.add_argument("--spans", action="store_true",
+                        help="record and report the timing spans of each stage")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for scale in args.scales:
+            bcodes, sessions = [int(n) for n in scale.split("x")]
+            result = run_scale(bcodes, sessions, args.repeat,
+                               args.latency, args.error_rate, folder,
+                               spans=args.spans)
+            report(result)
+            results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,10 @@ from .ui.main import Window
 
 if __name__ == '__main__':
     import sys
+    import multiprocessing
+    # the process pool for CPU-heavy jobs spawns this executable when
+    # the app is frozen
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     win = Window()
     win.show()
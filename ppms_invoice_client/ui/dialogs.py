@@ -11,6 +11,13 @@ from . import template_ui as template_UI
 from . import facility_ui as facility_UI
 from . import preview_ui as preview_UI
 from . import general_ui as general_UI
+from . import export_ui as export_UI
+from . import stats_ui as stats_UI
+from . import profiles_ui as profiles_UI
+from .models import SessionTableModel
+from ..utils import send_email
+from ..utils.attachments import pdf_available
+from ..utils.metrics import get_recorder
 
 
 
@@ -25,16 +32,19 @@ class PPMSDialog(QtWidgets.QDialog):
         self.ui = ppms_UI.Ui_Dialog()
         self.ui.setupUi(self)
 
-        self.ui.ppms_url.setText(self.parent.ppms_url)
-        self.ui.ppms_apikey.setText(self.parent.ppms_key)
+        settings = self.parent.settings
+        self.ui.ppms_url.setText(settings.ppms_url)
+        self.ui.ppms_apikey.setText(settings.ppms_key)
 
         self.ui.ppms_ok.clicked.connect(self.okClicked)
         self.ui.ppms_cancel.clicked.connect(self.cancelClicked)
 
     @pyqtSlot()
     def okClicked(self):
-        self.parent.ppms_url = self.ui.ppms_url.text()
-        self.parent.ppms_key = self.ui.ppms_apikey.text()
+        self.parent.updateSettings(
+            ppms_url=self.ui.ppms_url.text(),
+            ppms_key=self.ui.ppms_apikey.text(),
+        )
         self.close()
 
     @pyqtSlot()
@@ -45,7 +55,16 @@ class PPMSDialog(QtWidgets.QDialog):
 class EmailDialog(QtWidgets.QDialog):
     """
     A popup dialog holding settings required for sending email
-    using Microsoft exchange server."""
+    using Microsoft exchange server or SMTP."""
+
+    # settings value for each entry in the transport combo box
+    TRANSPORTS = ["exchange", "smtp"]
+    # and in the delivery combo box
+    DELIVERY = [
+        send_email.DELIVERY_AUTO, send_email.DELIVERY_INLINE,
+        send_email.DELIVERY_ATTACH,
+    ]
+
     def __init__(self, parent):
         super(EmailDialog, self).__init__(parent)
         self.parent = parent       
@@ -55,26 +74,61 @@ class EmailDialog(QtWidgets.QDialog):
         self.ui = email_UI.Ui_Dialog()
         self.ui.setupUi(self)
 
-        self.ui.exchange_username.setText(self.parent.exchange_username)
-        self.ui.exchange_password.setText(self.parent.exchange_password)
-        self.ui.smtp_server.setText(self.parent.smtp_server)
-        self.ui.from_email.setText(self.parent.from_email)
-        self.ui.test_chk.setChecked(self.parent.test_mode)
-        self.ui.test_address.setText(self.parent.test_address)
+        settings = self.parent.settings
+        self.ui.exchange_username.setText(settings.exchange_username)
+        self.ui.exchange_password.setText(settings.exchange_password)
+        self.ui.smtp_server.setText(settings.smtp_server)
+        self.ui.from_email.setText(settings.from_email)
+        if settings.mail_transport in self.TRANSPORTS:
+            self.ui.transport_combo.setCurrentIndex(
+                self.TRANSPORTS.index(settings.mail_transport)
+            )
+        self.ui.test_chk.setChecked(settings.test_mode)
+        self.ui.test_address.setText(settings.test_address)
+        if settings.delivery in self.DELIVERY:
+            self.ui.delivery_combo.setCurrentIndex(
+                self.DELIVERY.index(settings.delivery)
+            )
+        self.ui.attach_threshold.setValue(settings.attach_threshold_kb)
+        self.ui.pdf_chk.setChecked(settings.attach_pdf)
+        if not pdf_available():
+            self.ui.pdf_chk.setChecked(False)
+            self.ui.pdf_chk.setEnabled(False)
+            self.ui.pdf_chk.setToolTip(
+                "weasyprint isn't installed, so invoices can't be "
+                "attached as PDFs"
+            )
+        self.ui.delivery_combo.currentIndexChanged.connect(self.deliveryChanged)
+        self.deliveryChanged(self.ui.delivery_combo.currentIndex())
 
         self.ui.email_ok.clicked.connect(self.okClicked)
         self.ui.email_cancel.clicked.connect(self.cancelClicked)
 
     @pyqtSlot()
     def okClicked(self):
-        self.parent.exchange_username = self.ui.exchange_username.text()
-        self.parent.exchange_password = self.ui.exchange_password.text()
-        self.parent.smtp_server = self.ui.smtp_server.text()
-        self.parent.from_email = self.ui.from_email.text()
-        self.parent.test_mode = self.ui.test_chk.isChecked()
-        self.parent.test_address = self.ui.test_address.text()
+        self.parent.updateSettings(
+            exchange_username=self.ui.exchange_username.text(),
+            exchange_password=self.ui.exchange_password.text(),
+            smtp_server=self.ui.smtp_server.text(),
+            from_email=self.ui.from_email.text(),
+            mail_transport=self.TRANSPORTS[
+                self.ui.transport_combo.currentIndex()
+            ],
+            test_mode=self.ui.test_chk.isChecked(),
+            test_address=self.ui.test_address.text(),
+            delivery=self.DELIVERY[self.ui.delivery_combo.currentIndex()],
+            attach_threshold_kb=self.ui.attach_threshold.value(),
+            attach_pdf=self.ui.pdf_chk.isChecked(),
+        )
         self.close()
 
+    @pyqtSlot(int)
+    def deliveryChanged(self, index):
+        """The threshold only applies when attaching automatically"""
+        self.ui.attach_threshold.setEnabled(
+            self.DELIVERY[index] == send_email.DELIVERY_AUTO
+        )
+
     @pyqtSlot()
     def cancelClicked(self):
         self.close()
@@ -93,38 +147,43 @@ class InvoiceTemplateDialog(QtWidgets.QDialog):
         self.ui = template_UI.Ui_Dialog()
         self.ui.setupUi(self)
 
-        self.ui.session_chk.setChecked(self.parent.session_chk)
-        self.ui.user_chk.setChecked(self.parent.user_chk)
-        self.ui.type_chk.setChecked(self.parent.type_chk)
-        self.ui.system_chk.setChecked(self.parent.system_chk)
-        self.ui.date_chk.setChecked(self.parent.date_chk)
-        self.ui.start_chk.setChecked(self.parent.start_chk)
-        self.ui.booked_chk.setChecked(self.parent.booked_chk)
-        self.ui.used_chk.setChecked(self.parent.used_chk)
-        self.ui.notes_chk.setChecked(self.parent.notes_chk)
-        self.ui.init_amount_chk.setChecked(self.parent.init_amount_chk)
-        self.ui.fees_chk.setChecked(self.parent.fees_chk)
-        self.ui.final_amount_chk.setChecked(self.parent.final_amount_chk)
-        self.ui.message_text.setPlainText(self.parent.message_text)
+        settings = self.parent.settings
+        self.ui.session_chk.setChecked(settings.session_chk)
+        self.ui.user_chk.setChecked(settings.user_chk)
+        self.ui.type_chk.setChecked(settings.type_chk)
+        self.ui.system_chk.setChecked(settings.system_chk)
+        self.ui.date_chk.setChecked(settings.date_chk)
+        self.ui.start_chk.setChecked(settings.start_chk)
+        self.ui.booked_chk.setChecked(settings.booked_chk)
+        self.ui.used_chk.setChecked(settings.used_chk)
+        self.ui.notes_chk.setChecked(settings.notes_chk)
+        self.ui.init_amount_chk.setChecked(settings.init_amount_chk)
+        self.ui.fees_chk.setChecked(settings.fees_chk)
+        self.ui.final_amount_chk.setChecked(settings.final_amount_chk)
+        self.ui.compact_chk.setChecked(settings.compact_layout)
+        self.ui.message_text.setPlainText(settings.message_text)
 
         self.ui.template_ok.clicked.connect(self.okClicked)
         self.ui.template_cancel.clicked.connect(self.cancelClicked)
 
     @pyqtSlot()
     def okClicked(self):
-        self.parent.session_chk = self.ui.session_chk.isChecked()
-        self.parent.user_chk = self.ui.user_chk.isChecked()
-        self.parent.type_chk = self.ui.type_chk.isChecked()
-        self.parent.system_chk = self.ui.system_chk.isChecked()
-        self.parent.date_chk = self.ui.date_chk.isChecked()
-        self.parent.start_chk = self.ui.start_chk.isChecked()
-        self.parent.booked_chk = self.ui.booked_chk.isChecked()
-        self.parent.used_chk = self.ui.used_chk.isChecked()
-        self.parent.notes_chk = self.ui.notes_chk.isChecked()
-        self.parent.init_amount_chk = self.ui.init_amount_chk.isChecked()
-        self.parent.fees_chk = self.ui.fees_chk.isChecked()
-        self.parent.final_amount_chk = self.ui.final_amount_chk.isChecked()
-        self.parent.message_text = self.ui.message_text.toPlainText()
+        self.parent.updateSettings(
+            session_chk=self.ui.session_chk.isChecked(),
+            user_chk=self.ui.user_chk.isChecked(),
+            type_chk=self.ui.type_chk.isChecked(),
+            system_chk=self.ui.system_chk.isChecked(),
+            date_chk=self.ui.date_chk.isChecked(),
+            start_chk=self.ui.start_chk.isChecked(),
+            booked_chk=self.ui.booked_chk.isChecked(),
+            used_chk=self.ui.used_chk.isChecked(),
+            notes_chk=self.ui.notes_chk.isChecked(),
+            init_amount_chk=self.ui.init_amount_chk.isChecked(),
+            fees_chk=self.ui.fees_chk.isChecked(),
+            final_amount_chk=self.ui.final_amount_chk.isChecked(),
+            compact_layout=self.ui.compact_chk.isChecked(),
+            message_text=self.ui.message_text.toPlainText(),
+        )
 
         self.close()
 
@@ -144,22 +203,25 @@ class FacilityDialog(QtWidgets.QDialog):
         self.ui = facility_UI.Ui_Dialog()
         self.ui.setupUi(self)
 
-        self.ui.facility_code.setText(self.parent.facility_code)
-        self.ui.facility_name.setText(self.parent.facility_name)
-        self.ui.facility_email.setText(self.parent.facility_email)
-        self.ui.manager_name.setText(self.parent.manager_name)
-        self.ui.manager_email.setText(self.parent.manager_email)
+        settings = self.parent.settings
+        self.ui.facility_code.setText(settings.facility_code)
+        self.ui.facility_name.setText(settings.facility_name)
+        self.ui.facility_email.setText(settings.facility_email)
+        self.ui.manager_name.setText(settings.manager_name)
+        self.ui.manager_email.setText(settings.manager_email)
 
         self.ui.facility_ok.clicked.connect(self.okClicked)
         self.ui.facility_cancel.clicked.connect(self.cancelClicked)
 
     @pyqtSlot()
     def okClicked(self):
-        self.parent.facility_code = self.ui.facility_code.text()
-        self.parent.facility_name = self.ui.facility_name.text()
-        self.parent.facility_email = self.ui.facility_email.text()
-        self.parent.manager_name = self.ui.manager_name.text()
-        self.parent.manager_email = self.ui.manager_email.text()
+        self.parent.updateSettings(
+            facility_code=self.ui.facility_code.text(),
+            facility_name=self.ui.facility_name.text(),
+            facility_email=self.ui.facility_email.text(),
+            manager_name=self.ui.manager_name.text(),
+            manager_email=self.ui.manager_email.text(),
+        )
         self.close()
 
     @pyqtSlot()
@@ -168,7 +230,14 @@ class FacilityDialog(QtWidgets.QDialog):
 
 
 class PreviewDialog(QtWidgets.QDialog):
-    """A popup dialog showing a preview of the invoice to be emailed"""
+    """
+    A popup dialog showing a preview of the invoice to be emailed.
+    The invoice tab only shows the first PAGE_ROWS sessions of each
+    session type, every session is listed in the sessions tab, which
+    loads them as they are scrolled to.
+    """
+    PAGE_ROWS = 100
+
     def __init__(self, parent, bcode, html=None):
         super(PreviewDialog, self).__init__(parent)
         self.parent = parent
@@ -176,6 +245,7 @@ class PreviewDialog(QtWidgets.QDialog):
         self.init_ui()
         item = parent.invoice.item_for_bcode(bcode)
         self.renderHTML(html, item.addresses)
+        self.showSessions(item.sessions)
 
     def init_ui(self):
         self.ui = preview_UI.Ui_Dialog()
@@ -212,11 +282,17 @@ class PreviewDialog(QtWidgets.QDialog):
             self.ui.piemail_edit.setText(to_email)
             cc_email = self._addressesToString(addresses['cc_email'])
             self.ui.ademail_edit.setText(cc_email)
-            self.ui.invoice_preview.insertHtml(html)
+            self.ui.invoice_preview.setHtml(html)
             self.ui.invoice_preview.verticalScrollBar().setValue(
                 self.ui.invoice_preview.verticalScrollBar().minimum()
             )
 
+    def showSessions(self, sessions):
+        self.sessions_model = SessionTableModel(sessions, parent=self)
+        self.ui.sessions_view.setModel(self.sessions_model)
+        # only the first batch of rows is loaded, so this is cheap
+        self.ui.sessions_view.resizeColumnsToContents()
+
     @pyqtSlot()
     def cancelClicked(self):
         self.close()
@@ -233,7 +309,13 @@ class GeneralDialog(QtWidgets.QDialog):
         self.ui = general_UI.Ui_Dialog()
         self.ui.setupUi(self)
 
-        self.ui.folder_edit.setText(self.parent.invoice_folder)
+        settings = self.parent.settings
+        self.ui.folder_edit.setText(settings.invoice_folder)
+        self.ui.csv_chk.setChecked(settings.export_csv)
+        self.ui.parquet_chk.setChecked(settings.export_parquet)
+        self.ui.timings_chk.setChecked(settings.record_timings)
+        self.ui.profile_chk.setChecked(settings.profile_jobs)
+        self.ui.prerender_chk.setChecked(settings.prerender)
 
         self.ui.folder_btn.clicked.connect(self.selectFolder)
         self.ui.general_ok.clicked.connect(self.okClicked)
@@ -246,10 +328,194 @@ class GeneralDialog(QtWidgets.QDialog):
 
     @pyqtSlot()
     def okClicked(self):
-        self.parent.invoice_folder = self.ui.folder_edit.text()
+        self.parent.updateSettings(
+            invoice_folder=self.ui.folder_edit.text(),
+            export_csv=self.ui.csv_chk.isChecked(),
+            export_parquet=self.ui.parquet_chk.isChecked(),
+            record_timings=self.ui.timings_chk.isChecked(),
+            profile_jobs=self.ui.profile_chk.isChecked(),
+            prerender=self.ui.prerender_chk.isChecked(),
+        )
+        self.close()
+
+    @pyqtSlot()
+    def cancelClicked(self):
+        self.close()
+
+
+class ProfilesDialog(QtWidgets.QDialog):
+    """
+    A popup dialog for saving the settings of each facility as a
+    profile, switching between them and running several facilities
+    as a batch."""
+    def __init__(self, parent):
+        super(ProfilesDialog, self).__init__(parent)
+        self.parent = parent
+        self.init_ui()
+
+    def init_ui(self):
+        self.ui = profiles_UI.Ui_Dialog()
+        self.ui.setupUi(self)
+
+        self.listProfiles()
+
+        self.ui.profile_list.currentTextChanged.connect(self.ui.name_edit.setText)
+        self.ui.save_btn.clicked.connect(self.saveClicked)
+        self.ui.use_btn.clicked.connect(self.useClicked)
+        self.ui.delete_btn.clicked.connect(self.deleteClicked)
+        self.ui.run_btn.clicked.connect(self.runClicked)
+        self.ui.close_btn.clicked.connect(self.close)
+
+    def listProfiles(self):
+        """Fill the list with the profiles, all ticked for the batch"""
+        self.ui.profile_list.clear()
+        for name in sorted(self.parent.profiles):
+            item = QtWidgets.QListWidgetItem(name, self.ui.profile_list)
+            item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+            item.setCheckState(QtCore.Qt.Checked)
+
+    def selectedName(self):
+        item = self.ui.profile_list.currentItem()
+        return None if item is None else item.text()
+
+    @pyqtSlot()
+    def saveClicked(self):
+        name = self.ui.name_edit.text().strip()
+        if name:
+            self.parent.saveProfile(name)
+            self.listProfiles()
+
+    @pyqtSlot()
+    def useClicked(self):
+        name = self.selectedName()
+        if name is not None:
+            self.parent.useProfile(name)
+
+    @pyqtSlot()
+    def deleteClicked(self):
+        name = self.selectedName()
+        if name is not None:
+            self.parent.deleteProfile(name)
+            self.listProfiles()
+
+    @pyqtSlot()
+    def runClicked(self):
+        profile_list = self.ui.profile_list
+        names = [
+            profile_list.item(i).text() for i in range(profile_list.count())
+            if profile_list.item(i).checkState() == QtCore.Qt.Checked
+        ]
+        if names:
+            self.parent.runBatch(
+                names, send=self.ui.send_chk.isChecked(),
+                copy_manager=self.ui.copy_chk.isChecked()
+            )
+            self.close()
+
+
+class ExportDialog(QtWidgets.QDialog):
+    """
+    A popup dialog for choosing a range of invoices to include in a
+    consolidated finance export."""
+    def __init__(self, parent):
+        super(ExportDialog, self).__init__(parent)
+        self.parent = parent
+        self.init_ui()
+
+    def init_ui(self):
+        self.ui = export_UI.Ui_Dialog()
+        self.ui.setupUi(self)
+
+        # the reference combo lists the newest invoices first
+        combo = self.parent.ui.reference_combo
+        self.refs = [combo.itemText(i) for i in range(combo.count())]
+        self.ui.from_combo.addItems(self.refs[::-1])
+        self.ui.to_combo.addItems(self.refs[::-1])
+        self.ui.to_combo.setCurrentIndex(len(self.refs) - 1)
+
+        self.ui.export_ok.clicked.connect(self.okClicked)
+        self.ui.export_cancel.clicked.connect(self.cancelClicked)
+
+    @pyqtSlot()
+    def okClicked(self):
+        refs = self.refs[::-1]
+        start = self.ui.from_combo.currentIndex()
+        end = self.ui.to_combo.currentIndex()
+        if start > end:
+            start, end = end, start
+        if refs:
+            self.parent.consolidatedExport(
+                refs[start:end + 1], self.ui.per_period_chk.isChecked()
+            )
         self.close()
 
     @pyqtSlot()
     def cancelClicked(self):
         self.close()
 
+
+class StatsDialog(QtWidgets.QDialog):
+    """
+    A popup dialog showing the timings recorded for each stage,
+    refreshed while it is open."""
+    COLS = ["Stage", "Count", "Total (s)", "Mean (ms)",
+            "p50 (ms)", "p95 (ms)", "Max (ms)"]
+    REFRESH_MS = 1000
+
+    def __init__(self, parent):
+        super(StatsDialog, self).__init__(parent)
+        self.parent = parent
+        self.init_ui()
+
+    def init_ui(self):
+        self.ui = stats_UI.Ui_Dialog()
+        self.ui.setupUi(self)
+
+        self.ui.stats_table.setColumnCount(len(self.COLS))
+        self.ui.stats_table.setHorizontalHeaderLabels(self.COLS)
+        self.ui.stats_table.verticalHeader().setVisible(False)
+
+        self.ui.reset_btn.clicked.connect(self.resetClicked)
+        self.ui.save_btn.clicked.connect(self.saveClicked)
+        self.ui.close_btn.clicked.connect(self.close)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(self.REFRESH_MS)
+        self.refresh()
+
+    @pyqtSlot()
+    def refresh(self):
+        recorder = get_recorder()
+        self.ui.save_btn.setEnabled(recorder.enabled)
+        summary = recorder.summary()
+        table = self.ui.stats_table
+        table.setRowCount(len(summary))
+        for rid, (name, s) in enumerate(summary.items()):
+            values = [
+                name, str(s["count"]), "{:.3f}".format(s["total"]),
+                "{:.1f}".format(s["mean"] * 1000),
+                "{:.1f}".format(s["p50"] * 1000),
+                "{:.1f}".format(s["p95"] * 1000),
+                "{:.1f}".format(s["max"] * 1000),
+            ]
+            for cid, value in enumerate(values):
+                table.setItem(rid, cid, QtWidgets.QTableWidgetItem(value))
+        table.resizeColumnsToContents()
+
+    @pyqtSlot()
+    def resetClicked(self):
+        get_recorder().reset()
+        self.refresh()
+
+    @pyqtSlot()
+    def saveClicked(self):
+        paths = self.parent.writeTimings()
+        if paths:
+            self.parent.ui.statusbar.showMessage(
+                'Timings saved to {}'.format(paths[0])
+            )
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        return super().closeEvent(event)
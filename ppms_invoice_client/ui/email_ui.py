@@ -13,7 +13,7 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 class Ui_Dialog(object):
     def setupUi(self, Dialog):
         Dialog.setObjectName("Dialog")
-        Dialog.resize(359, 177)
+        Dialog.resize(359, 281)
         self.gridLayout = QtWidgets.QGridLayout(Dialog)
         self.gridLayout.setObjectName("gridLayout")
         self.label_5 = QtWidgets.QLabel(Dialog)
@@ -58,7 +58,7 @@ class Ui_Dialog(object):
         self.email_cancel = QtWidgets.QPushButton(Dialog)
         self.email_cancel.setObjectName("email_cancel")
         self.horizontalLayout_5.addWidget(self.email_cancel)
-        self.gridLayout.addLayout(self.horizontalLayout_5, 6, 0, 1, 3)
+        self.gridLayout.addLayout(self.horizontalLayout_5, 10, 0, 1, 3)
         self.test_address = QtWidgets.QLineEdit(Dialog)
         self.test_address.setObjectName("test_address")
         self.gridLayout.addWidget(self.test_address, 5, 2, 1, 1)
@@ -69,6 +69,39 @@ class Ui_Dialog(object):
         self.test_chk.setText("")
         self.test_chk.setObjectName("test_chk")
         self.gridLayout.addWidget(self.test_chk, 4, 2, 1, 1)
+        self.label_7 = QtWidgets.QLabel(Dialog)
+        self.label_7.setObjectName("label_7")
+        self.gridLayout.addWidget(self.label_7, 6, 0, 1, 1)
+        self.transport_combo = QtWidgets.QComboBox(Dialog)
+        self.transport_combo.setObjectName("transport_combo")
+        self.transport_combo.addItem("")
+        self.transport_combo.addItem("")
+        self.gridLayout.addWidget(self.transport_combo, 6, 2, 1, 1)
+        self.label_8 = QtWidgets.QLabel(Dialog)
+        self.label_8.setObjectName("label_8")
+        self.gridLayout.addWidget(self.label_8, 7, 0, 1, 1)
+        self.delivery_combo = QtWidgets.QComboBox(Dialog)
+        self.delivery_combo.setObjectName("delivery_combo")
+        self.delivery_combo.addItem("")
+        self.delivery_combo.addItem("")
+        self.delivery_combo.addItem("")
+        self.gridLayout.addWidget(self.delivery_combo, 7, 2, 1, 1)
+        self.label_9 = QtWidgets.QLabel(Dialog)
+        self.label_9.setObjectName("label_9")
+        self.gridLayout.addWidget(self.label_9, 8, 0, 1, 1)
+        self.attach_threshold = QtWidgets.QSpinBox(Dialog)
+        self.attach_threshold.setMinimum(1)
+        self.attach_threshold.setMaximum(102400)
+        self.attach_threshold.setProperty("value", 1024)
+        self.attach_threshold.setObjectName("attach_threshold")
+        self.gridLayout.addWidget(self.attach_threshold, 8, 2, 1, 1)
+        self.label_10 = QtWidgets.QLabel(Dialog)
+        self.label_10.setObjectName("label_10")
+        self.gridLayout.addWidget(self.label_10, 9, 0, 1, 1)
+        self.pdf_chk = QtWidgets.QCheckBox(Dialog)
+        self.pdf_chk.setText("")
+        self.pdf_chk.setObjectName("pdf_chk")
+        self.gridLayout.addWidget(self.pdf_chk, 9, 2, 1, 1)
 
         self.retranslateUi(Dialog)
         QtCore.QMetaObject.connectSlotsByName(Dialog)
@@ -84,3 +117,15 @@ class Ui_Dialog(object):
         self.email_ok.setText(_translate("Dialog", "OK"))
         self.email_cancel.setText(_translate("Dialog", "Cancel"))
         self.label_6.setText(_translate("Dialog", "Test mode"))
+        self.label_7.setText(_translate("Dialog", "Send using"))
+        self.transport_combo.setItemText(0, _translate("Dialog", "Microsoft Exchange"))
+        self.transport_combo.setItemText(1, _translate("Dialog", "SMTP"))
+        self.label_8.setText(_translate("Dialog", "Sessions"))
+        self.delivery_combo.setToolTip(_translate("Dialog", "Whether the sessions are in the body of the email or attached to a short summary"))
+        self.delivery_combo.setItemText(0, _translate("Dialog", "Attach when the email is large"))
+        self.delivery_combo.setItemText(1, _translate("Dialog", "Always in the email"))
+        self.delivery_combo.setItemText(2, _translate("Dialog", "Always attached"))
+        self.label_9.setText(_translate("Dialog", "Attach above"))
+        self.attach_threshold.setSuffix(_translate("Dialog", " KB"))
+        self.label_10.setText(_translate("Dialog", "Attach PDF"))
+        self.pdf_chk.setToolTip(_translate("Dialog", "Also attach the invoice as a PDF, needs weasyprint to be installed"))
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file 'ppms_invoice_client\ui\export.ui'
+#
+# Created by: PyQt5 UI code generator 5.14.0
+#
+# WARNING! All changes made in this file will be lost!
+
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+class Ui_Dialog(object):
+    def setupUi(self, Dialog):
+        Dialog.setObjectName("Dialog")
+        Dialog.resize(420, 150)
+        self.gridLayout = QtWidgets.QGridLayout(Dialog)
+        self.gridLayout.setObjectName("gridLayout")
+        self.label = QtWidgets.QLabel(Dialog)
+        self.label.setObjectName("label")
+        self.gridLayout.addWidget(self.label, 0, 0, 1, 1)
+        self.from_combo = QtWidgets.QComboBox(Dialog)
+        self.from_combo.setObjectName("from_combo")
+        self.gridLayout.addWidget(self.from_combo, 0, 1, 1, 1)
+        self.label_2 = QtWidgets.QLabel(Dialog)
+        self.label_2.setObjectName("label_2")
+        self.gridLayout.addWidget(self.label_2, 1, 0, 1, 1)
+        self.to_combo = QtWidgets.QComboBox(Dialog)
+        self.to_combo.setObjectName("to_combo")
+        self.gridLayout.addWidget(self.to_combo, 1, 1, 1, 1)
+        self.label_3 = QtWidgets.QLabel(Dialog)
+        self.label_3.setObjectName("label_3")
+        self.gridLayout.addWidget(self.label_3, 2, 0, 1, 1)
+        self.per_period_chk = QtWidgets.QCheckBox(Dialog)
+        self.per_period_chk.setText("")
+        self.per_period_chk.setObjectName("per_period_chk")
+        self.gridLayout.addWidget(self.per_period_chk, 2, 1, 1, 1)
+        self.horizontalLayout = QtWidgets.QHBoxLayout()
+        self.horizontalLayout.setObjectName("horizontalLayout")
+        spacerItem = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.horizontalLayout.addItem(spacerItem)
+        self.export_ok = QtWidgets.QPushButton(Dialog)
+        self.export_ok.setObjectName("export_ok")
+        self.horizontalLayout.addWidget(self.export_ok)
+        self.export_cancel = QtWidgets.QPushButton(Dialog)
+        self.export_cancel.setObjectName("export_cancel")
+        self.horizontalLayout.addWidget(self.export_cancel)
+        self.gridLayout.addLayout(self.horizontalLayout, 3, 0, 1, 2)
+
+        self.retranslateUi(Dialog)
+        QtCore.QMetaObject.connectSlotsByName(Dialog)
+
+    def retranslateUi(self, Dialog):
+        _translate = QtCore.QCoreApplication.translate
+        Dialog.setWindowTitle(_translate("Dialog", "Consolidated finance export"))
+        self.label.setText(_translate("Dialog", "From invoice"))
+        self.label_2.setText(_translate("Dialog", "To invoice"))
+        self.label_3.setText(_translate("Dialog", "One voucher per month"))
+        self.export_ok.setText(_translate("Dialog", "Export"))
+        self.export_cancel.setText(_translate("Dialog", "Cancel"))
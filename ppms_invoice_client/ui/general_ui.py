@@ -13,7 +13,7 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 class Ui_Dialog(object):
     def setupUi(self, Dialog):
         Dialog.setObjectName("Dialog")
-        Dialog.resize(618, 143)
+        Dialog.resize(618, 214)
         self.gridLayout = QtWidgets.QGridLayout(Dialog)
         self.gridLayout.setObjectName("gridLayout")
         self.label = QtWidgets.QLabel(Dialog)
@@ -25,19 +25,42 @@ class Ui_Dialog(object):
         self.folder_btn = QtWidgets.QPushButton(Dialog)
         self.folder_btn.setObjectName("folder_btn")
         self.gridLayout.addWidget(self.folder_btn, 0, 2, 1, 1)
+        self.label_2 = QtWidgets.QLabel(Dialog)
+        self.label_2.setObjectName("label_2")
+        self.gridLayout.addWidget(self.label_2, 1, 0, 1, 1)
+        self.horizontalLayout_2 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_2.setObjectName("horizontalLayout_2")
+        self.csv_chk = QtWidgets.QCheckBox(Dialog)
+        self.csv_chk.setObjectName("csv_chk")
+        self.horizontalLayout_2.addWidget(self.csv_chk)
+        self.parquet_chk = QtWidgets.QCheckBox(Dialog)
+        self.parquet_chk.setObjectName("parquet_chk")
+        self.horizontalLayout_2.addWidget(self.parquet_chk)
+        spacerItem = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.horizontalLayout_2.addItem(spacerItem)
+        self.gridLayout.addLayout(self.horizontalLayout_2, 1, 1, 1, 2)
+        self.timings_chk = QtWidgets.QCheckBox(Dialog)
+        self.timings_chk.setObjectName("timings_chk")
+        self.gridLayout.addWidget(self.timings_chk, 2, 1, 1, 2)
+        self.profile_chk = QtWidgets.QCheckBox(Dialog)
+        self.profile_chk.setObjectName("profile_chk")
+        self.gridLayout.addWidget(self.profile_chk, 3, 1, 1, 2)
+        self.prerender_chk = QtWidgets.QCheckBox(Dialog)
+        self.prerender_chk.setObjectName("prerender_chk")
+        self.gridLayout.addWidget(self.prerender_chk, 4, 1, 1, 2)
         self.horizontalLayout = QtWidgets.QHBoxLayout()
         self.horizontalLayout.setObjectName("horizontalLayout")
-        spacerItem = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
-        self.horizontalLayout.addItem(spacerItem)
+        spacerItem1 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.horizontalLayout.addItem(spacerItem1)
         self.general_ok = QtWidgets.QPushButton(Dialog)
         self.general_ok.setObjectName("general_ok")
         self.horizontalLayout.addWidget(self.general_ok)
         self.general_cancel = QtWidgets.QPushButton(Dialog)
         self.general_cancel.setObjectName("general_cancel")
         self.horizontalLayout.addWidget(self.general_cancel)
-        self.gridLayout.addLayout(self.horizontalLayout, 2, 0, 1, 3)
-        spacerItem1 = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
-        self.gridLayout.addItem(spacerItem1, 1, 1, 1, 1)
+        self.gridLayout.addLayout(self.horizontalLayout, 6, 0, 1, 3)
+        spacerItem2 = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
+        self.gridLayout.addItem(spacerItem2, 5, 1, 1, 1)
 
         self.retranslateUi(Dialog)
         QtCore.QMetaObject.connectSlotsByName(Dialog)
@@ -47,5 +70,12 @@ class Ui_Dialog(object):
         Dialog.setWindowTitle(_translate("Dialog", "Dialog"))
         self.label.setText(_translate("Dialog", "Invoice folder"))
         self.folder_btn.setText(_translate("Dialog", "..."))
+        self.label_2.setText(_translate("Dialog", "Also export finance voucher as"))
+        self.csv_chk.setText(_translate("Dialog", "CSV"))
+        self.parquet_chk.setText(_translate("Dialog", "Parquet"))
+        self.timings_chk.setText(_translate("Dialog", "Record timings"))
+        self.profile_chk.setText(_translate("Dialog", "Profile background jobs"))
+        self.prerender_chk.setToolTip(_translate("Dialog", "Render every invoice in the background once it is fetched, so sending starts straight away"))
+        self.prerender_chk.setText(_translate("Dialog", "Render invoices in the background"))
         self.general_ok.setText(_translate("Dialog", "OK"))
         self.general_cancel.setText(_translate("Dialog", "Cancel"))
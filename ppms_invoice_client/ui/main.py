@@ -12,11 +12,29 @@ from . import main_ui as UI
 from .dialogs import (
     PPMSDialog, EmailDialog,
     InvoiceTemplateDialog, FacilityDialog,
-    PreviewDialog, GeneralDialog
+    PreviewDialog, GeneralDialog, ExportDialog, StatsDialog, ProfilesDialog
 )
 from . import threads
+from ..utils.metrics import Recorder, get_recorder, set_recorder
+from ..utils import profiler
+from ..utils.aggregates import SUMMARY_MONEY_COLUMNS
+from ..utils.money import format_pence
+from ..utils.render_cache import RenderCache
+from ..utils.journal import journal_ref, open_journal
 from .progress import Progress
+from .settings import (
+    Settings, load_settings, save_settings, load_profiles, save_profiles
+)
+
 
+SESSION_TABLE_COLS = ["", "Account Number", "Group", "Sessions",
+                      "Hours booked", "Hours used",
+                      "Initial Amount", "Rebate", "Fees",
+                      "Final Amount", ""]
+TRAIN_TABLE_COLS = ["", "Account Number", "Group", "Sessions",
+                    "Hours booked", "Final Amount", ""]
+# threads rendering invoices in the background, see `prerenderInvoice`
+RENDER_THREADS = 2
 
 class Window(QtWidgets.QMainWindow):
     """The main GUI window."""
@@ -29,31 +47,18 @@ class Window(QtWidgets.QMainWindow):
         self.ui.setupUi(self)           
 
         # parameters
-        self.invoice_folder = ""
-        self.ppms_url = ""
-        self.ppms_key = ""
-        self.exchange_username = ""
-        self.exchange_password = ""
-        self.smtp_server = ""
-        self.from_email = ""
-        self.session_chk = False
-        self.user_chk = False
-        self.type_chk = False
-        self.system_chk = False
-        self.date_chk = False
-        self.start_chk = False
-        self.booked_chk = False
-        self.used_chk = False
-        self.notes_chk = False
-        self.init_amount_chk = False
-        self.fees_chk = False
-        self.final_amount_chk = False
-        self.message_text = ""
-        self.facility_name = ""
-        self.facility_email = ""
-        self.manager_name = ""
-        self.manager_email = ""
+        self.settings = Settings()
+        self.profiles = {}
+        self.prerender_key = None
         self.invoice = None    
+        self.received_lists = set()
+        self.first_fetch_started = False
+
+        # invoices rendered ahead of sending, on their own low
+        # priority pool so they don't hold up other jobs
+        self.render_cache = RenderCache()
+        self.render_pool = QtCore.QThreadPool()
+        self.render_pool.setMaxThreadCount(RENDER_THREADS)
 
         # settings
         self.restoreSettings()
@@ -64,7 +69,11 @@ class Window(QtWidgets.QMainWindow):
         self.ui.actionInvoice_template.triggered.connect(self.invoiceTemplateSettings)
         self.ui.actionFacility.triggered.connect(self.facilitySettings)
         self.ui.actionGeneral.triggered.connect(self.generalSettings)
+        self.ui.actionConsolidated.triggered.connect(self.exportSettings)
+        self.ui.actionTimings.triggered.connect(self.showTimings)
+        self.ui.actionProfiles.triggered.connect(self.profilesSettings)
         self.ui.connect_button.clicked.connect(self.connectClicked)
+        self.ui.refresh_button.clicked.connect(self.refreshClicked)
         self.ui.select_btn.clicked.connect(self.selectAll)
         self.ui.deselect_btn.clicked.connect(self.deselectAll)
         self.ui.reference_combo.currentIndexChanged.connect(self.referenceChanged)
@@ -79,6 +88,8 @@ class Window(QtWidgets.QMainWindow):
         # disbale the assisted and training tabs
         self.ui.tabWidget.setTabEnabled(1, False)
         self.ui.tabWidget.setTabEnabled(2, False)        
+        # only draft invoices can be refreshed
+        self.ui.refresh_button.setEnabled(False)
 
     # events
     def closeEvent(self, event):
@@ -89,65 +100,104 @@ class Window(QtWidgets.QMainWindow):
     # settings
     def saveSettings(self):
         """Save GUI settings"""
-        settings = QtCore.QSettings("Dan", "ppms")
-        settings.setValue('invoice_folder', self.invoice_folder)
-        settings.setValue('ppms_url', self.ppms_url)
-        settings.setValue('ppms_key', self.ppms_key)
-        settings.setValue('exchange_username', self.exchange_username)
-        settings.setValue('exchange_password', self.exchange_password)
-        settings.setValue('smtp_server', self.smtp_server)
-        settings.setValue('from_email', self.from_email)
-        settings.setValue('test_mode', self.test_mode)
-        settings.setValue('test_address', self.test_address)
-        settings.setValue('session_chk', self.session_chk)
-        settings.setValue('user_chk', self.user_chk)
-        settings.setValue('type_chk', self.type_chk)
-        settings.setValue('system_chk', self.system_chk)
-        settings.setValue('date_chk', self.date_chk)
-        settings.setValue('start_chk', self.start_chk)
-        settings.setValue('booked_chk', self.booked_chk)
-        settings.setValue('used_chk', self.used_chk)
-        settings.setValue('notes_chk', self.notes_chk)
-        settings.setValue('init_amount_chk', self.init_amount_chk)
-        settings.setValue('fees_chk', self.fees_chk)
-        settings.setValue('final_amount_chk', self.final_amount_chk)
-        settings.setValue('message_text', self.message_text)
-        settings.setValue('facility_code', self.facility_code)
-        settings.setValue('facility_name', self.facility_name)
-        settings.setValue('facility_email', self.facility_email)        
-        settings.setValue('manager_name', self.manager_name)
-        settings.setValue('manager_email', self.manager_email)
+        save_settings(self.settings)
+        save_profiles(self.profiles)
 
     def restoreSettings(self):
         """Retrieve stored GUI settings"""
-        settings = QtCore.QSettings("Dan", "ppms")
-        self.invoice_folder = settings.value("invoice_folder", type=str)
-        self.ppms_url = settings.value("ppms_url", type=str)
-        self.ppms_key = settings.value("ppms_key", type=str)
-        self.exchange_username = settings.value("exchange_username", type=str)
-        self.exchange_password = settings.value("exchange_password", type=str)
-        self.smtp_server = settings.value("smtp_server", type=str)
-        self.from_email = settings.value("from_email", type=str)
-        self.test_mode = settings.value("test_mode", type=bool)
-        self.test_address = settings.value("test_address", type=str)
-        self.session_chk = settings.value("session_chk", type=bool)
-        self.user_chk = settings.value("user_chk", type=bool)
-        self.type_chk = settings.value("type_chk", type=bool)
-        self.system_chk = settings.value("system_chk", type=bool)
-        self.date_chk = settings.value("date_chk", type=bool)
-        self.start_chk = settings.value("start_chk", type=bool)
-        self.booked_chk = settings.value("booked_chk", type=bool)
-        self.used_chk = settings.value("used_chk", type=bool)
-        self.notes_chk = settings.value("notes_chk", type=bool)
-        self.init_amount_chk = settings.value("init_amount_chk", type=bool)
-        self.fees_chk = settings.value("fees_chk", type=bool)
-        self.final_amount_chk = settings.value("final_amount_chk", type=bool)
-        self.message_text = settings.value("message_text", type=str)
-        self.facility_code = settings.value("facility_code", type=str)
-        self.facility_name = settings.value("facility_name", type=str)
-        self.facility_email = settings.value("facility_email", type=str)        
-        self.manager_name = settings.value("manager_name", type=str)
-        self.manager_email = settings.value("manager_email", type=str)
+        self.settings = load_settings()
+        self.profiles = load_profiles()
+        self.applySettings()
+
+    def updateSettings(self, **changes):
+        """
+        Replace the settings snapshot with one holding `changes` and
+        apply them. Nothing happens if the settings are the same.
+        """
+        settings = self.settings.replace(**changes)
+        if settings is not self.settings:
+            self.settings = settings
+            self.applySettings()
+
+    def applySettings(self):
+        """Start or stop what depends on the current settings"""
+        settings = self.settings
+        # record how long each stage takes
+        if settings.record_timings and not get_recorder().enabled:
+            set_recorder(Recorder())
+        elif not settings.record_timings:
+            set_recorder(None)
+        # profile background jobs into the invoice folder
+        if settings.profile_jobs and settings.invoice_folder:
+            profiler.set_folder(
+                os.path.join(settings.invoice_folder, profiler.PROFILE_DIR)
+            )
+        else:
+            profiler.set_folder(None)
+        # render invoices in the background once they are fetched, a
+        # change to the template or facility renders them again
+        if settings.prerender:
+            self.prerenderInvoice()
+        else:
+            self.stopPrerender()
+
+    def saveProfile(self, name):
+        """Save the current settings as the facility profile `name`"""
+        self.profiles = dict(self.profiles, **{name: self.settings})
+
+    def useProfile(self, name):
+        """Switch to the settings of facility profile `name`"""
+        self.updateSettings(**self.profiles[name].to_dict())
+        self.ui.statusbar.showMessage(
+            'Using facility profile {}, connect to load its invoices'.format(name)
+        )
+
+    def deleteProfile(self, name):
+        self.profiles = {
+            n: settings for n, settings in self.profiles.items() if n != name
+        }
+
+    def prerenderInvoice(self):
+        """
+        Queue every item of the current invoice that isn't already
+        rendered with the current settings on the render pool. If the
+        settings changed since the last time, the renders still
+        waiting are dropped and everything is rendered again.
+        """
+        settings = self.settings
+        if not settings.prerender or self.invoice is None:
+            return
+        ref = self.invoice.ref
+        key = settings.render_key(ref)
+        if key != self.prerender_key:
+            self.stopPrerender()
+            self.prerender_key = key
+
+        generation = self.render_cache.generation
+        for item in self.invoice.items:
+            if self.render_cache.get(item, key) is not None:
+                continue
+            worker = threads.Worker(
+                threads._prerenderItem,
+                item, ref, settings.invoice_folder, settings.message_text,
+                settings.facility_info, settings.invoice_columns,
+                self.render_cache, generation
+            )
+            worker.signals.error.connect(self.onError)
+            self.render_pool.start(worker)
+
+    def stopPrerender(self):
+        """Drop the rendered invoices and any renders still waiting"""
+        self.render_pool.clear()
+        self.render_cache.invalidate()
+        self.prerender_key = None
+
+    def writeTimings(self):
+        """Write the recorded timings to the invoice folder"""
+        recorder = get_recorder()
+        if not recorder.enabled or not self.settings.invoice_folder:
+            return []
+        return recorder.write_report(self.settings.invoice_folder)
 
     # slots
     @pyqtSlot()
@@ -185,13 +235,44 @@ class Window(QtWidgets.QMainWindow):
         if not self.facility_dialog.isVisible():          
             self.facility_dialog.show()
 
+    @pyqtSlot()
+    def showTimings(self):
+        """Responds to actionTimings"""
+        self.stats_dialog = StatsDialog(self)
+        if not self.stats_dialog.isVisible():
+            self.stats_dialog.show()
+
+    @pyqtSlot()
+    def profilesSettings(self):
+        """Responds to actionProfiles"""
+        self.profiles_dialog = ProfilesDialog(self)
+        if not self.profiles_dialog.isVisible():
+            self.profiles_dialog.show()
+
+    @pyqtSlot()
+    def exportSettings(self):
+        """Responds to actionConsolidated"""
+        self.export_dialog = ExportDialog(self)
+        if not self.export_dialog.isVisible():
+            self.export_dialog.show()
+
     @pyqtSlot()
     def connectClicked(self):
         """Responds to the connect button being clicked"""
+        self.received_lists = set()
+        self.first_fetch_started = False
+        self.ui.reference_combo.blockSignals(True)
+        self.ui.reference_combo.clear()
+        self.ui.reference_combo.blockSignals(False)
+
+        settings = self.settings
         connect_worker = threads.Worker(
-            threads._connect, self.ppms_url, self.ppms_key
+            threads._connect, settings.ppms_url, settings.ppms_key,
+            snapshot_folder=settings.invoice_folder
         )
+        connect_worker.signals.custom_callback.connect(self.onInvoiceListReceived)
         connect_worker.signals.result.connect(self.onConnectComplete)
+        connect_worker.signals.progress.connect(self.onProgress)
         connect_worker.signals.error.connect(self.onError)
 
         self.threadpool.start(connect_worker)
@@ -200,11 +281,25 @@ class Window(QtWidgets.QMainWindow):
     def referenceChanged(self):
         """Responds to reference_combo index change"""
         ref = self.ui.reference_combo.currentText()
+        self.fetchInvoice(ref)
+
+    @pyqtSlot()
+    def refreshClicked(self):
+        """Responds to the refresh button being clicked"""
+        if self.invoice is None:
+            return
+        # the changed items are replaced once the refresh finishes,
+        # so their renders will be out of date
+        self.stopPrerender()
+
         worker = threads.Worker(
-            threads._fetchInvoice, self.ppms_url,
-            self.ppms_key, ref
+            threads._refreshInvoice, self.settings.ppms_url,
+            self.settings.ppms_key, self.invoice
         )
-        worker.signals.result.connect(self.onInvoicFetchComplete)
+        worker.signals.result.connect(self.onInvoiceRefreshComplete)
+        worker.signals.progress.connect(self.onProgress)
+        worker.signals.error.connect(self.onError)
+
         self.threadpool.start(worker)
 
     @pyqtSlot()
@@ -226,30 +321,12 @@ class Window(QtWidgets.QMainWindow):
         item = self.invoice.item_for_bcode(bcode)
         ref = self.ui.reference_combo.currentText()
 
-        facility_info = {}
-        facility_info["name"] = self.facility_name
-        facility_info["email"] = self.facility_email
-        facility_info["manager_name"] = self.manager_name
-        facility_info["manager_email"] = self.manager_email
-
-        invoice_columns = {}
-        invoice_columns["session_chk"] = self.session_chk
-        invoice_columns["user_chk"] = self.user_chk
-        invoice_columns["type_chk"] = self.type_chk
-        invoice_columns["system_chk"] = self.system_chk
-        invoice_columns["date_chk"] = self.date_chk
-        invoice_columns["start_chk"] = self.start_chk
-        invoice_columns["booked_chk"] = self.booked_chk
-        invoice_columns["used_chk"] = self.used_chk
-        invoice_columns["notes_chk"] = self.notes_chk
-        invoice_columns["init_amount_chk"] = self.init_amount_chk
-        invoice_columns["fees_chk"] = self.fees_chk
-        invoice_columns["final_amount_chk"] = self.final_amount_chk
-
+        settings = self.settings
         worker = threads.Worker(
             threads._messageForBcode,
-            item, ref, self.invoice_folder, self.message_text,
-            facility_info, invoice_columns
+            item, ref, settings.invoice_folder, settings.message_text,
+            settings.facility_info, settings.invoice_columns,
+            preview_rows=PreviewDialog.PAGE_ROWS
         )
         worker.signals.result.connect(self.onDetailsComplete)
         worker.signals.error.connect(self.onError)
@@ -315,39 +392,16 @@ class Window(QtWidgets.QMainWindow):
                     bcodes.append(table.item(row, 1).text())
 
         bcodes = set(bcodes)
+        resume = self.askResume(ref, bcodes, sendto)
+        if resume is None:
+            return
         items = []
         for bcode in bcodes:
             items.append(self.invoice.item_for_bcode(bcode))
 
-        facility_info = {}
-        facility_info["name"] = self.facility_name
-        facility_info["email"] = self.facility_email
-        facility_info["manager_name"] = self.manager_name
-        facility_info["manager_email"] = self.manager_email
-
-        invoice_columns = {}
-        invoice_columns["session_chk"] = self.session_chk
-        invoice_columns["user_chk"] = self.user_chk
-        invoice_columns["type_chk"] = self.type_chk
-        invoice_columns["system_chk"] = self.system_chk
-        invoice_columns["date_chk"] = self.date_chk
-        invoice_columns["start_chk"] = self.start_chk
-        invoice_columns["booked_chk"] = self.booked_chk
-        invoice_columns["used_chk"] = self.used_chk
-        invoice_columns["notes_chk"] = self.notes_chk
-        invoice_columns["init_amount_chk"] = self.init_amount_chk
-        invoice_columns["fees_chk"] = self.fees_chk
-        invoice_columns["final_amount_chk"] = self.final_amount_chk            
-
-        email_settings = {}
-        email_settings["username"] = self.exchange_username
-        email_settings["password"] = self.exchange_password
-        email_settings["server"] = self.smtp_server
-        email_settings["from_address"] = self.from_email
-        email_settings["test_mode"] = self.test_mode
-        email_settings["test_address"] = self.test_address
-        email_settings["copy_manager"] = copy_manager
-        email_settings["manager_address"] = self.manager_email
+        settings = self.settings
+        # the timings report written after the send covers only this run
+        get_recorder().reset()
 
         # progress bar
         self.email_progress = Progress(self, len(items) - 1, 'Sending email')
@@ -355,8 +409,11 @@ class Window(QtWidgets.QMainWindow):
         # start the send email thread passing items and sendto flag
         worker = threads.Worker(
             threads._sendEmail,
-            items, sendto, ref, self.invoice_folder, self.message_text,
-            facility_info, invoice_columns, email_settings
+            items, sendto, ref, settings.invoice_folder, settings.message_text,
+            settings.facility_info, settings.invoice_columns,
+            settings.email_settings(copy_manager),
+            resume=resume,
+            render_cache=self.render_cache if settings.prerender else None
         )
         worker.signals.progress.connect(self.updateEmailProgress)
         worker.signals.finished.connect(self.onEmailFinished)
@@ -367,17 +424,135 @@ class Window(QtWidgets.QMainWindow):
 
         self.threadpool.start(worker)   
 
+    def askResume(self, ref, bcodes, sendto=0):
+        """
+        If some of the account codes have already been emailed for this
+        invoice, to the same recipients as `sendto` chooses, ask whether
+        to skip them or send to everyone again.
+
+        Returns
+        --------
+            True to resume, False to send everything, None to cancel
+        """
+        journal = open_journal(self.settings.invoice_folder)
+        run_ref = journal_ref(
+            ref, self.settings.test_mode, admin_only=sendto == 1
+        )
+        already_sent = journal.sent(run_ref) & bcodes
+        if not already_sent:
+            return False
+
+        msgBox = QtWidgets.QMessageBox(self)
+        msgBox.setIcon(QtWidgets.QMessageBox.Question)
+        msgBox.setWindowTitle("Resume sending")
+        msgBox.setText(
+            "{} of the {} selected account codes have already been sent "
+            "invoice {}.".format(len(already_sent), len(bcodes), ref)
+        )
+        msgBox.setInformativeText(
+            "Resume to send only the rest, or send to everyone again."
+        )
+        resume_btn = msgBox.addButton("Resume", QtWidgets.QMessageBox.AcceptRole)
+        all_btn = msgBox.addButton("Send all", QtWidgets.QMessageBox.DestructiveRole)
+        msgBox.addButton(QtWidgets.QMessageBox.Cancel)
+        msgBox.setDefaultButton(resume_btn)
+        msgBox.exec_()
+
+        if msgBox.clickedButton() == resume_btn:
+            return True
+        if msgBox.clickedButton() == all_btn:
+            return False
+        return None
+
+    def consolidatedExport(self, refs, per_period):
+        """Start a worker writing one finance voucher for several invoices"""
+        settings = self.settings
+        # the timings report written after the export covers only this run
+        get_recorder().reset()
+        # parsing and summing many invoices is CPU-bound, so it runs
+        # in another process to keep the window responsive
+        worker = threads.ProcessWorker(
+            threads._writeConsolidated, settings.ppms_url, settings.ppms_key,
+            refs, settings.facility_code, settings.invoice_folder,
+            per_period=per_period, formats=settings.voucher_formats
+        )
+        worker.signals.result.connect(self.onExportComplete)
+        worker.signals.error.connect(self.onError)
+        worker.signals.finished.connect(self.writeTimings)
+
+        self.export_progress = Progress(self, len(refs), 'Finance export')
+        worker.signals.progress.connect(self.export_progress.updateEvent)
+        worker.signals.finished.connect(self.export_progress.close)
+        self.export_progress.show()
+
+        self.threadpool.start(worker)
+
+    def runBatch(self, names, send=False, copy_manager=False):
+        """
+        Start a worker processing the newest invoice of each of the
+        facility profiles `names` at the same time, see `threads._runBatch`
+        """
+        profiles = {name: self.profiles[name] for name in names}
+        worker = threads.Worker(
+            threads._runBatch, profiles, send=send, copy_manager=copy_manager
+        )
+        worker.signals.custom_callback.connect(self.onProfileFinished)
+        worker.signals.result.connect(self.onBatchComplete)
+        worker.signals.error.connect(self.onError)
+
+        self.batch_progress = Progress(self, len(profiles), 'Facility batch')
+        worker.signals.progress.connect(self.batch_progress.updateEvent)
+        worker.signals.finished.connect(self.batch_progress.close)
+        self.batch_progress.show()
+
+        self.threadpool.start(worker)
+
     # signal recievers
+    def onInvoiceListReceived(self, invoice_list):
+        """
+        Recieves the draft or final invoice list from the connect worker
+        thread as soon as it arrives. Drafts go to the top of the combo box
+        and finals to the bottom, and the first invoice is fetched as soon
+        as its reference is known.
+        """
+        draft, refs = invoice_list
+        combo = self.ui.reference_combo
+        # fill the combo box without triggering referenceChanged
+        combo.blockSignals(True)
+        if draft:
+            combo.insertItems(0, refs)
+        else:
+            combo.addItems(refs)
+        self.received_lists.add(draft)
+
+        # the newest draft is first in the list, if there are no drafts
+        # we need to wait for the finals to know which invoice is first
+        first_known = (draft and refs) or len(self.received_lists) == 2
+        if not self.first_fetch_started and first_known and combo.count():
+            self.first_fetch_started = True
+            combo.setCurrentIndex(0)
+            self.fetchInvoice(combo.itemText(0))
+        combo.blockSignals(False)
+
     def onConnectComplete(self, result):
         """Recieves the result of the connect worker thread"""
-        if result:
-            self.ui.reference_combo.addItems(result)
-
+        if result and not self.first_fetch_started:
+            self.first_fetch_started = True
+            self.ui.reference_combo.blockSignals(True)
+            self.ui.reference_combo.setCurrentIndex(0)
+            self.ui.reference_combo.blockSignals(False)
+            self.fetchInvoice(result[0])
+
+    def fetchInvoice(self, ref):
+        """Start a worker thread fetching the invoice for `ref`"""
+        self.stopPrerender()
+        settings = self.settings
         worker = threads.Worker(
-            threads._fetchInvoice, self.ppms_url, self.ppms_key,
-            result[0]
+            threads._fetchInvoice, settings.ppms_url, settings.ppms_key, ref,
+            snapshot_folder=settings.invoice_folder
         )
         worker.signals.result.connect(self.onInvoicFetchComplete)
+        worker.signals.progress.connect(self.onProgress)
         worker.signals.error.connect(self.onError)
 
         self.threadpool.start(worker)
@@ -386,149 +561,124 @@ class Window(QtWidgets.QMainWindow):
         """Recieves the result of invoice fetch worker thread"""
         if invoice:
             self.invoice = invoice
-            if invoice.autonomous_items > 0:
-                num_auto = invoice.autonomous_items
-
-                auto_table = self.ui.auto_table
-                auto_table_header = auto_table.horizontalHeader()
-                auto_table_cols = ["", "Account Number", "Group", "Sessions",
-                                   "Hours booked","Hours used",
-                                   "Initial Amount", "Rebate", "Fees",
-                                   "Final Amount", ""]
-                auto_table.setColumnCount(len(auto_table_cols))
-                auto_table.setRowCount(num_auto)
-                auto_table.setHorizontalHeaderLabels(auto_table_cols)
-
-                rid = 0
-                for i in invoice.items:
-                    if i.num_auto_sessions > 0:
-                        props = i.properties["autonomous"]
-                        # add a checkbox to first column of each row
-                        chk = QtWidgets.QCheckBox()
-                        chk.stateChanged.connect(self.checkBoxChanged)
-                        auto_table.setCellWidget(rid, 0, chk)
-                        auto_table_header.setSectionResizeMode(6, QtWidgets.QHeaderView.ResizeToContents)
-
-                        # add columns from invoice                
-                        for cid, col in enumerate(auto_table_cols[1:-1]):
-                            cid += 1
-                            if ((col == "Account Number") or
-                                (col == "Group") or
-                                (col == "Sessions")):
-
-                                cell = QtWidgets.QTableWidgetItem('{}'.format(props[col]))
-                            else:
-                                cell = QtWidgets.QTableWidgetItem('{:.2f}'.format(props[col]))
-
-                            cell.setFlags(QtCore.Qt.ItemIsEnabled)
-                            auto_table.setItem(rid, cid, cell)
-                            auto_table_header.setSectionResizeMode(
-                                0, QtWidgets.QHeaderView.ResizeToContents
-                            )
-                        
-                        # add a push button to access list of sessions for each bcode
-                        btn = QtWidgets.QPushButton()
-                        btn.setText('Details')
-                        btn.clicked.connect(self.detailsClicked)
-                        auto_table.setCellWidget(rid, cid+1, btn)
-                        auto_table_header.setSectionResizeMode(6, QtWidgets.QHeaderView.ResizeToContents)
-
-                        rid += 1
-
-            if invoice.assist_items > 0:
-                self.ui.tabWidget.setTabEnabled(1, True)
-                num_assist = invoice.assist_items
-
-                assist_table = self.ui.assist_table
-                assist_table_header = assist_table.horizontalHeader()
-                assist_table_cols = ["", "Account Number", "Group", "Sessions",
-                                     "Hours booked","Hours used",
-                                     "Initial Amount", "Rebate", "Fees",
-                                     "Final Amount", ""]
-                assist_table.setColumnCount(len(assist_table_cols))
-                assist_table.setRowCount(num_assist)
-                assist_table.setHorizontalHeaderLabels(assist_table_cols)
-
-                rid = 0
-                for i in invoice.items:
-
-                    if i.num_assist_sessions > 0:
-                        props = i.properties["assisted"]
-                        chk = QtWidgets.QCheckBox()
-                        chk.stateChanged.connect(self.checkBoxChanged)
-                        assist_table.setCellWidget(rid, 0, chk)
-                        assist_table_header.setSectionResizeMode(6, QtWidgets.QHeaderView.ResizeToContents)
-                        # loop needs rewriting to write out assist_items into
-                        # table columns
-                        for cid, col in enumerate(assist_table_cols[1:-1]):
-                            cid += 1
-                            if ((col == "Account Number") or
-                                (col == "Group") or
-                                (col == "Sessions")):
-
-                                cell = QtWidgets.QTableWidgetItem('{}'.format(props[col]))
-                            else:
-                                cell = QtWidgets.QTableWidgetItem('{:.2f}'.format(props[col]))
-
-                            cell.setFlags(QtCore.Qt.ItemIsEnabled)
-                            assist_table.setItem(rid, cid, cell)
-                            assist_table_header.setSectionResizeMode(
-                                0, QtWidgets.QHeaderView.ResizeToContents
-                            )
-
-                        # add a push button to access list of sessions for each bcode
-                        btn = QtWidgets.QPushButton()
-                        btn.setText('Details')
-                        btn.clicked.connect(self.detailsClicked)
-                        assist_table.setCellWidget(rid, cid+1, btn)
-                        assist_table_header.setSectionResizeMode(6, QtWidgets.QHeaderView.ResizeToContents)                            
-
-                        rid += 1
-
-            if invoice.train_items > 0:
-                self.ui.tabWidget.setTabEnabled(2, True)
-                num_train = invoice.train_items
-
-                train_table = self.ui.train_table
-                train_table_header = train_table.horizontalHeader()
-                train_table_cols = ["", "Account Number", "Group", "Sessions",
-                                     "Hours booked", "Final Amount", ""]
-                train_table.setColumnCount(len(train_table_cols))
-                train_table.setRowCount(num_train)
-                train_table.setHorizontalHeaderLabels(train_table_cols)
-
-                rid = 0
-                for i in invoice.items:
-                    if i.num_train_sessions > 0:
-                        props = i.properties["training"]
-                        chk = QtWidgets.QCheckBox()
-                        chk.stateChanged.connect(self.checkBoxChanged)
-                        train_table.setCellWidget(rid, 0, chk)
-                        train_table_header.setSectionResizeMode(6, QtWidgets.QHeaderView.ResizeToContents)
-                                
-                        for cid, col in enumerate(train_table_cols[1:-1]):
-                            cid += 1
-                            if ((col == "Account Number") or
-                                (col == "Group") or
-                                (col == "Sessions")):
-                                cell = QtWidgets.QTableWidgetItem('{}'.format(props[col]))
-                            else:
-                                cell = QtWidgets.QTableWidgetItem('{:.2f}'.format(props[col]))
-
-                            cell.setFlags(QtCore.Qt.ItemIsEnabled)
-                            train_table.setItem(rid, cid, cell)
-                            train_table_header.setSectionResizeMode(
-                                0, QtWidgets.QHeaderView.ResizeToContents
-                            )
-
-                        # add a push button to access list of sessions for each bcode
-                        btn = QtWidgets.QPushButton()
-                        btn.setText('Details')
-                        btn.clicked.connect(self.detailsClicked)
-                        train_table.setCellWidget(rid, cid+1, btn)
-                        train_table_header.setSectionResizeMode(6, QtWidgets.QHeaderView.ResizeToContents)                            
-
-                        rid += 1
+            for table, tab, cols, session_type, num_attr in self.sessionTables():
+                items = [i for i in invoice.items if getattr(i, num_attr) > 0]
+                if items:
+                    self.ui.tabWidget.setTabEnabled(tab, True)
+                    self.setupTable(table, cols)
+                    table.setRowCount(len(items))
+                    for rid, item in enumerate(items):
+                        self.setTableRow(
+                            table, rid, cols, item.properties[session_type]
+                        )
+
+            self.ui.refresh_button.setEnabled('DRAFT' in invoice.ref)
+            self.prerenderInvoice()
+
+    def onInvoiceRefreshComplete(self, result):
+        """
+        Recieves the result of the invoice refresh worker thread,
+        applies it to the invoice and updates only the table rows for
+        account codes that changed.
+        """
+        invoice = result["invoice"]
+        if invoice is not self.invoice:
+            # a different invoice was loaded while refreshing
+            return
+        invoice.update_items(
+            result["details"], result["summary"], result["groups"],
+            result["items"]
+        )
+
+        for bcode in result["bcodes"]:
+            item = invoice.item_for_bcode(bcode)
+            for table, tab, cols, session_type, num_attr in self.sessionTables():
+                rid = self.rowForBcode(table, bcode)
+                has_sessions = item is not None and getattr(item, num_attr) > 0
+                if rid is not None and has_sessions:
+                    self.setTableCells(
+                        table, rid, cols, item.properties[session_type]
+                    )
+                elif rid is not None:
+                    table.removeRow(rid)
+                elif has_sessions:
+                    if table.rowCount() == 0:
+                        self.ui.tabWidget.setTabEnabled(tab, True)
+                        self.setupTable(table, cols)
+                    rid = table.rowCount()
+                    table.insertRow(rid)
+                    self.setTableRow(
+                        table, rid, cols, item.properties[session_type]
+                    )
+        self.prerenderInvoice()
+
+    # table helpers
+    def sessionTables(self):
+        """
+        The table for each session type along with its tab index,
+        columns, session type and the InvoiceItem attribute counting
+        sessions of that type.
+        """
+        return [
+            (self.ui.auto_table, 0, SESSION_TABLE_COLS,
+             "autonomous", "num_auto_sessions"),
+            (self.ui.assist_table, 1, SESSION_TABLE_COLS,
+             "assisted", "num_assist_sessions"),
+            (self.ui.train_table, 2, TRAIN_TABLE_COLS,
+             "training", "num_train_sessions"),
+        ]
+
+    def setupTable(self, table, cols):
+        table.setColumnCount(len(cols))
+        table.setHorizontalHeaderLabels(cols)
+
+    def rowForBcode(self, table, bcode):
+        """The row in `table` for the account code or None"""
+        for row in range(table.rowCount()):
+            if table.item(row, 1).text() == bcode:
+                return row
+        return None
+
+    def setTableRow(self, table, rid, cols, props):
+        """Fill a new table row with a checkbox, the InvoiceItem properties
+        and a button to show the sessions"""
+        table_header = table.horizontalHeader()
+
+        # add a checkbox to first column of each row
+        chk = QtWidgets.QCheckBox()
+        chk.stateChanged.connect(self.checkBoxChanged)
+        table.setCellWidget(rid, 0, chk)
+        table_header.setSectionResizeMode(6, QtWidgets.QHeaderView.ResizeToContents)
+
+        # add columns from invoice
+        self.setTableCells(table, rid, cols, props)
+
+        # add a push button to access list of sessions for each bcode
+        btn = QtWidgets.QPushButton()
+        btn.setText('Details')
+        btn.clicked.connect(self.detailsClicked)
+        table.setCellWidget(rid, len(cols) - 1, btn)
+        table_header.setSectionResizeMode(6, QtWidgets.QHeaderView.ResizeToContents)
+
+    def setTableCells(self, table, rid, cols, props):
+        """Write the InvoiceItem properties into the cells of a table row"""
+        table_header = table.horizontalHeader()
+        for cid, col in enumerate(cols[1:-1]):
+            cid += 1
+            if ((col == "Account Number") or
+                (col == "Group") or
+                (col == "Sessions")):
+                cell = QtWidgets.QTableWidgetItem('{}'.format(props[col]))
+            elif col in SUMMARY_MONEY_COLUMNS:
+                cell = QtWidgets.QTableWidgetItem(format_pence([props[col]])[0])
+            else:
+                cell = QtWidgets.QTableWidgetItem('{:.2f}'.format(props[col]))
+
+            cell.setFlags(QtCore.Qt.ItemIsEnabled)
+            table.setItem(rid, cid, cell)
+            table_header.setSectionResizeMode(
+                0, QtWidgets.QHeaderView.ResizeToContents
+            )
 
     def onDetailsComplete(self, result):
         """Recieves the result of the sessionsForBcode thread"""
@@ -539,16 +689,67 @@ class Window(QtWidgets.QMainWindow):
             if not self.preview_dialog.isVisible():
                 self.preview_dialog.show()
 
+    def onExportComplete(self, paths):
+        """Recieves the paths written by the consolidated export thread"""
+        self.ui.statusbar.showMessage(
+            'Finance export saved to {}'.format(', '.join(paths))
+        )
+
+    def onProfileFinished(self, profile):
+        """Recieves each facility profile's output from the batch thread"""
+        name, output = profile
+        if "error" in output:
+            self.ui.statusbar.showMessage(
+                '{} failed: {}'.format(name, output["error"])
+            )
+        else:
+            self.ui.statusbar.showMessage(
+                '{} invoice {} done'.format(name, output["ref"])
+            )
+
+    def onBatchComplete(self, results):
+        """Recieves the output of every facility profile in the batch"""
+        lines = []
+        for name in sorted(results):
+            output = results[name]
+            if "error" in output:
+                lines.append('{}: failed, {}'.format(name, output["error"]))
+                continue
+            line = '{}: invoice {}, {} account codes'.format(
+                name, output["ref"], output["items"]
+            )
+            if "sent" in output:
+                line += ', {} emailed, {} already sent'.format(
+                    len(output["sent"]), len(output["skipped"])
+                )
+            lines.append(line)
+
+        failed = any("error" in output for output in results.values())
+        msgBox = QtWidgets.QMessageBox(self)
+        msgBox.setIcon(
+            QtWidgets.QMessageBox.Warning if failed
+            else QtWidgets.QMessageBox.Information
+        )
+        msgBox.setWindowTitle("Facility batch")
+        msgBox.setText("\n".join(lines))
+        msgBox.setStandardButtons(QtWidgets.QMessageBox.Ok)
+        msgBox.exec_()
+
     def onError(self, err):
         msgBox = QtWidgets.QMessageBox()
         msgBox.setIcon(QtWidgets.QMessageBox.Critical)
         msgBox.setText(str(err[1]))
         msgBox.setWindowTitle("Error")
         msgBox.setStandardButtons(QtWidgets.QMessageBox.Ok)
+        msgBox.exec_()
+
+    def onProgress(self, event):
+        """Shows progress events from background jobs in the status bar"""
+        self.ui.statusbar.showMessage(event.describe())
 
-    def updateEmailProgress(self, val):
+    def updateEmailProgress(self, event):
         if self.email_progress.isVisible():
-            self.email_progress.updateBar(val)
+            self.email_progress.updateEvent(event)
 
     def onEmailFinished(self):
         if self.email_progress.isVisible():
@@ -557,9 +758,12 @@ class Window(QtWidgets.QMainWindow):
         ref = self.ui.reference_combo.currentText()
         worker = threads.Worker(
             threads._writeToExcel, ref, self.invoice,
-            self.facility_code, self.invoice_folder
+            self.settings.facility_code, self.settings.invoice_folder,
+            formats=self.settings.voucher_formats
         )
+        worker.signals.progress.connect(self.onProgress)
         worker.signals.error.connect(self.onError)
+        worker.signals.finished.connect(self.writeTimings)
 
         self.threadpool.start(worker)           
 
@@ -31,6 +31,9 @@ class Ui_MainWindow(object):
         self.connect_button = QtWidgets.QPushButton(self.centralwidget)
         self.connect_button.setObjectName("connect_button")
         self.horizontalLayout.addWidget(self.connect_button)
+        self.refresh_button = QtWidgets.QPushButton(self.centralwidget)
+        self.refresh_button.setObjectName("refresh_button")
+        self.horizontalLayout.addWidget(self.refresh_button)
         self.gridLayout_2.addLayout(self.horizontalLayout, 0, 0, 1, 1)
         self.tabWidget = QtWidgets.QTabWidget(self.centralwidget)
         self.tabWidget.setEnabled(True)
@@ -115,6 +118,10 @@ class Ui_MainWindow(object):
         self.menubar.setObjectName("menubar")
         self.menuSettings = QtWidgets.QMenu(self.menubar)
         self.menuSettings.setObjectName("menuSettings")
+        self.menuExport = QtWidgets.QMenu(self.menubar)
+        self.menuExport.setObjectName("menuExport")
+        self.menuView = QtWidgets.QMenu(self.menubar)
+        self.menuView.setObjectName("menuView")
         MainWindow.setMenuBar(self.menubar)
         self.statusbar = QtWidgets.QStatusBar(MainWindow)
         self.statusbar.setObjectName("statusbar")
@@ -129,12 +136,24 @@ class Ui_MainWindow(object):
         self.actionFacility.setObjectName("actionFacility")
         self.actionGeneral = QtWidgets.QAction(MainWindow)
         self.actionGeneral.setObjectName("actionGeneral")
+        self.actionConsolidated = QtWidgets.QAction(MainWindow)
+        self.actionConsolidated.setObjectName("actionConsolidated")
+        self.actionTimings = QtWidgets.QAction(MainWindow)
+        self.actionTimings.setObjectName("actionTimings")
+        self.actionProfiles = QtWidgets.QAction(MainWindow)
+        self.actionProfiles.setObjectName("actionProfiles")
         self.menuSettings.addAction(self.actionGeneral)
         self.menuSettings.addAction(self.actionPPMS)
         self.menuSettings.addAction(self.actionEmail)
         self.menuSettings.addAction(self.actionFacility)
         self.menuSettings.addAction(self.actionInvoice_template)
+        self.menuSettings.addSeparator()
+        self.menuSettings.addAction(self.actionProfiles)
+        self.menuExport.addAction(self.actionConsolidated)
+        self.menuView.addAction(self.actionTimings)
         self.menubar.addAction(self.menuSettings.menuAction())
+        self.menubar.addAction(self.menuExport.menuAction())
+        self.menubar.addAction(self.menuView.menuAction())
 
         self.retranslateUi(MainWindow)
         self.tabWidget.setCurrentIndex(0)
@@ -144,6 +163,7 @@ class Ui_MainWindow(object):
         _translate = QtCore.QCoreApplication.translate
         MainWindow.setWindowTitle(_translate("MainWindow", "MainWindow"))
         self.connect_button.setText(_translate("MainWindow", "Connect"))
+        self.refresh_button.setText(_translate("MainWindow", "Refresh"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.autonomous_tab), _translate("MainWindow", "Autonomous sessions"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.assisted_tab), _translate("MainWindow", "Assisted sessions"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.training_tab), _translate("MainWindow", "Training sessions"))
@@ -160,3 +180,8 @@ class Ui_MainWindow(object):
         self.actionInvoice_template.setText(_translate("MainWindow", "Invoice template"))
         self.actionFacility.setText(_translate("MainWindow", "Facility"))
         self.actionGeneral.setText(_translate("MainWindow", "General"))
+        self.menuExport.setTitle(_translate("MainWindow", "Export"))
+        self.actionConsolidated.setText(_translate("MainWindow", "Consolidated finance export"))
+        self.menuView.setTitle(_translate("MainWindow", "View"))
+        self.actionTimings.setText(_translate("MainWindow", "Timings"))
+        self.actionProfiles.setText(_translate("MainWindow", "Facility profiles"))
@@ -3,8 +3,15 @@ from collections import OrderedDict
 from PyQt5 import QtCore, QtWidgets
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 
+from ..utils.aggregates import (
+    summarise, item_properties, SUMMARY_INPUT_COLUMNS
+)
+from ..utils.invoice_schema import format_date
+from ..utils.money import format_amount, format_pence, total_pence
+
 
 class BaseSession:
     def __init__(self, **kwargs):
@@ -27,11 +34,7 @@ class BaseSession:
             setattr(self, key, kwargs[key])
 
     def round_final_amount(self):
-        return (
-            "{0:.2f}".format(
-                int((self.final_amount * 100) + 0.5) / float(100)
-            )
-        )            
+        return format_amount(self.final_amount)
 
 
 class TrainingSession(BaseSession):
@@ -73,91 +76,144 @@ class InvoiceItem:
         addresses["to_email"] = [group.heademail]
         addresses["cc_email"] = [group.admemail]
         self.addresses = addresses
-        self.sessions = []
+        self._sessions = []
+        # columns from the column store whose sessions are only made
+        # into Session instances when first needed
+        self._session_columns = None
         self.properties = None
         self.html = None
+        # short summary sent in place of `html` when the sessions
+        # are attached to the email, see `send_email.send`
+        self.summary_html = None
 
     def set_invoice_properties(self, sessions_df):
-        session_types = sessions_df['Session Type'].unique()
-        self.properties = {}
-        for st in session_types:
-            sessions = sessions_df[sessions_df['Session Type'] == st]
-
-            properties = pd.Series(dtype='object')
-            properties['Account Number'] = sessions['Account number'].values[0]
-            properties['Group'] = sessions['Group'].values[0]
-            properties['Sessions'] = len(sessions.index)
-            properties['Hours booked'] = float(
-                pd.to_numeric(sessions['Duration (booked)']).sum()
-            ) / 60.0
-            properties['Hours used'] = float(
-                pd.to_numeric(sessions['Duration (used)']).sum()
-            ) / 60.0
-            properties['Rebate'] = float(
-                pd.to_numeric(sessions['Rebate']).sum()
-            )
-            properties['Fees'] = float(
-                pd.to_numeric(sessions['Fee']).sum()
-            )
-            properties['Final Amount'] = float(
-                pd.to_numeric(sessions['Final Amount']).sum()
-            )
-            properties['Initial Amount'] = float(
-                pd.to_numeric(sessions['Final Amount']).sum() +
-                pd.to_numeric(sessions['Fee']).sum() -
-                pd.to_numeric(sessions['Rebate']).sum()
-            )
-            self.properties[st] = properties      
+        """Summarise the sessions of each session type for the tables"""
+        self.properties = item_properties(summarise(sessions_df), self.bcode)
 
-    def sessions_from_dataframe(self, sessions_df):
+    def set_properties_from_columns(self, columns):
+        """
+        Same as `set_invoice_properties` for the columns of the column
+        store, see `sessions_from_columns`.
+        """
+        frame = pd.DataFrame({
+            name: columns[name] for name in SUMMARY_INPUT_COLUMNS
+            if name in columns
+        })
+        self.set_invoice_properties(frame)
+
+    def sessions_from_dataframe(self, sessions_df, properties=None):
         """
         Turn a Pandas DataFrame of sessions for a particular invoice
-        (charges to one bcode) into Session class instances.
+        (charges to one bcode) into Session class instances. Any
+        existing sessions are replaced. `properties` can be given
+        from the invoice summary (see `Invoice.set_summary`) to save
+        summarising the sessions again.
+        """
+        if properties is None:
+            self.set_invoice_properties(sessions_df)
+        else:
+            self.properties = properties
+        self._reset_sessions()
+        for index, row in sessions_df.iterrows():
+            self._add_session(row)
+
+    def sessions_from_columns(self, columns, properties=None):
+        """
+        Take the sessions for one bcode from the column store. `columns`
+        maps column names to slices of the memory-mapped columns (see
+        `InvoiceColumns.view`). Only the session counts are taken
+        straight away, the Session class instances are made row by row
+        the first time `sessions` is used, so items that are never
+        rendered or previewed never build them. Any existing sessions
+        are replaced.
         """
-        self.set_invoice_properties(sessions_df)
+        if properties is None:
+            self.set_properties_from_columns(columns)
+        else:
+            self.properties = properties
+        self._reset_sessions()
+        types = np.asarray(columns['Session Type'], dtype=str)
+        auto = np.char.find(types, "autonomous") >= 0
+        assist = np.char.find(types, "assisted") >= 0
+        train = ~(auto | assist) & (np.char.find(types, "training") >= 0)
+        self.num_auto_sessions = int(auto.sum())
+        self.num_assist_sessions = int(assist.sum())
+        self.num_train_sessions = int(train.sum())
+        self.num_sessions = int((auto | assist | train).sum())
+        self._session_columns = columns
+
+    @property
+    def sessions(self):
+        """The Session instances of the item, see `sessions_from_columns`"""
+        columns = self._session_columns
+        if columns is not None:
+            # built in full before it is seen, as the background render
+            # threads may ask for the sessions at the same time
+            names = list(columns)
+            sessions = [
+                self._session(dict(zip(names, values)))
+                for values in zip(*(columns[name] for name in names))
+            ]
+            self._sessions = [s for s in sessions if s is not None]
+            self._session_columns = None
+        return self._sessions
+
+    def _reset_sessions(self):
+        self._sessions = []
+        self._session_columns = None
         self.num_auto_sessions = 0
         self.num_assist_sessions = 0
         self.num_train_sessions = 0
-        for index, row in sessions_df.iterrows():
-            kwargs = {
-                'session_type': row['Session Type'],
-                'session_ref': row['Reference'],
-                'user': row['User'],
-                'system_type': row['System Type'],
-                'system': row['System'],
-                'date': row['Date'],
-                'start_time': row['Start time'],
-                'final_amount': row['Final Amount']
-            }
-
-            if (
-                ("autonomous" in row['Session Type']) or
-                ("assisted" in row['Session Type'])
-            ):
-                if "autonomous" in row['Session Type']:
-                    self.num_auto_sessions += 1
-                if "assisted" in row['Session Type']:
-                    self.num_assist_sessions += 1                    
-
-                self.sessions.append(
-                    AutoAssistSession(
-                        row['Duration (booked)'],
-                        row['Duration (used)'],
-                        row['Notes'],
-                        row['Fee'],
-                        row['Subsidy'],
-                        **kwargs
-                    )
-                )
-            elif "training" in row['Session Type']:
-                self.num_train_sessions += 1
-                self.sessions.append(
-                    TrainingSession(
-                        row['Duration'],
-                        **kwargs
-                    )
-                )
-            self.num_sessions = len(self.sessions)
+        self.num_sessions = 0
+
+    def _add_session(self, row):
+        """Add a session from one row of the invoice details"""
+        session = self._session(row)
+        if session is None:
+            return
+        if isinstance(session, TrainingSession):
+            self.num_train_sessions += 1
+        else:
+            if "autonomous" in row['Session Type']:
+                self.num_auto_sessions += 1
+            if "assisted" in row['Session Type']:
+                self.num_assist_sessions += 1
+        self._sessions.append(session)
+        self.num_sessions = len(self._sessions)
+
+    @staticmethod
+    def _session(row):
+        """A Session from one row of the invoice details, or None if
+        the session type isn't known"""
+        kwargs = {
+            'session_type': row['Session Type'],
+            'session_ref': row['Reference'],
+            'user': row['User'],
+            'system_type': row['System Type'],
+            'system': row['System'],
+            'date': row['Date'],
+            'start_time': row['Start time'],
+            'final_amount': row['Final Amount']
+        }
+
+        if (
+            ("autonomous" in row['Session Type']) or
+            ("assisted" in row['Session Type'])
+        ):
+            return AutoAssistSession(
+                row['Duration (booked)'],
+                row['Duration (used)'],
+                row['Notes'],
+                row['Fee'],
+                row['Subsidy'],
+                **kwargs
+            )
+        if "training" in row['Session Type']:
+            return TrainingSession(
+                row['Duration'],
+                **kwargs
+            )
+        return None
 
     def filter_by_session_type(self, session_type):
         filtered = []
@@ -166,33 +222,28 @@ class InvoiceItem:
                 filtered.append(session)
         return filtered
 
+    @property
+    def final_pence(self):
+        """The total charged to the account code in whole pence"""
+        if self.properties:
+            # already summed with the rest of the invoice summary
+            return sum(p['Final Amount'] for p in self.properties.values())
+        return total_pence([s.final_amount for s in self.sessions])
+
     @property
     def final_amount(self):
-        total = 0.0
-        for session in self.sessions:
-            total += session.final_amount
-        return total
+        return self.final_pence / 100.0
 
     def total_charge(self, sessions):
-        total = 0.0
-        for session in sessions:
-            total += session.final_amount
-        total = int((total * 100) + 0.5) / float(100)
-        return "{0:.2f}".format(total)
+        """The sum of the sessions' charges as shown on the invoice"""
+        pence = total_pence([s.final_amount for s in sessions])
+        return format_pence([pence])[0]
 
     def final_total(self, autonomous, assisted, training):
-        total = 0.0
-        for auto in autonomous:
-            total += auto.final_amount
-
-        for assit in assisted:
-            total += assit.final_amount
-
-        for train in training:
-            total += train.final_amount
-
-        total = int((total * 100) + 0.5) / float(100)
-        return "{0:.2f}".format(total)
+        pence = total_pence(
+            [s.final_amount for s in autonomous + assisted + training]
+        )
+        return format_pence([pence])[0]
 
     def check_for_adjustments(self, sessions):
         fee_flag = False
@@ -237,6 +288,24 @@ class Invoice:
         self.assist_items = 0
         self.train_items = 0
         self.n_items = (len(self.items))
+        # the parsed invoice details and raw group json, kept
+        # so a draft invoice can be refreshed incrementally
+        self.details = None
+        self.groups = {}
+        # memory-mapped columns when opened from the column store,
+        # in which case `details` isn't loaded
+        self.columns = None
+        # summary of every account code and session type, see
+        # `utils.aggregates.summarise`
+        self.summary = None
+
+    def set_summary(self, summary):
+        """Cache the summary of the invoice details"""
+        self.summary = summary
+
+    def item_properties(self, bcode):
+        """The cached summary of one account code for the tables"""
+        return item_properties(self.summary, bcode)
 
     def __getitem__(self, i):
         return self.items[i]
@@ -281,9 +350,134 @@ class Invoice:
 
         self.n_items = len(self.items)
 
+    def remove(self, bcode):
+        self.items = [i for i in self.items if i.bcode != bcode]
+        self.update_counts()
+
+    def update_counts(self):
+        """Recount the items with each session type"""
+        self.autonomous_items = 0
+        self.assist_items = 0
+        self.train_items = 0
+        for item in self.items:
+            if item.num_auto_sessions > 0:
+                self.autonomous_items += 1
+            if item.num_assist_sessions > 0:
+                self.assist_items += 1
+            if item.num_train_sessions > 0:
+                self.train_items += 1
+
+        self.n_items = len(self.items)
+
+    def update_items(self, details, summary, groups, items):
+        """
+        Apply a refresh of the invoice (see `threads._refreshInvoice`).
+        Each InvoiceItem in `items`, keyed by account code, replaces the
+        item for its account code or is added, and account codes mapped
+        to None are removed.
+        """
+        self.details = details
+        self.groups = groups
+        self.set_summary(summary)
+        positions = {item.bcode: i for i, item in enumerate(self.items)}
+        for bcode, item in items.items():
+            if item is not None and bcode in positions:
+                self.items[positions[bcode]] = item
+            elif item is not None:
+                self.items.append(item)
+        removed = set(b for b, item in items.items() if item is None)
+        self.items = [i for i in self.items if i.bcode not in removed]
+        self.update_counts()
+
     def item_for_bcode(self, bcode):
         item = None
         for i in self.items:
             if i.bcode == bcode:
                 item = i
         return item
+
+
+class SessionTableModel(QtCore.QAbstractTableModel):
+    """
+    Table model listing the sessions of an InvoiceItem for the invoice
+    preview. Rows are added to the view a batch at a time as it is
+    scrolled (see `canFetchMore`), so an item with thousands of
+    sessions opens straight away.
+    """
+    # (header, Session attribute) of each column, training sessions
+    # have a duration in place of the booked and used times
+    COLUMNS = [
+        ("Session type", "session_type"),
+        ("Session", "session_ref"),
+        ("User", "user"),
+        ("Type", "system_type"),
+        ("System", "system"),
+        ("Date", "date"),
+        ("Start time", "start_time"),
+        ("Booked time (minutes)", "booked_time"),
+        ("Used time (minutes)", "used_time"),
+        ("Duration (minutes)", "duration"),
+        ("Notes", "notes"),
+        ("Final Amount", "final_amount"),
+    ]
+    RIGHT_ALIGNED = (
+        "date", "start_time", "booked_time", "used_time", "duration",
+        "final_amount",
+    )
+
+    def __init__(self, sessions, batch_size=200, parent=None):
+        super(SessionTableModel, self).__init__(parent)
+        self.sessions = sessions
+        self.batch_size = batch_size
+        self.loaded = min(batch_size, len(sessions))
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.loaded
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.COLUMNS)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        attribute = self.COLUMNS[index.column()][1]
+        if role == QtCore.Qt.DisplayRole:
+            session = self.sessions[index.row()]
+            if not hasattr(session, attribute):
+                return ""
+            if attribute == "date":
+                return format_date(session.date)
+            if attribute == "final_amount":
+                return session.round_final_amount()
+            return str(getattr(session, attribute))
+        if role == QtCore.Qt.TextAlignmentRole:
+            if attribute in self.RIGHT_ALIGNED:
+                return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+            return int(QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return self.COLUMNS[section][0]
+        return str(section + 1)
+
+    def canFetchMore(self, parent):
+        if parent.isValid():
+            return False
+        return self.loaded < len(self.sessions)
+
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+        count = min(self.batch_size, len(self.sessions) - self.loaded)
+        self.beginInsertRows(
+            QtCore.QModelIndex(), self.loaded, self.loaded + count - 1
+        )
+        self.loaded += count
+        self.endInsertRows()
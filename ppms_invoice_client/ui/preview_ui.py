@@ -16,10 +16,29 @@ class Ui_Dialog(object):
         Dialog.resize(800, 681)
         self.gridLayout = QtWidgets.QGridLayout(Dialog)
         self.gridLayout.setObjectName("gridLayout")
-        self.invoice_preview = QtWidgets.QTextEdit(Dialog)
+        self.preview_tabs = QtWidgets.QTabWidget(Dialog)
+        self.preview_tabs.setObjectName("preview_tabs")
+        self.invoice_tab = QtWidgets.QWidget()
+        self.invoice_tab.setObjectName("invoice_tab")
+        self.verticalLayout_2 = QtWidgets.QVBoxLayout(self.invoice_tab)
+        self.verticalLayout_2.setObjectName("verticalLayout_2")
+        self.invoice_preview = QtWidgets.QTextEdit(self.invoice_tab)
         self.invoice_preview.setReadOnly(True)
         self.invoice_preview.setObjectName("invoice_preview")
-        self.gridLayout.addWidget(self.invoice_preview, 1, 1, 1, 1)
+        self.verticalLayout_2.addWidget(self.invoice_preview)
+        self.preview_tabs.addTab(self.invoice_tab, "")
+        self.sessions_tab = QtWidgets.QWidget()
+        self.sessions_tab.setObjectName("sessions_tab")
+        self.verticalLayout_3 = QtWidgets.QVBoxLayout(self.sessions_tab)
+        self.verticalLayout_3.setObjectName("verticalLayout_3")
+        self.sessions_view = QtWidgets.QTableView(self.sessions_tab)
+        self.sessions_view.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.sessions_view.setAlternatingRowColors(True)
+        self.sessions_view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.sessions_view.setObjectName("sessions_view")
+        self.verticalLayout_3.addWidget(self.sessions_view)
+        self.preview_tabs.addTab(self.sessions_tab, "")
+        self.gridLayout.addWidget(self.preview_tabs, 1, 1, 1, 1)
         self.verticalLayout = QtWidgets.QVBoxLayout()
         self.verticalLayout.setObjectName("verticalLayout")
         self.horizontalLayout_2 = QtWidgets.QHBoxLayout()
@@ -51,6 +70,7 @@ class Ui_Dialog(object):
         self.gridLayout.addLayout(self.horizontalLayout, 2, 1, 1, 1)
 
         self.retranslateUi(Dialog)
+        self.preview_tabs.setCurrentIndex(0)
         QtCore.QMetaObject.connectSlotsByName(Dialog)
 
     def retranslateUi(self, Dialog):
@@ -58,4 +78,6 @@ class Ui_Dialog(object):
         Dialog.setWindowTitle(_translate("Dialog", "Invoice Preview"))
         self.label.setText(_translate("Dialog", "To"))
         self.label_2.setText(_translate("Dialog", "CC"))
+        self.preview_tabs.setTabText(self.preview_tabs.indexOf(self.invoice_tab), _translate("Dialog", "Invoice"))
+        self.preview_tabs.setTabText(self.preview_tabs.indexOf(self.sessions_tab), _translate("Dialog", "Sessions"))
         self.preview_cancel.setText(_translate("Dialog", "Close"))
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file 'ppms_invoice_client\ui\profiles.ui'
+#
+# Created by: PyQt5 UI code generator 5.14.0
+#
+# WARNING! All changes made in this file will be lost!
+
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+class Ui_Dialog(object):
+    def setupUi(self, Dialog):
+        Dialog.setObjectName("Dialog")
+        Dialog.resize(460, 340)
+        self.gridLayout = QtWidgets.QGridLayout(Dialog)
+        self.gridLayout.setObjectName("gridLayout")
+        self.profile_list = QtWidgets.QListWidget(Dialog)
+        self.profile_list.setObjectName("profile_list")
+        self.gridLayout.addWidget(self.profile_list, 0, 0, 1, 3)
+        self.label = QtWidgets.QLabel(Dialog)
+        self.label.setObjectName("label")
+        self.gridLayout.addWidget(self.label, 1, 0, 1, 1)
+        self.name_edit = QtWidgets.QLineEdit(Dialog)
+        self.name_edit.setObjectName("name_edit")
+        self.gridLayout.addWidget(self.name_edit, 1, 1, 1, 1)
+        self.save_btn = QtWidgets.QPushButton(Dialog)
+        self.save_btn.setObjectName("save_btn")
+        self.gridLayout.addWidget(self.save_btn, 1, 2, 1, 1)
+        self.horizontalLayout_2 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_2.setObjectName("horizontalLayout_2")
+        self.use_btn = QtWidgets.QPushButton(Dialog)
+        self.use_btn.setObjectName("use_btn")
+        self.horizontalLayout_2.addWidget(self.use_btn)
+        self.delete_btn = QtWidgets.QPushButton(Dialog)
+        self.delete_btn.setObjectName("delete_btn")
+        self.horizontalLayout_2.addWidget(self.delete_btn)
+        spacerItem = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.horizontalLayout_2.addItem(spacerItem)
+        self.gridLayout.addLayout(self.horizontalLayout_2, 2, 0, 1, 3)
+        self.send_chk = QtWidgets.QCheckBox(Dialog)
+        self.send_chk.setObjectName("send_chk")
+        self.gridLayout.addWidget(self.send_chk, 3, 0, 1, 3)
+        self.copy_chk = QtWidgets.QCheckBox(Dialog)
+        self.copy_chk.setObjectName("copy_chk")
+        self.gridLayout.addWidget(self.copy_chk, 4, 0, 1, 3)
+        self.horizontalLayout = QtWidgets.QHBoxLayout()
+        self.horizontalLayout.setObjectName("horizontalLayout")
+        spacerItem1 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.horizontalLayout.addItem(spacerItem1)
+        self.run_btn = QtWidgets.QPushButton(Dialog)
+        self.run_btn.setObjectName("run_btn")
+        self.horizontalLayout.addWidget(self.run_btn)
+        self.close_btn = QtWidgets.QPushButton(Dialog)
+        self.close_btn.setObjectName("close_btn")
+        self.horizontalLayout.addWidget(self.close_btn)
+        self.gridLayout.addLayout(self.horizontalLayout, 5, 0, 1, 3)
+
+        self.retranslateUi(Dialog)
+        QtCore.QMetaObject.connectSlotsByName(Dialog)
+
+    def retranslateUi(self, Dialog):
+        _translate = QtCore.QCoreApplication.translate
+        Dialog.setWindowTitle(_translate("Dialog", "Facility profiles"))
+        self.profile_list.setToolTip(_translate("Dialog", "Tick the facilities to include in a batch run"))
+        self.label.setText(_translate("Dialog", "Profile name"))
+        self.save_btn.setToolTip(_translate("Dialog", "Save the current settings as a facility profile"))
+        self.save_btn.setText(_translate("Dialog", "Save current settings"))
+        self.use_btn.setToolTip(_translate("Dialog", "Switch the current settings to the selected profile"))
+        self.use_btn.setText(_translate("Dialog", "Use selected"))
+        self.delete_btn.setText(_translate("Dialog", "Delete"))
+        self.send_chk.setToolTip(_translate("Dialog", "Email each facility\'s newest final invoice, account codes already sent are skipped"))
+        self.send_chk.setText(_translate("Dialog", "Email invoices"))
+        self.copy_chk.setText(_translate("Dialog", "Copy facility managers"))
+        self.run_btn.setToolTip(_translate("Dialog", "Fetch, email and export the newest final invoice of every ticked facility at the same time"))
+        self.run_btn.setText(_translate("Dialog", "Run batch"))
+        self.close_btn.setText(_translate("Dialog", "Close"))
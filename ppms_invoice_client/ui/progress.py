@@ -1,9 +1,21 @@
+import time
+
 from PyQt5 import QtCore, QtGui, QtWidgets
 
 from . import progress_ui as UI
 
 
 class Progress(QtWidgets.QDialog):
+    """
+    Shows the progress of a background job. The bar follows the stage
+    currently running and the table breaks the job down by stage, with
+    throughput, ETA and the status of the last item finished. If no
+    progress is reported for STALL_SECONDS the dialog says what it is
+    waiting on, e.g. when PPMS or the mail server is throttling.
+    """
+    COLS = ["Stage", "Done", "Items/s", "KB/s", "ETA (s)", "Last item", "Status"]
+    STALL_SECONDS = 10
+
     def __init__(self, parent, max_val, title):
         super(Progress, self).__init__(parent)
         self.parent = parent
@@ -12,5 +24,58 @@ class Progress(QtWidgets.QDialog):
         self.setWindowTitle('{} progress'.format(title))
         self.ui.progress.setMaximum(max_val)
 
+        self.ui.stage_table.setColumnCount(len(self.COLS))
+        self.ui.stage_table.setHorizontalHeaderLabels(self.COLS)
+        self.ui.stage_table.verticalHeader().setVisible(False)
+        self.stage_rows = {}
+        self.last_event = None
+        self.last_time = time.perf_counter()
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.checkStalled)
+        self.timer.start(1000)
+
     def updateBar(self, value):
-        self.ui.progress.setValue(value)
\ No newline at end of file
+        self.ui.progress.setValue(value)
+
+    def updateEvent(self, event):
+        """Show a ProgressEvent"""
+        self.last_event = event
+        self.last_time = time.perf_counter()
+
+        self.ui.progress.setMaximum(max(event.total, 1))
+        self.updateBar(event.completed)
+        self.ui.status_label.setText(event.describe())
+
+        table = self.ui.stage_table
+        if event.stage not in self.stage_rows:
+            self.stage_rows[event.stage] = table.rowCount()
+            table.insertRow(table.rowCount())
+        eta = event.eta
+        values = [
+            event.stage,
+            "{}/{}".format(event.completed, event.total),
+            "{:.1f}".format(event.items_per_sec),
+            "{:.1f}".format(event.bytes_per_sec / 1024),
+            "" if eta is None else "{:.0f}".format(eta),
+            "" if event.item is None else str(event.item),
+            event.status,
+        ]
+        rid = self.stage_rows[event.stage]
+        for cid, value in enumerate(values):
+            table.setItem(rid, cid, QtWidgets.QTableWidgetItem(value))
+        table.resizeColumnsToContents()
+
+    def checkStalled(self):
+        event = self.last_event
+        if event is None or event.finished:
+            return
+        waiting = time.perf_counter() - self.last_time
+        if waiting > self.STALL_SECONDS:
+            self.ui.status_label.setText(
+                "{} - no progress for {:.0f}s".format(event.describe(), waiting)
+            )
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        return super().closeEvent(event)
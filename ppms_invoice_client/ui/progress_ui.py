@@ -12,14 +12,25 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 class Ui_Dialog(object):
     def setupUi(self, Dialog):
         Dialog.setObjectName("Dialog")
-        Dialog.resize(371, 61)
+        Dialog.resize(560, 220)
         icon = QtGui.QIcon()
         icon.addPixmap(QtGui.QPixmap(":/newPrefix/icon.ico"), QtGui.QIcon.Normal, QtGui.QIcon.Off)
         Dialog.setWindowIcon(icon)
+        self.verticalLayout = QtWidgets.QVBoxLayout(Dialog)
+        self.verticalLayout.setObjectName("verticalLayout")
+        self.status_label = QtWidgets.QLabel(Dialog)
+        self.status_label.setText("")
+        self.status_label.setObjectName("status_label")
+        self.verticalLayout.addWidget(self.status_label)
         self.progress = QtWidgets.QProgressBar(Dialog)
-        self.progress.setGeometry(QtCore.QRect(30, 20, 321, 21))
         self.progress.setProperty("value", 0)
         self.progress.setObjectName("progress")
+        self.verticalLayout.addWidget(self.progress)
+        self.stage_table = QtWidgets.QTableWidget(Dialog)
+        self.stage_table.setObjectName("stage_table")
+        self.stage_table.setColumnCount(0)
+        self.stage_table.setRowCount(0)
+        self.verticalLayout.addWidget(self.stage_table)
 
         self.retranslateUi(Dialog)
         QtCore.QMetaObject.connectSlotsByName(Dialog)
@@ -0,0 +1,218 @@
+"""Application settings, kept as one immutable snapshot"""
+
+import dataclasses
+import json
+from types import MappingProxyType
+
+from PyQt5 import QtCore
+
+from ..utils import send_email
+from ..utils.render_cache import render_key
+
+
+# every setting is stored under this one QSettings key
+SETTINGS_KEY = "settings"
+# and the facility profiles, the settings for each facility, under this
+PROFILES_KEY = "profiles"
+
+# the facility settings used in the invoices, by their name in the
+# message text and templates
+FACILITY_FIELDS = {
+    "name": "facility_name",
+    "email": "facility_email",
+    "manager_name": "manager_name",
+    "manager_email": "manager_email",
+}
+# the invoice template settings
+COLUMN_FIELDS = [
+    "session_chk", "user_chk", "type_chk", "system_chk", "date_chk",
+    "start_chk", "booked_chk", "used_chk", "notes_chk", "init_amount_chk",
+    "fees_chk", "final_amount_chk", "compact_layout",
+]
+
+
+@dataclasses.dataclass(frozen=True)
+class Settings:
+    """
+    A snapshot of the settings. Snapshots are never changed, `replace`
+    makes a new one with the next `version`, so a snapshot can be
+    handed to a worker as it is and compared or hashed to tell whether
+    anything changed. The version isn't part of the comparison, two
+    snapshots holding the same settings are equal.
+    """
+    invoice_folder: str = ""
+    export_csv: bool = False
+    export_parquet: bool = False
+    record_timings: bool = False
+    profile_jobs: bool = False
+    prerender: bool = False
+    ppms_url: str = ""
+    ppms_key: str = ""
+    exchange_username: str = ""
+    exchange_password: str = ""
+    smtp_server: str = ""
+    from_email: str = ""
+    mail_transport: str = "exchange"
+    test_mode: bool = False
+    test_address: str = ""
+    delivery: str = send_email.DELIVERY_AUTO
+    attach_threshold_kb: int = 1024
+    attach_pdf: bool = False
+    session_chk: bool = False
+    user_chk: bool = False
+    type_chk: bool = False
+    system_chk: bool = False
+    date_chk: bool = False
+    start_chk: bool = False
+    booked_chk: bool = False
+    used_chk: bool = False
+    notes_chk: bool = False
+    init_amount_chk: bool = False
+    fees_chk: bool = False
+    final_amount_chk: bool = False
+    compact_layout: bool = False
+    message_text: str = ""
+    facility_code: str = ""
+    facility_name: str = ""
+    facility_email: str = ""
+    manager_name: str = ""
+    manager_email: str = ""
+    version: int = dataclasses.field(default=0, compare=False)
+
+    def __post_init__(self):
+        # built once per snapshot rather than for every job
+        object.__setattr__(self, "_facility_info", {
+            key: getattr(self, name) for key, name in FACILITY_FIELDS.items()
+        })
+        object.__setattr__(self, "_invoice_columns", {
+            name: getattr(self, name) for name in COLUMN_FIELDS
+        })
+
+    @property
+    def facility_info(self):
+        """The facility settings used in the invoices, read only"""
+        return MappingProxyType(self._facility_info)
+
+    @property
+    def invoice_columns(self):
+        """The invoice template settings, read only"""
+        return MappingProxyType(self._invoice_columns)
+
+    def email_settings(self, copy_manager=False):
+        """The settings for sending email"""
+        return {
+            "username": self.exchange_username,
+            "password": self.exchange_password,
+            "server": self.smtp_server,
+            "from_address": self.from_email,
+            "transport": self.mail_transport,
+            "test_mode": self.test_mode,
+            "test_address": self.test_address,
+            "copy_manager": copy_manager,
+            "manager_address": self.manager_email,
+            "delivery": self.delivery,
+            "attach_threshold": self.attach_threshold_kb * 1024,
+            "attach_pdf": self.attach_pdf,
+        }
+
+    @property
+    def voucher_formats(self):
+        """The file formats the finance voucher is exported in"""
+        formats = ["xlsx"]
+        if self.export_csv:
+            formats.append("csv")
+        if self.export_parquet:
+            formats.append("parquet")
+        return formats
+
+    def render_key(self, ref):
+        """The RenderCache key for invoice `ref` rendered with these settings"""
+        return render_key(
+            ref, self.invoice_folder, self.message_text,
+            self._facility_info, self._invoice_columns
+        )
+
+    def replace(self, **changes):
+        """
+        A snapshot with `changes` applied and the next version, or this
+        snapshot if nothing changed.
+        """
+        settings = dataclasses.replace(
+            self, version=self.version + 1, **changes
+        )
+        return self if settings == self else settings
+
+    def to_dict(self):
+        """The stored settings"""
+        return {f.name: getattr(self, f.name) for f in stored_fields()}
+
+    @classmethod
+    def from_dict(cls, values):
+        """
+        Settings from stored values. Unknown values are ignored and
+        missing ones keep their default.
+        """
+        return cls(**{
+            f.name: f.type(values[f.name])
+            for f in stored_fields() if values.get(f.name) is not None
+        })
+
+
+def stored_fields():
+    """The fields of Settings that are saved"""
+    return [f for f in dataclasses.fields(Settings) if f.name != "version"]
+
+
+def load_settings(qsettings=None):
+    """
+    Read the settings in one go. Settings saved one key at a time by
+    older versions are read key by key the first time.
+    """
+    if qsettings is None:
+        qsettings = QtCore.QSettings("Dan", "ppms")
+    stored = qsettings.value(SETTINGS_KEY, "", type=str)
+    if stored:
+        try:
+            return Settings.from_dict(json.loads(stored))
+        except (ValueError, TypeError):
+            return Settings()
+    return Settings.from_dict({
+        f.name: qsettings.value(f.name, f.default, type=f.type)
+        for f in stored_fields()
+    })
+
+
+def save_settings(settings, qsettings=None):
+    """Write the settings as a single value"""
+    if qsettings is None:
+        qsettings = QtCore.QSettings("Dan", "ppms")
+    qsettings.setValue(SETTINGS_KEY, json.dumps(settings.to_dict()))
+
+
+def load_profiles(qsettings=None):
+    """
+    The saved facility profiles.
+
+    Returns
+    --------
+        dict of Settings keyed by profile name
+    """
+    if qsettings is None:
+        qsettings = QtCore.QSettings("Dan", "ppms")
+    stored = qsettings.value(PROFILES_KEY, "", type=str)
+    try:
+        profiles = json.loads(stored) if stored else {}
+    except ValueError:
+        return {}
+    return {
+        name: Settings.from_dict(values) for name, values in profiles.items()
+    }
+
+
+def save_profiles(profiles, qsettings=None):
+    """Write the facility profiles as a single value"""
+    if qsettings is None:
+        qsettings = QtCore.QSettings("Dan", "ppms")
+    qsettings.setValue(PROFILES_KEY, json.dumps({
+        name: settings.to_dict() for name, settings in profiles.items()
+    }))
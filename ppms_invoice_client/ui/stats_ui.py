@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file 'ppms_invoice_client\ui\stats.ui'
+#
+# Created by: PyQt5 UI code generator 5.14.0
+#
+# WARNING! All changes made in this file will be lost!
+
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+class Ui_Dialog(object):
+    def setupUi(self, Dialog):
+        Dialog.setObjectName("Dialog")
+        Dialog.resize(640, 360)
+        self.gridLayout = QtWidgets.QGridLayout(Dialog)
+        self.gridLayout.setObjectName("gridLayout")
+        self.stats_table = QtWidgets.QTableWidget(Dialog)
+        self.stats_table.setObjectName("stats_table")
+        self.stats_table.setColumnCount(0)
+        self.stats_table.setRowCount(0)
+        self.gridLayout.addWidget(self.stats_table, 0, 0, 1, 1)
+        self.horizontalLayout = QtWidgets.QHBoxLayout()
+        self.horizontalLayout.setObjectName("horizontalLayout")
+        self.reset_btn = QtWidgets.QPushButton(Dialog)
+        self.reset_btn.setObjectName("reset_btn")
+        self.horizontalLayout.addWidget(self.reset_btn)
+        spacerItem = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.horizontalLayout.addItem(spacerItem)
+        self.save_btn = QtWidgets.QPushButton(Dialog)
+        self.save_btn.setObjectName("save_btn")
+        self.horizontalLayout.addWidget(self.save_btn)
+        self.close_btn = QtWidgets.QPushButton(Dialog)
+        self.close_btn.setObjectName("close_btn")
+        self.horizontalLayout.addWidget(self.close_btn)
+        self.gridLayout.addLayout(self.horizontalLayout, 1, 0, 1, 1)
+
+        self.retranslateUi(Dialog)
+        QtCore.QMetaObject.connectSlotsByName(Dialog)
+
+    def retranslateUi(self, Dialog):
+        _translate = QtCore.QCoreApplication.translate
+        Dialog.setWindowTitle(_translate("Dialog", "Timings"))
+        self.reset_btn.setText(_translate("Dialog", "Reset"))
+        self.save_btn.setText(_translate("Dialog", "Save report"))
+        self.close_btn.setText(_translate("Dialog", "Close"))
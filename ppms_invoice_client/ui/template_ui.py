@@ -13,7 +13,7 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 class Ui_Dialog(object):
     def setupUi(self, Dialog):
         Dialog.setObjectName("Dialog")
-        Dialog.resize(462, 651)
+        Dialog.resize(462, 675)
         self.gridLayout = QtWidgets.QGridLayout(Dialog)
         self.gridLayout.setObjectName("gridLayout")
         self.label_2 = QtWidgets.QLabel(Dialog)
@@ -69,6 +69,9 @@ class Ui_Dialog(object):
         self.final_amount_chk.setObjectName("final_amount_chk")
         self.verticalLayout_3.addWidget(self.final_amount_chk)
         self.gridLayout.addLayout(self.verticalLayout_3, 1, 1, 1, 1)
+        self.compact_chk = QtWidgets.QCheckBox(Dialog)
+        self.compact_chk.setObjectName("compact_chk")
+        self.gridLayout.addWidget(self.compact_chk, 2, 0, 1, 2)
         self.verticalLayout_2 = QtWidgets.QVBoxLayout()
         self.verticalLayout_2.setObjectName("verticalLayout_2")
         self.label = QtWidgets.QLabel(Dialog)
@@ -98,7 +101,7 @@ class Ui_Dialog(object):
         self.message_text = QtWidgets.QPlainTextEdit(Dialog)
         self.message_text.setObjectName("message_text")
         self.verticalLayout_2.addWidget(self.message_text)
-        self.gridLayout.addLayout(self.verticalLayout_2, 2, 0, 1, 2)
+        self.gridLayout.addLayout(self.verticalLayout_2, 3, 0, 1, 2)
         self.horizontalLayout = QtWidgets.QHBoxLayout()
         self.horizontalLayout.setObjectName("horizontalLayout")
         spacerItem = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
@@ -109,7 +112,7 @@ class Ui_Dialog(object):
         self.template_cancel = QtWidgets.QPushButton(Dialog)
         self.template_cancel.setObjectName("template_cancel")
         self.horizontalLayout.addWidget(self.template_cancel)
-        self.gridLayout.addLayout(self.horizontalLayout, 3, 0, 1, 2)
+        self.gridLayout.addLayout(self.horizontalLayout, 4, 0, 1, 2)
 
         self.retranslateUi(Dialog)
         QtCore.QMetaObject.connectSlotsByName(Dialog)
@@ -130,6 +133,8 @@ class Ui_Dialog(object):
         self.init_amount_chk.setText(_translate("Dialog", "Initial Amount"))
         self.fees_chk.setText(_translate("Dialog", "Fees"))
         self.final_amount_chk.setText(_translate("Dialog", "Final Amount"))
+        self.compact_chk.setToolTip(_translate("Dialog", "Style the invoice with classes instead of inline styles and leave out unchecked columns, for much smaller emails"))
+        self.compact_chk.setText(_translate("Dialog", "Compact email layout"))
         self.label.setText(_translate("Dialog", "Message"))
         self.label_3.setText(_translate("Dialog", "Instructions:"))
         self.label_5.setText(_translate("Dialog", "MONTH  - The month the sessions took place"))
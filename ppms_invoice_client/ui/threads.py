@@ -7,6 +7,8 @@ from datetime import datetime
 import requests
 from collections import OrderedDict
 import html
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from PyQt5 import QtWidgets
 from PyQt5.QtCore import QThread, QRunnable, QObject
@@ -23,10 +25,31 @@ else:
 
 from .models import Invoice, InvoiceItem
 from ..utils.recipient import recipient_from_group
-from ..utils.html_convert import create_html
+from ..utils.html_convert import create_html, create_summary_html, save_html
+from ..utils.snapshot import SnapshotStore
+from ..utils.column_store import ColumnStore, InvoiceColumns
+from ..utils.voucher import voucher_rows, total_rows, write_voucher
+from ..utils.metrics import span
+from ..utils.aggregates import (
+    summarise, item_properties, SUMMARY_INPUT_COLUMNS
+)
+from ..utils.invoice_schema import read_section, join_sections
+from ..utils.money import to_pence, to_pounds
+from ..utils.render_cache import render_key
+from ..utils.http_session import session_for
+from ..utils.profiler import profile_folder, run_profiled
+from ..utils.process_pool import get_pool
+from ..utils.progress import (
+    ProgressTracker, LabelledSignal, DONE, CACHED, FAILED
+)
+from ..utils import journal as send_journal
 from ..utils import send_email   
 
 
+# most PUMAPI calls made at the same time by one worker
+MAX_CONNECTIONS = 4
+
+
 class EmailError(Exception):
     pass
 
@@ -67,6 +90,10 @@ class Worker(QRunnable):
         Arguments to pass to the callback function
     kwargs: dict
         Keywords to pass to the callback function
+
+    When profiling is switched on, from the settings or the PPMS_PROFILE
+    environment variable, each job is run under a profiler and the
+    profile is saved named after the callback and invoice ref.
     '''
 
     def __init__(self, callback, *args, **kwargs):
@@ -90,7 +117,13 @@ class Worker(QRunnable):
 
         # Retrieve args/kwargs here; and fire processing using them
         try:
-            result = self.callback(*self.args, **self.kwargs)
+            folder = profile_folder()
+            if folder:
+                result = run_profiled(
+                    folder, self.callback, *self.args, **self.kwargs
+                )
+            else:
+                result = self.callback(*self.args, **self.kwargs)
         except:
             traceback.print_exc()
             exctype, value = sys.exc_info()[:2]
@@ -101,11 +134,45 @@ class Worker(QRunnable):
             self.signals.finished.emit()  # Done
 
 
+class ProcessWorker(QRunnable):
+    '''
+    Worker for CPU-heavy jobs, such as parsing, summing and writing
+    large invoices, which runs the callback in a separate process (see
+    `process_pool.ProcessPool`) so it can use another core and doesn't
+    hold the GIL while the GUI is drawing. It is started on a
+    QThreadPool and has the same signals as Worker.
+
+    The callback must be a module level function and its arguments and
+    result must be picklable. Its `progress_callback` and
+    `custom_callback` are stand-ins in the other process, whatever is
+    emitted through them is emitted by this worker's signals.
+    '''
+
+    def __init__(self, callback, *args, **kwargs):
+        super().__init__()
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            result = get_pool().run(
+                self.signals, self.callback, *self.args, **self.kwargs
+            )
+        except:
+            traceback.print_exc()
+            exctype, value = sys.exc_info()[:2]
+            self.signals.error.emit((exctype, value, traceback.format_exc()))
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
 ####
 # Helpers for thread functions
-def _interleave(list1, list2):
-    return [val for pair in zip(list1, list2) for val in pair]
-
 def _processMessageText(message_text, invoice_date, facility_info):
     """
     Takes message text from dialog and inserts facility info and formats
@@ -154,6 +221,21 @@ def _getGroup(url, key, group_ref):
     -------
         A Recipient object
     """
+    return recipient_from_group(_getGroupJson(url, key, group_ref))
+
+
+def _getGroupJson(url, key, group_ref):
+    """Set up a PUMAPI call with the action `getgroup`
+
+    Arguments
+    ----
+        group_ref: str
+            The grant code as a reference to the group in PPMS
+
+    Returns
+    -------
+        The group as json text
+    """
 
     if "'" in group_ref:
         group_ref = group_ref.replace("'", "&#39;")
@@ -164,79 +246,40 @@ def _getGroup(url, key, group_ref):
         'apikey': key,
         'format': 'json'
     }
-    resp = requests.post(url, data=data)
+    with span('pumapi.getgroup'):
+        resp = session_for(url, key).post(url, data=data)
     if resp.status_code == 200 and resp.text:
-        return recipient_from_group(resp.text)
+        return resp.text
     else:
         raise ValueError("Response not received from PPMS")
 
 
-def _invoiceSummary(invoice, session_type='autonomous'):
-    """
-    Summarises invoice for autonomous, training sessions
-    and assisted sessions for a particular grant code.
+def _getInvoiceList(url, key, draft):
+    """Set up a PUMAPI call with the action `getinvoicelist`
 
     Arguments
-    ---------
-    invoice: Pandas DataFrame
-        DataFrame holding the entire invoice for a particular account code
-    session_type: str
-        The DataFrame is filtered by `Session Type` to collect sessions
-        together.
+    ----
+        draft: str
+            "true" for draft invoices, "false" for final invoices
 
     Returns
     -------
-    summary: Pandas Series
-        A Pandas Series containing information about sessions of a particular type.
-        Columns for training sessions are:
-        ['Account Number', 'Group', 'Sessions', 'Hours booked', 'Final Amount']
-        Columns for autonomous and assisted sessions are:
-        ['Account Number', 'Group', 'Sessions', 'Hours Booked',
-        'Hours used', 'Rebate', 'Fees', 'Initial Amount', 'Final Amount']
-
-    """
-    sessions = invoice[invoice['Session Type'] == session_type]
-    summary = None
-    if not sessions.empty:
-        if session_type == 'training':
-            summary = pd.Series(dtype='object')
-            summary['Account Number'] = sessions['Account number'].values[0]
-            summary['Group'] = sessions['Group'].values[0]
-            summary['Sessions'] = len(invoice.index)
-            summary['Hours booked'] = float(
-                pd.to_numeric(sessions['Duration']).sum()
-            ) / 60.0
-            summary['Final Amount'] = float(
-                pd.to_numeric(sessions['Final Amount']).sum()
-            )
+        A list of invoice references in the order PPMS returns them
+    """
 
-        else:
-            summary = pd.Series(dtype='object')
-            summary['Account Number'] = sessions['Account number'].values[0]
-            summary['Group'] = sessions['Group'].values[0]
-            summary['Sessions'] = len(sessions.index)
-            summary['Hours booked'] = float(
-                pd.to_numeric(sessions['Duration (booked)']).sum()
-            ) / 60.0
-            summary['Hours used'] = float(
-                pd.to_numeric(sessions['Duration (used)']).sum()
-            ) / 60.0
-            summary['Rebate'] = float(
-                pd.to_numeric(sessions['Rebate']).sum()
-            )
-            summary['Fees'] = float(
-                pd.to_numeric(sessions['Fee']).sum()
-            )
-            summary['Final Amount'] = float(
-                pd.to_numeric(sessions['Final Amount']).sum()
-            )
-            summary['Initial Amount'] = float(
-                pd.to_numeric(sessions['Final Amount']).sum() +
-                pd.to_numeric(sessions['Fee']).sum() -
-                pd.to_numeric(sessions['Rebate']).sum()
-            )
+    data = {
+        "action": "getinvoicelist",
+        "apikey": key,
+        "draft": draft
+    }
+    with span('pumapi.getinvoicelist'):
+        response = session_for(url, key).post(url, data=data)
+    if response.status_code == 200 and response.text:
+        refs = [r.strip("\n") for r in response.text.split("\r")]
+        return refs[:-1]
+    else:
+        raise ValueError("Response not received from PPMS")
 
-    return summary
 
 def _getInvoiceDetails(url, key, ref, bcode=None):
     """
@@ -259,6 +302,26 @@ def _getInvoiceDetails(url, key, ref, bcode=None):
     -------
     invoice: Pandas DataFrame
 
+    Raises
+    ------
+    ValueError
+        If no response is received from the PPMS server or if the
+        response contains an empty string.
+    """
+    invoice_text = _getInvoiceDetailsText(url, key, ref, bcode=bcode)
+    return _parseInvoiceDetails(invoice_text, bcode=bcode)
+
+
+def _getInvoiceDetailsText(url, key, ref, bcode=None):
+    """
+    Uses a PPMS PUMAPI call ('getinvoicedetails') to get the raw text
+    of all sessions for a given invoice ref or for a specific grant
+    code if `bcode` is supplied.
+
+    Returns
+    -------
+    invoice_text: str
+
     Raises
     ------
     ValueError
@@ -271,36 +334,214 @@ def _getInvoiceDetails(url, key, ref, bcode=None):
         "apikey": key,
         "invoiceid": ref,
     }
-    a_df_header = 0
     if bcode:
         data['bcode'] = bcode
-        a_df_header = 1
 
-    resp = requests.post(url, data=data)
+    with span('pumapi.getinvoicedetails'):
+        resp = session_for(url, key).post(url, data=data)
     if resp.status_code == 200 and resp.text:
-        invoice_text = resp.text.split("\r\n", 2)[2]
-        if "Autonomous" in resp.text and "Training" in resp.text:
+        return resp.text
+    else:
+        raise ValueError("Response not received from PPMS")
+
+
+def _parseInvoiceDetails(text, bcode=None):
+    """
+    Turn the raw text returned by `getinvoicedetails` into a DataFrame,
+    typed with the invoice schema (see `utils.invoice_schema`).
+
+    Arguments
+    ---------
+    text: str
+        The response text from PPMS.
+    bcode: str
+        The account code if the call was made for a specific account code.
+
+    Returns
+    -------
+    invoice: Pandas DataFrame
+    """
+    a_df_header = 0
+    if bcode:
+        a_df_header = 1
+
+    with span('parse.invoice_details'):
+        invoice_text = text.split("\r\n", 2)[2]
+        if "Autonomous" in text and "Training" in text:
             a = invoice_text[0:invoice_text.find("Training")]
-            a_df = pd.read_csv(StringIO(a), sep=",", header=a_df_header)
+            a_df = read_section(a, header=a_df_header)
             t = invoice_text[invoice_text.find("Training"):]
-            t_df = pd.read_csv(StringIO(t), sep=",", header=1)
-            invoice = pd.concat([a_df, t_df], axis=0, ignore_index=True, sort=True)
+            t_df = read_section(t, header=1)
+            invoice = join_sections([a_df, t_df])
         else:
-            invoice = pd.read_csv(StringIO(invoice_text), sep=",", header=1)
+            invoice = read_section(invoice_text, header=1)
+
+    return invoice
 
-        return invoice
+
+def _sessionsPeriod(ref):
+    """
+    The month and year the sessions on an invoice took place in, which
+    is the month before the invoice date.
+
+    Returns
+    -------
+        tuple of the month name and the year as strings
+    """
+    if 'DRAFT' in ref:
+        ref_date = datetime.strptime(ref[17:25], "%Y%m%d")
     else:
-        raise ValueError("Response not received from PPMS")
+        ref_date = datetime.strptime(ref[17:], "%Y%m%d")
+
+    # get month and year from ref
+    month = int(ref_date.strftime("%m")) - 1
+    year = int(ref_date.strftime("%Y"))
+
+    if month == 0:
+        month = 12
+        year = year - 1
+    sess_month = datetime.strptime(str(month), "%m")
+    return sess_month.strftime("%B"), str(year)
+
+
+def _loadInvoiceText(url, key, ref, store=None):
+    """
+    Get the raw invoice details text for `ref`, from the snapshot store
+    if it holds the invoice or otherwise from PPMS.
+
+    Returns
+    -------
+        tuple of the raw details text, a dict of any group json
+        held in the snapshot and whether it came from the snapshot
+    """
+    if store is not None and SnapshotStore.is_final(ref) and store.has(ref):
+        with span('snapshot.load'):
+            details_text, groups = store.load(ref)
+        return details_text, groups, True
+    return _getInvoiceDetailsText(url, key, ref), {}, False
+
+
+def _invoiceBcodes(details):
+    """The account codes from the invoice details, or from the column
+    store, that get an InvoiceItem"""
+    if isinstance(details, InvoiceColumns):
+        return details.bcodes
+    return sorted(details['Account number'].unique())
+
+
+def _resolveGroups(url, key, group_refs, groups, progress_callback=None):
+    """
+    Recipients for the groups in `group_refs`. Several account codes
+    often belong to one group, so each group is only looked up once:
+    the json is taken from `groups` or fetched from PPMS (concurrently,
+    and added to `groups`), then parsed once per group.
+
+    Returns
+    -------
+        dict of Recipient keyed by group unitlogin
+    """
+    group_refs = sorted(set(group_refs))
+    missing = [g for g in group_refs if g not in groups]
+    if missing:
+        fetch_groups = ProgressTracker('groups', len(missing), progress_callback)
+        with ThreadPoolExecutor(max_workers=MAX_CONNECTIONS) as executor:
+            for group_ref, group_json in zip(missing, executor.map(
+                    lambda g: _getGroupJson(url, key, g), missing)):
+                groups[group_ref] = group_json
+                fetch_groups.advance(group_ref, nbytes=len(group_json))
+    return {g: recipient_from_group(groups[g]) for g in group_refs}
+
+
+def _itemRecipients(url, key, summary, groups, bcodes,
+                    progress_callback=None):
+    """
+    A Recipient for each account code in `bcodes`, sharing the group
+    details between account codes of the same group but each with its
+    own invoice item state (see `Recipient.for_bcode`). The group of
+    each account code is taken from the invoice `summary` and the group
+    json from `groups`, which any groups fetched from PPMS are added to.
+
+    Returns
+    -------
+        dict of Recipient keyed by account code
+    """
+    bcode_groups = summary['Group'].groupby(level=0).first()
+    bcode_groups = {b: str(bcode_groups[b]) for b in bcodes}
+    recipients = _resolveGroups(
+        url, key, bcode_groups.values(), groups, progress_callback
+    )
+    return {
+        b: recipients[group_ref].for_bcode(b)
+        for b, group_ref in bcode_groups.items()
+    }
+
+
+def _invoiceItem(bcode, item_details, group, properties=None):
+    """Create an InvoiceItem for an account code from its sessions,
+    with its `properties` from the invoice summary if given"""
+    with span('build.invoice_item'):
+        item = InvoiceItem(bcode, group)
+        item.sessions_from_dataframe(item_details, properties=properties)
+    return item
+
+
+def _invoiceItemFromColumns(bcode, columns, group, properties=None):
+    """Create an InvoiceItem for an account code from its rows of the
+    column store"""
+    with span('build.invoice_item'):
+        item = InvoiceItem(bcode, group)
+        item.sessions_from_columns(columns.view(bcode), properties=properties)
+    return item
+
+
+def _sessionIndex(details, columns):
+    """
+    Map each session in the invoice details, keyed by session type and
+    reference, to its account code and a hash of the whole row.
+    """
+    details = details.reindex(columns=columns)
+    hashes = pd.util.hash_pandas_object(details, index=False).values
+    keys = zip(details['Session Type'], details['Reference'])
+    return {
+        k: (bcode, h)
+        for k, bcode, h in zip(keys, details['Account number'], hashes)
+    }
+
+
+def _changedBcodes(old_details, new_details):
+    """
+    Compare two versions of the invoice details session by session and
+    return the account codes that had sessions added, removed or changed.
+    """
+    columns = sorted(set(old_details.columns) | set(new_details.columns))
+    old_sessions = _sessionIndex(old_details, columns)
+    new_sessions = _sessionIndex(new_details, columns)
+
+    changed = set()
+    for session_ref in old_sessions.keys() | new_sessions.keys():
+        old_session = old_sessions.get(session_ref)
+        new_session = new_sessions.get(session_ref)
+        if old_session != new_session:
+            changed.update(
+                s[0] for s in (old_session, new_session) if s is not None
+            )
+    return sorted(changed)
 
 
 ####
 # Functions run by worker threads
 
-def _connect(url, key, progress_callback=None,
+def _connect(url, key, snapshot_folder=None, progress_callback=None,
             custom_callback=None):
     """
     A callback used by a worker thread. Uses `getinvoicelist` PPMS
-    PUMAPI call to get a list of invoice references.
+    PUMAPI call to get a list of invoice references. The draft and
+    final lists are requested concurrently and each is emitted through
+    `custom_callback` as a tuple `(draft, refs)` as soon as it arrives.
+
+    If PPMS can't be reached and `snapshot_folder` is supplied, the
+    references of the invoices in the snapshot store are returned
+    instead so archived invoices can still be opened offline.
 
     Arguments
     ---------
@@ -308,15 +549,18 @@ def _connect(url, key, progress_callback=None,
         The PPMS facility instance url.
     key: str
         The PPMS PUMAPI key for the facility.
+    snapshot_folder: str
+        The folder holding the snapshot store, normally the invoice folder.
     progress_callback: PyQt progress signal
-        A signal that can be used to update a progress bar.
+        A signal that can be used to update a progress bar, emits a
+        ProgressEvent as each item of each stage finishes.
     custom_callback: PyQt signal   
         A user defined signal.
 
     Returns:
     --------
     invoices : list of str
-        A list of invoice references.
+        A list of invoice references, most recent drafts first.
 
     Raises
     ------
@@ -326,39 +570,62 @@ def _connect(url, key, progress_callback=None,
     
     """
 
-    draft = ["false", "true"]
-    invoices = []
-    for d in draft:
-        data = {
-            "action": "getinvoicelist",
-            "apikey": key,
-            "draft": d
-        }
-        response = requests.post(url, data=data)
-        if response.status_code == 200 and response.text:
-            refs = [r.strip("\n") for r in response.text.split("\r")]
-            invoices.extend(refs[:-1])
-        else:
-            raise ValueError("Response not received from PPMS")
-
-    return invoices[::-1]
-
-
-def _fetchInvoice(url, key, ref, progress_callback=None,
-                  custom_callback=None):
+    # ask for the final and draft lists at the same time and pass
+    # each one back as soon as it arrives so the combo box can be filled
+    invoices = {}
+    tracker = ProgressTracker('connect', 2, progress_callback)
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = {
+                executor.submit(_getInvoiceList, url, key, d): d
+                for d in ["false", "true"]
+            }
+            for future in as_completed(futures):
+                draft = futures[future] == "true"
+                refs = future.result()[::-1]
+                invoices[draft] = refs
+                tracker.advance('draft' if draft else 'final')
+                if custom_callback is not None:
+                    custom_callback.emit((draft, refs))
+    except requests.exceptions.ConnectionError:
+        if not snapshot_folder or invoices:
+            raise
+        # offline, fall back to the invoices in the snapshot store
+        invoices[True] = []
+        invoices[False] = SnapshotStore(snapshot_folder).refs()
+        tracker.advance('snapshots', CACHED)
+        if custom_callback is not None:
+            custom_callback.emit((True, invoices[True]))
+            custom_callback.emit((False, invoices[False]))
+
+    return invoices[True] + invoices[False]
+
+
+def _fetchInvoice(url, key, ref, snapshot_folder=None,
+                  progress_callback=None, custom_callback=None):
     """
     Use PPMS PUMAPI call `getinvoice` to get the entire invoice. Create
     an InvoiceItem for each account code and store in an Invoice instance
     ready for display in a PyQt TableWidget.
 
+    Final invoices can never change, so if `snapshot_folder` is supplied
+    they are saved to the local snapshot and column stores after the
+    first fetch. Later fetches open the memory-mapped column store, so
+    the invoice details aren't parsed or held in memory.
+
     Arguments
     ---------
     url: str
         The PPMS facility instance url.
     key: str
         The PPMS PUMAPI key for the facility.
+    ref: str
+        The invoice reference.
+    snapshot_folder: str
+        The folder holding the snapshot store, normally the invoice folder.
     progress_callback: PyQt progress signal
-        A signal that can be used to update a progress bar.
+        A signal that can be used to update a progress bar, emits a
+        ProgressEvent as each item of each stage finishes.
     custom_callback: PyQt signal   
         A user defined signal.
 
@@ -374,26 +641,172 @@ def _fetchInvoice(url, key, ref, progress_callback=None,
         response text contains an empty string.
     """
 
+    store = None
+    column_store = None
+    if snapshot_folder and SnapshotStore.is_final(ref):
+        store = SnapshotStore(snapshot_folder)
+        column_store = ColumnStore(snapshot_folder)
+
+    download = ProgressTracker('download', 1, progress_callback)
+    if column_store is not None and column_store.has(ref):
+        with span('columns.open'):
+            columns = column_store.open(ref)
+        download.advance(ref, CACHED)
+        return _invoiceFromColumns(url, key, ref, columns, progress_callback)
+
+    details_text, groups, from_snapshot = _loadInvoiceText(url, key, ref, store)
+    download.advance(
+        ref, CACHED if from_snapshot else DONE, len(details_text)
+    )
+
     # organise the output by session type
-    details = _getInvoiceDetails(url, key, ref)
-    bcodes = sorted(details['Account number'].unique())
-    session_types = sorted(details['Session Type'].unique())
+    details = _parseInvoiceDetails(details_text)
 
     invoice = Invoice(ref)
-    for bcode in bcodes[0:3]:
+    invoice.details = details
+    invoice.groups = groups
+    with span('build.summary'):
+        invoice.set_summary(summarise(details))
+    bcodes = _invoiceBcodes(details)
+    recipients = _itemRecipients(
+        url, key, invoice.summary, invoice.groups, bcodes, progress_callback
+    )
+    build = ProgressTracker('build', len(bcodes), progress_callback)
+    for bcode in bcodes:
         item_details = details[details['Account number'] == bcode]
-        group_ref = item_details['Group'].values[0]
-        group = _getGroup(url, key, group_ref)
-        group.bcode = bcode
-        item = InvoiceItem(bcode, group)
-        item.sessions_from_dataframe(item_details)
-        invoice.append(item)
+        invoice.append(_invoiceItem(
+            bcode, item_details, recipients[bcode],
+            properties=invoice.item_properties(bcode)
+        ))
+        build.advance(bcode)
+
+    if store is not None and not from_snapshot:
+        with span('snapshot.save'):
+            store.save(ref, details_text, groups)
+    if column_store is not None:
+        with span('columns.save'):
+            column_store.save(ref, details, groups)
+
+    return invoice
 
+
+def _invoiceFromColumns(url, key, ref, columns, progress_callback=None):
+    """Build an Invoice from an invoice in the column store"""
+    invoice = Invoice(ref)
+    invoice.columns = columns
+    invoice.groups = dict(columns.groups)
+    with span('build.summary'):
+        invoice.set_summary(summarise(columns.frame([
+            name for name in SUMMARY_INPUT_COLUMNS if name in columns
+        ])))
+    bcodes = _invoiceBcodes(columns)
+    recipients = _itemRecipients(
+        url, key, invoice.summary, invoice.groups, bcodes, progress_callback
+    )
+    build = ProgressTracker('build', len(bcodes), progress_callback)
+    for bcode in bcodes:
+        invoice.append(_invoiceItemFromColumns(
+            bcode, columns, recipients[bcode],
+            properties=invoice.item_properties(bcode)
+        ))
+        build.advance(bcode)
     return invoice
 
+def _refreshInvoice(url, key, invoice, progress_callback=None,
+                    custom_callback=None):
+    """
+    Download the invoice details again and build new InvoiceItems for
+    only the account codes whose sessions have changed since the
+    invoice was fetched. Used for DRAFT invoices, which change during
+    the month.
+
+    The invoice itself is only read, as it is shown in the GUI while
+    this runs; the new details, summary and items are returned to be
+    applied with `Invoice.update_items` once the worker finishes.
+
+    Arguments
+    ---------
+    url: str
+        The PPMS facility instance url.
+    key: str
+        The PPMS PUMAPI key for the facility.
+    invoice: instance of Invoice class
+        The invoice currently loaded.
+    progress_callback: PyQt progress signal
+        A signal that can be used to update a progress bar, emits a
+        ProgressEvent as each item of each stage finishes.
+    custom_callback: PyQt signal   
+        A user defined signal.
+
+    Returns:
+    --------
+    output : dict
+        A dictionary containing the invoice, its new details, summary
+        and group json, the new InvoiceItem for each account code that
+        was added or changed (None for those removed) and the sorted
+        list of those account codes.
+
+    Raises
+    ------
+    ValueError
+        If no response is recieved from the PPMS server or if the
+        response text contains an empty string.
+    """
+    download = ProgressTracker('download', 1, progress_callback)
+    details_text = _getInvoiceDetailsText(url, key, invoice.ref)
+    download.advance(invoice.ref, nbytes=len(details_text))
+    details = _parseInvoiceDetails(details_text)
+
+    current = set(_invoiceBcodes(details))
+    existing = {item.bcode: item for item in list(invoice.items)}
+    with span('refresh.diff'):
+        changed = set(_changedBcodes(invoice.details, details))
+    changed &= current | set(existing)
+    # account codes can also join or leave the invoice without
+    # their own sessions changing
+    changed = sorted(changed | (current ^ set(existing)))
+
+    with span('build.summary'):
+        summary = summarise(details)
+    groups = dict(invoice.groups)
+    recipients = _itemRecipients(
+        url, key, summary, groups,
+        [b for b in changed if b in current and b not in existing],
+        progress_callback
+    )
+    build = ProgressTracker('build', len(changed), progress_callback)
+    items = {}
+    for bcode in changed:
+        if bcode not in current:
+            items[bcode] = None
+            build.advance(bcode)
+            continue
+
+        # a changed item keeps its recipient
+        if bcode in existing:
+            group = existing[bcode].group
+        else:
+            group = recipients[bcode]
+        items[bcode] = _invoiceItem(
+            bcode, details[details['Account number'] == bcode], group,
+            properties=item_properties(summary, bcode)
+        )
+        build.advance(bcode)
+
+    output = {}
+    output["invoice"] = invoice
+    output["details"] = details
+    output["summary"] = summary
+    output["groups"] = groups
+    output["items"] = items
+    output["bcodes"] = changed
+    return output
+
+
 def _messageForBcode(item, ref, folder, message_text, facility_info,
-                     invoice_columns, save_invoice=False,
-                     progress_callback=None, custom_callback=None):
+                     invoice_columns, save_invoice=False, preview_rows=None,
+                     summary=False, progress_callback=None,
+                     custom_callback=None):
 
     """
     A thread callback which creates html for a speific InvoiceItem
@@ -416,10 +829,18 @@ def _messageForBcode(item, ref, folder, message_text, facility_info,
         Information about the facility from the facility info dialog.
     invoice_columns: dict
         Which specific columns will be included in the html table
-        representation of the InvoiceItem. These are set in the invoice
-        template dialog.
+        representation of the InvoiceItem, and with `compact_layout`
+        whether to use the compact template. These are set in the
+        invoice template dialog.
     save_invoice: bool
         If True, write the html to file.
+    preview_rows: int
+        If given, only this many sessions of each session type are
+        rendered, for a quick preview. The charges still include every
+        session.
+    summary: bool
+        If True, also create the short summary sent in place of the
+        invoice when the sessions are attached rather than inlined.
     progress_callback: PyQt progress signal
         A signal that can be used to update a progress bar.
     custom_callback: PyQt signal   
@@ -429,7 +850,7 @@ def _messageForBcode(item, ref, folder, message_text, facility_info,
     --------
     output : dict
         A dictionary containing the account code and the html for the
-        InvoiceItem being processed.
+        InvoiceItem being processed, and its summary html if asked for.
     """                     
 
     if 'DRAFT' in ref:
@@ -493,19 +914,71 @@ def _messageForBcode(item, ref, folder, message_text, facility_info,
         message_text, invoice_date, facility_info
     )
     invoice_data["message"] = invoice_message
-    html = create_html(invoice_data, save_invoice=save_invoice)
 
     output = {}
     output["bcode"] = item.bcode
+    if summary:
+        with span('render.summary'):
+            output["summary_html"] = create_summary_html(invoice_data)
+
+    if preview_rows is not None:
+        more_sessions = {}
+        for session_type in ("autonomous", "assisted", "training"):
+            sessions = invoice_data[session_type + "_sessions"]
+            more_sessions[session_type] = max(0, len(sessions) - preview_rows)
+            invoice_data[session_type + "_sessions"] = sessions[:preview_rows]
+        invoice_data["more_sessions"] = more_sessions
+    with span('render.invoice'):
+        html = create_html(invoice_data, save_invoice=save_invoice)
+
     output["html"] = html
+    output["invoice_path"] = invoice_path
     return output
 
 
+def _prerenderItem(item, ref, folder, message_text, facility_info,
+                   invoice_columns, render_cache, generation,
+                   progress_callback=None, custom_callback=None):
+    """
+    A thread callback rendering an InvoiceItem ahead of sending it and
+    keeping the result in `render_cache`, see `_sendEmail`. Run on a
+    low priority thread pool right after an invoice is fetched.
+
+    Nothing is rendered if the cache was invalidated after the job
+    was queued, e.g. because the template settings changed or another
+    invoice was loaded, and a render finishing after that is dropped.
+
+    Returns:
+    --------
+        True if the render was cached
+    """
+    QThread.currentThread().setPriority(QThread.LowPriority)
+    if not render_cache.current(generation):
+        return False
+    content = _messageForBcode(
+        item, ref, folder, message_text, facility_info, invoice_columns,
+        summary=True
+    )
+    key = render_key(ref, folder, message_text, facility_info, invoice_columns)
+    return render_cache.put(item, key, content, generation)
+
+
 def _sendEmail(items, sendto, ref, folder, message_text,
                facility_info, invoice_columns, email_settings,
+               transport=None, resume=False, render_cache=None,
                progress_callback=None, custom_callback=None):
     """
-    Use Exchangelib module to send InvoiceItems to account owners.
+    Send InvoiceItems to account owners using the mail transport chosen
+    in the email settings (Microsoft Exchange by default).
+
+    Each account code's render and send state is recorded in the send
+    journal in `folder`, if one is set, as it happens. A failed message
+    doesn't stop the run; the failures are reported once every message
+    has been tried. With `resume`, account codes the journal shows as
+    already sent for this invoice are skipped so only the rest are
+    emailed.
+    Test mode sends and sends to the group admins only are journaled
+    apart from sends to everyone, so they are never skipped by one.
 
     Arguments
     ---------
@@ -529,120 +1002,482 @@ def _sendEmail(items, sendto, ref, folder, message_text,
         representation of the InvoiceItem. These are set in the invoice
         template dialog.
     email_settings: dict
-        Dictionary of settings for sending email using Microsoft exchange.
+        Dictionary of settings for sending email.
+    transport: MailTransport
+        Optionally send with this transport instead of the one
+        chosen in the email settings.
+    resume: bool
+        If True skip the account codes already sent for this invoice.
+    render_cache: RenderCache
+        Invoices already rendered in the background with the same
+        settings are taken from here rather than rendered again.
     progress_callback: PyQt progress signal
-        A signal that can be used to update a progress bar.
+        A signal that can be used to update a progress bar, emits a
+        ProgressEvent as each item of each stage finishes.
     custom_callback: PyQt signal   
         A user defined signal.
 
+    Returns:
+    --------
+    output : dict
+        A dictionary of the account codes sent, skipped and failed.
+
     Raises
     ------
     EmailError
         An exception is raised to trigger the error message dialog.
     """
+    journal = send_journal.open_journal(folder)
+    # the invoice is journaled separately when sending in test mode
+    # or only to the group admins
+    run_ref = send_journal.journal_ref(
+        ref, email_settings.get("test_mode"), admin_only=sendto == 1
+    )
+    if resume:
+        already_sent = journal.sent(run_ref)
+        skipped = sorted(i.bcode for i in items if i.bcode in already_sent)
+        items = [i for i in items if i.bcode not in already_sent]
+    else:
+        skipped = []
+    run_id = journal.start_run(
+        run_ref, [i.bcode for i in items], resume=resume
+    )
+
+    render = ProgressTracker('render', len(items), progress_callback)
+    # items already rendered in the background are only saved, and
+    # recorded as rendered together
+    cached = {}
+    if render_cache is not None:
+        key = render_key(
+            ref, folder, message_text, facility_info, invoice_columns
+        )
+        for item in items:
+            content = render_cache.get(item, key)
+            if content is not None:
+                cached[item.bcode] = content
     for item in items:
+        content = cached.get(item.bcode)
+        if content is None:
+            continue
+        save_html(content["invoice_path"], content["html"])
+        item.html = content["html"]
+        item.summary_html = content["summary_html"]
+        # set for every run, so an earlier admins only run doesn't stick
+        item.group.send_only_admin = sendto == 1
+        render.advance(item.bcode, status=CACHED, nbytes=len(item.html))
+    if cached:
+        journal.mark_many(
+            run_ref, list(cached), send_journal.RENDERED, run_id
+        )
+
+    for item in items:
+        if item.bcode in cached:
+            continue
         content = _messageForBcode(
             item, ref, folder, message_text,
-            facility_info, invoice_columns, save_invoice=True
+            facility_info, invoice_columns, save_invoice=True, summary=True
         )
         item.html = content["html"]
-        if sendto == 1:
-            item.group.send_only_admin = True
+        item.summary_html = content["summary_html"]
+        # set for every run, so an earlier admins only run doesn't stick
+        item.group.send_only_admin = sendto == 1
+        journal.mark(run_ref, item.bcode, send_journal.RENDERED, run_id)
+        render.advance(item.bcode, nbytes=len(item.html))
+
+    sent = []
+    failed = {}
+    def on_result(item, error):
+        if error is None:
+            journal.mark(run_ref, item.bcode, send_journal.SENT, run_id)
+            sent.append(item.bcode)
+        else:
+            journal.mark(
+                run_ref, item.bcode, send_journal.FAILED, run_id, str(error)
+            )
+            failed[item.bcode] = str(error)
 
     try:
-        send_email.send(items, ref, email_settings, progress=progress_callback)
-    except:
-        raise EmailError("Problem sending email")
+        send_email.send(
+            items, ref, email_settings, progress=progress_callback,
+            transport=transport, on_result=on_result
+        )
+    except Exception as err:
+        raise EmailError("Problem sending email: {}".format(err))
+    finally:
+        journal.finish_run(run_id)
+
+    if failed:
+        raise EmailError(
+            "Problem sending email to {} of {} account codes ({}). "
+            "Send again and choose Resume to retry them.".format(
+                len(failed), len(items), ", ".join(sorted(failed))
+            )
+        )
+
+    output = {}
+    output["sent"] = sent
+    output["skipped"] = skipped
+    output["failed"] = failed
+    return output
 
 def _writeToExcel(invoice_ref, invoice, facility_code, invoice_folder,
-                  progress_callback=None, custom_callback=None):
+                  formats=('xlsx',), progress_callback=None,
+                  custom_callback=None):
     """Write the invoice to Excel using the KCL finance template.
+
+    The voucher rows are streamed straight from the InvoiceItems into
+    each output file, so memory use doesn't depend on the invoice size.
     
     Arguments
     ---------
+        invoice_ref: str
+            The PPMS reference for the overall invoice.
         invoice: Invoice instance
+        facility_code: str
+            The facility account code credited with the charges.
+        invoice_folder: str
+            The folder the voucher is saved in, under a folder for the year.
+        formats: list of str
+            File formats to write, any of 'xlsx', 'csv' and 'parquet'.
+
+    Returns
+    -------
+        A list of the paths written.
+    """
+    sessions_month, sessions_year = _sessionsPeriod(invoice_ref)
+
+    # create filepath
+    folder = os.path.join(invoice_folder, sessions_year)
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    fname = '{1} {0} NIC user charges new template'.format(sessions_year, sessions_month)
+
+    paths = []
+    export = ProgressTracker('export', len(formats), progress_callback)
+    for fmt in formats:
+        path = os.path.join(folder, '{}.{}'.format(fname, fmt))
+        rows = voucher_rows(
+            invoice.items, facility_code, sessions_month, sessions_year
+        )
+        with span('export.' + fmt):
+            write_voucher(path, rows)
+        paths.append(path)
+        export.advance(os.path.basename(path), nbytes=os.path.getsize(path))
+
+    return paths
+
+
+def _writeConsolidated(url, key, refs, facility_code, invoice_folder,
+                       per_period=False, formats=('xlsx',),
+                       progress_callback=None, custom_callback=None):
+    """
+    Write one finance voucher covering several invoices, for quarterly
+    and year-end reconciliation.
+
+    The invoices are fetched (or read from the column or snapshot
+    stores) concurrently and the charges summed per account code and
+    group with a single groupby, either for each period or over the
+    whole range. Only the three columns needed are read from invoices
+    in the column store.
+
+    Arguments
+    ---------
+        url: str
+            The PPMS facility instance url.
+        key: str
+            The PPMS PUMAPI key for the facility.
+        refs: list of str
+            The invoice references to include.
+        facility_code: str
+            The facility account code credited with the charges. Sessions
+            charged to the facility itself are left out.
+        invoice_folder: str
+            The folder the vouchers are saved in, also used for snapshots.
+        per_period: bool
+            If True write one voucher per invoice period, otherwise
+            write one voucher for the whole range.
+        formats: list of str
+            File formats to write, any of 'xlsx', 'csv' and 'parquet'.
+
+    Returns
+    -------
+        A list of the paths written.
     """
-    if 'DRAFT' in invoice_ref:
-        ref_date = datetime.strptime(invoice_ref[17:25], "%Y%m%d")
+    store = None
+    column_store = None
+    if invoice_folder:
+        store = SnapshotStore(invoice_folder)
+        column_store = ColumnStore(invoice_folder)
+    columns = ['Account number', 'Group', 'Final Amount']
+
+    def load(ref):
+        """The charges on an invoice, its group json, and the parsed
+        details if it is a final invoice that needs archiving"""
+        final = SnapshotStore.is_final(ref)
+        if column_store is not None and final and column_store.has(ref):
+            invoice_columns = column_store.open(ref)
+            return invoice_columns.frame(columns), invoice_columns.groups, None
+        details_text, groups, from_snapshot = _loadInvoiceText(
+            url, key, ref, store
+        )
+        details = _parseInvoiceDetails(details_text)
+        archive = None
+        if store is not None and final:
+            archive = (details_text, details, from_snapshot)
+        return details[columns], groups, archive
+
+    with ThreadPoolExecutor(max_workers=MAX_CONNECTIONS) as executor:
+        download = ProgressTracker('download', len(refs), progress_callback)
+        loaded = []
+        for ref, result in zip(refs, executor.map(load, refs)):
+            loaded.append(result)
+            status = CACHED if result[2] is None or result[2][2] else DONE
+            download.advance(ref, status)
+
+        frames = []
+        groups = {}
+        for ref, (details, invoice_groups, _) in zip(refs, loaded):
+            sessions_month, sessions_year = _sessionsPeriod(ref)
+            period = datetime.strptime(sessions_month + sessions_year, "%B%Y")
+            frames.append(details.assign(Period=period))
+            groups.update(invoice_groups)
+        details = pd.concat(frames, ignore_index=True)
+        details = details[details['Account number'] != facility_code]
+        if details.empty:
+            raise ValueError(
+                "No charges to export: every session on the invoices is "
+                "charged to the facility account {}".format(facility_code)
+            )
+
+        # each group is fetched once however many invoices it is on
+        missing = sorted(set(details['Group']) - set(groups))
+        fetch_groups = ProgressTracker('groups', len(missing), progress_callback)
+        for group_ref, group_json in zip(missing, executor.map(
+                lambda group_ref: _getGroupJson(url, key, group_ref), missing)):
+            groups[group_ref] = group_json
+            fetch_groups.advance(group_ref, nbytes=len(group_json))
+
+    # archive any final invoices that weren't already in the stores
+    for ref, (_, _, archive) in zip(refs, loaded):
+        if archive is None:
+            continue
+        details_text, ref_details, from_snapshot = archive
+        ref_groups = {
+            g: groups[g] for g in ref_details['Group'].unique() if g in groups
+        }
+        if not from_snapshot:
+            store.save(ref, details_text, ref_groups)
+        column_store.save(ref, ref_details, ref_groups)
+
+    head_emails = {g: json.loads(groups[g])['heademail'] for g in groups}
+
+    start = details['Period'].min().strftime("%B %Y")
+    end = details['Period'].max().strftime("%B %Y")
+    if per_period:
+        keys = ['Period', 'Account number', 'Group']
     else:
-        ref_date = datetime.strptime(invoice_ref[17:], "%Y%m%d")
+        keys = ['Account number', 'Group']
+    with span('export.aggregate'):
+        # summed in whole pence so the voucher matches the invoices
+        details = details.assign(Pence=to_pence(details['Final Amount']))
+        totals = details.groupby(keys, sort=True, observed=True)[
+            'Pence'].sum().reset_index()
+        totals['Final Amount'] = to_pounds(totals['Pence'])
+    if per_period:
+        totals['Label'] = totals['Period'].dt.strftime("%B %Y")
+    elif start == end:
+        totals['Label'] = start
+    else:
+        totals['Label'] = '{} to {}'.format(start, end)
+    totals['Head email'] = totals['Group'].map(head_emails)
+
+    if per_period:
+        batches = [
+            (os.path.join(invoice_folder, period.strftime("%Y")),
+             '{} NIC user charges consolidated'.format(period.strftime("%B %Y")),
+             period_totals)
+            for period, period_totals in totals.groupby('Period', sort=True)
+        ]
+    else:
+        batches = [(
+            invoice_folder,
+            '{} NIC user charges consolidated'.format(totals['Label'].iloc[0]),
+            totals
+        )]
+
+    paths = []
+    export = ProgressTracker(
+        'export', len(batches) * len(formats), progress_callback
+    )
+    for folder, fname, batch in batches:
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        for fmt in formats:
+            path = os.path.join(folder, '{}.{}'.format(fname, fmt))
+            rows = total_rows(
+                batch['Label'], batch['Final Amount'], batch['Head email'],
+                batch['Account number'], facility_code
+            )
+            with span('export.' + fmt):
+                write_voucher(path, rows)
+            paths.append(path)
+            export.advance(
+                os.path.basename(path), nbytes=os.path.getsize(path)
+            )
 
-    # get month and year from ref
-    month = int(ref_date.strftime("%m")) - 1
-    year = int(ref_date.strftime("%Y"))
+    return paths
 
-    if month == 0:
-        month = 12
-        year = year - 1
-    sess_month = datetime.strptime(str(month), "%m")
-    sessions_month = sess_month.strftime("%B")
-    sessions_year = str(year)
-
-    bcodes = invoice.bcodes
-    amounts = invoice.amounts
-    group_heads = invoice.group_heads
-
-    # make a list of equal length with NIC 
-    # activity code and interleave
-    nic_codes = [facility_code for i in range(len(invoice))]
-    activity_codes = _interleave(bcodes, nic_codes)
-
-    # make a list of equal length with NIC 
-    # amounts and interleave
-    nic_amounts = [a * -1 for a in amounts]
-    charges = _interleave(amounts, nic_amounts)
-
-    # include the 'account codes'
-    transaction_account = [4213 for i in range(len(invoice))]
-    nic_account = [4113 for i in range(len(nic_codes))]
-    account_codes = _interleave(transaction_account, nic_account)
-
-    # include description of transaction
-    groups_for_descp = _interleave(group_heads, group_heads)
-    description = [
-        ('NIC charges for {} {} for {}'.
-        format(sessions_month, sessions_year, groups_for_descp[i]))
-        for i in range(len(groups_for_descp))
-    ]
 
-    # make the invoice from the lists
-    print(len(description), len(charges), len(account_codes), len(activity_codes))
-    invoice_df = pd.DataFrame({
-        'Description': description,
-        'Amounnt': charges,
-        'account code': account_codes,
-        'activity code': activity_codes
-    })
+def _profileFolders(profiles):
+    """
+    Check every facility profile in a batch has an invoice folder of
+    its own. The snapshot and column stores, send journal and vouchers
+    are kept in the invoice folder, so profiles sharing one would mix
+    up their invoices.
+
+    Raises
+    ------
+    ValueError
+        If a profile has no invoice folder or shares it with another
+    """
+    folders = {}
+    for name, settings in profiles.items():
+        if not settings.invoice_folder:
+            raise ValueError(
+                "Facility profile {} has no invoice folder".format(name)
+            )
+        folder = os.path.normcase(os.path.abspath(settings.invoice_folder))
+        if folder in folders:
+            raise ValueError(
+                "Facility profiles {} and {} share the invoice folder {}, "
+                "each facility needs its own".format(
+                    folders[folder], name, settings.invoice_folder
+                )
+            )
+        folders[folder] = name
+
 
-    print(invoice_df.head())
+def _runProfile(name, settings, draft=False, send=False, copy_manager=False,
+                progress_callback=None, custom_callback=None):
+    """
+    Process the newest invoice of one facility profile: fetch it, email
+    it if `send` is True and write its finance voucher, as the main
+    window does for the facility in the settings.
 
-    # create filepath
-    filepath = '{0}\\{1} {0} NIC user charges new template.xlsx'.format(sessions_year, sessions_month)
-    path = os.path.join(invoice_folder, filepath)
-    # save invoice
-    invoice_df.to_excel(path, sheet_name='Voucher Data', index=False)    
-
-
-if __name__ == "__main__":
-
-    data = {"action":"getinvoicedetails", "apikey":"1hG1wBx8Og2w5Edu", "invoiceid":"PPMS2-NICatKings-20191101-DRAFT", "bcode":"AC11372"}
-    url = "https://ppms.eu/kcl/pumapi/"
-    key = "1hG1wBx8Og2w5Edu"
-    ref = "PPMS2-NICatKings-20191101"
-    bcode = "NIC@KCL"
-    result = _fetchInvoice(url, key, ref)
-    print(result.item_for_bcode('AC11372'))
-    # invoice = _getInvoiceDetails(url, key, ref)
-    # folder = "C:\\Users\\Daniel\\Documents\\Programming\\NIC\\ppms-pyqt\\ppms_pyqt\\invoices"
-    # invoice = _sessionsForBcode(bcode, url, key, ref, folder)
-    # print(type(invoice))
-
-    # data = {
-    #     'action': 'getgroup',
-    #     'unitlogin': "NICKings",
-    #     'apikey': key,
-    #     'format': 'json'
-    # }
-    # resp = requests.post(url, data=data)
-    # print(resp.status_code)
-    # print(resp.text)
\ No newline at end of file
+    Arguments
+    ---------
+    name: str
+        The profile name, used to label the progress.
+    settings: Settings
+        The profile's settings snapshot.
+    draft: bool
+        Process the newest draft invoice rather than the newest final one.
+    send: bool
+        Email every account code on the invoice. Account codes the send
+        journal shows as already sent for the invoice are skipped, so a
+        batch can be run again to retry the ones that failed.
+    copy_manager: bool
+        Copy the emails to the facility manager.
+
+    Returns
+    -------
+    output : dict
+        The invoice reference, the number of account codes, the voucher
+        paths and, if sent, the account codes sent and skipped.
+    """
+    url, key = settings.ppms_url, settings.ppms_key
+    folder = settings.invoice_folder
+    refs = _getInvoiceList(url, key, "true" if draft else "false")
+    if not refs:
+        raise ValueError("{}: no {} invoices in PPMS".format(
+            name, "draft" if draft else "final"
+        ))
+    # PPMS lists the newest invoice last
+    ref = refs[-1]
+    invoice = _fetchInvoice(
+        url, key, ref, snapshot_folder=folder,
+        progress_callback=progress_callback
+    )
+
+    output = {"ref": ref, "items": len(invoice.items)}
+    if send:
+        sent = _sendEmail(
+            invoice.items, 0, ref, folder, settings.message_text,
+            settings.facility_info, settings.invoice_columns,
+            settings.email_settings(copy_manager), resume=True,
+            progress_callback=progress_callback
+        )
+        output["sent"] = sent["sent"]
+        output["skipped"] = sent["skipped"]
+    output["paths"] = _writeToExcel(
+        ref, invoice, settings.facility_code, folder,
+        formats=settings.voucher_formats,
+        progress_callback=progress_callback
+    )
+    return output
+
+
+def _runBatch(profiles, draft=False, send=False, copy_manager=False,
+              progress_callback=None, custom_callback=None):
+    """
+    Run `_runProfile` for several facility profiles at the same time,
+    so the batch takes about as long as the slowest facility rather
+    than all of them one after another. Each facility has its own PPMS
+    connections (see `http_session.session_for`), mail account and
+    invoice folder for its stores, journal and vouchers.
+
+    A facility that fails doesn't stop the rest, its error is returned
+    in place of its output.
+
+    Arguments
+    ---------
+    profiles: dict
+        Settings snapshots keyed by profile name.
+    draft, send, copy_manager: bool
+        Passed on to `_runProfile`.
+    progress_callback: PyQt progress signal
+        A signal that can be used to update a progress bar. Emits a
+        ProgressEvent as each profile finishes, and the events of each
+        profile's stages labelled with the profile name.
+    custom_callback: PyQt signal
+        Emits `(name, output)` as soon as each profile finishes.
+
+    Returns
+    -------
+    results : dict
+        The output of `_runProfile` keyed by profile name, or a dict
+        holding the 'error' for the profiles that failed.
+
+    Raises
+    ------
+    ValueError
+        If the profiles don't each have their own invoice folder.
+    """
+    if not profiles:
+        return {}
+    _profileFolders(profiles)
+
+    results = {}
+    batch = ProgressTracker('batch', len(profiles), progress_callback)
+    with ThreadPoolExecutor(max_workers=len(profiles)) as executor:
+        futures = {
+            executor.submit(
+                _runProfile, name, settings, draft=draft, send=send,
+                copy_manager=copy_manager,
+                progress_callback=LabelledSignal(name, progress_callback)
+            ): name
+            for name, settings in profiles.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as err:
+                traceback.print_exc()
+                results[name] = {"error": str(err)}
+                batch.advance(name, FAILED)
+            else:
+                batch.advance(name)
+            if custom_callback is not None:
+                custom_callback.emit((name, results[name]))
+    return results
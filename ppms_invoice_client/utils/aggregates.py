@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+from .money import MONEY_FIELDS, to_pence
+
+
+# columns the summary is computed from
+SUMMARY_INPUT_COLUMNS = [
+    'Account number', 'Session Type', 'Group', 'Duration (booked)',
+    'Duration (used)', 'Rebate', 'Fee', 'Final Amount',
+]
+# fields of the summary of each account code and session type,
+# as shown in the invoice tables
+SUMMARY_COLUMNS = [
+    'Account Number', 'Group', 'Sessions', 'Hours booked', 'Hours used',
+    'Rebate', 'Fees', 'Final Amount', 'Initial Amount',
+]
+# money fields of the summary, held in whole pence (int64) so totals
+# add up exactly wherever they are shown
+SUMMARY_MONEY_COLUMNS = ['Rebate', 'Fees', 'Final Amount', 'Initial Amount']
+# the money field of each session summed, whose rounding it takes
+# (see `utils.money.MONEY_FIELDS`)
+SUMMARY_ROUNDING = {
+    'Rebate': MONEY_FIELDS['subsidy'],
+    'Fee': MONEY_FIELDS['fee'],
+    'Final Amount': MONEY_FIELDS['final_amount'],
+}
+
+
+def summarise(details):
+    """
+    Summarise the sessions of every account code and session type in
+    one grouped pass over the invoice details.
+
+    Parameters
+    -----------
+    details : DataFrame
+        Invoice details, typed with the invoice schema (see
+        `utils.invoice_schema`). Missing columns count as zero.
+
+    Returns
+    --------
+        DataFrame indexed by account number and session type with the
+        columns in SUMMARY_COLUMNS. The SUMMARY_MONEY_COLUMNS are in
+        whole pence, each session's amounts are rounded to pence as
+        they are on the invoice (see `utils.money.MONEY_FIELDS`) before
+        they are summed.
+    """
+    frame = details.reindex(columns=SUMMARY_INPUT_COLUMNS)
+    for name, rounding in SUMMARY_ROUNDING.items():
+        frame[name] = to_pence(frame[name], rounding)
+    summary = frame.groupby(
+        ['Account number', 'Session Type'], sort=True, observed=True
+    ).agg(
+        Group=('Group', 'first'),
+        Sessions=('Group', 'size'),
+        booked=('Duration (booked)', 'sum'),
+        used=('Duration (used)', 'sum'),
+        Rebate=('Rebate', 'sum'),
+        Fees=('Fee', 'sum'),
+        final=('Final Amount', 'sum'),
+    )
+    summary['Account Number'] = summary.index.get_level_values(0)
+    summary['Hours booked'] = summary['booked'] / 60.0
+    summary['Hours used'] = summary['used'] / 60.0
+    summary['Final Amount'] = summary['final']
+    summary['Initial Amount'] = (
+        summary['final'] + summary['Fees'] - summary['Rebate']
+    )
+    return summary[SUMMARY_COLUMNS]
+
+
+def item_properties(summary, bcode):
+    """
+    The summary of one account code for the invoice tables.
+
+    Returns
+    --------
+        dict mapping each session type to a Series of SUMMARY_COLUMNS
+    """
+    if bcode not in summary.index.get_level_values(0):
+        return {}
+    rows = summary.xs(bcode, level=0)
+    properties = {}
+    for session_type, row in rows.iterrows():
+        row = row.astype('object')
+        row.name = None
+        row['Sessions'] = int(row['Sessions'])
+        for name in SUMMARY_COLUMNS[3:]:
+            if name in SUMMARY_MONEY_COLUMNS:
+                row[name] = int(row[name])
+            else:
+                row[name] = float(row[name])
+        properties[session_type] = row
+    return properties
+
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import importlib.util
+import io
+import zipfile
+
+from .html_convert import format_values
+
+
+# columns of the sessions csv as (header, Session attribute), training
+# sessions have a duration in place of the booked and used times
+SESSION_CSV_COLUMNS = [
+    ("Session Type", "session_type"),
+    ("Reference", "session_ref"),
+    ("User", "user"),
+    ("System Type", "system_type"),
+    ("System", "system"),
+    ("Date", "date"),
+    ("Start time", "start_time"),
+    ("Duration (booked)", "booked_time"),
+    ("Duration (used)", "used_time"),
+    ("Duration", "duration"),
+    ("Notes", "notes"),
+    ("Fee", "fee"),
+    ("Subsidy", "subsidy"),
+    ("Final Amount", "final_amount"),
+]
+
+ZIP_TYPE = ("application", "zip")
+PDF_TYPE = ("application", "pdf")
+
+
+class Attachment:
+    """
+    A file attached to an email.
+
+    Attributes
+    -----------
+    filename : str
+        Name of the file as the recipient sees it
+    content : bytes
+        The file itself
+    maintype, subtype : str
+        MIME type of the file, e.g. 'application' and 'zip'
+    """
+    def __init__(self, filename, content, maintype, subtype):
+        self.filename = filename
+        self.content = content
+        self.maintype = maintype
+        self.subtype = subtype
+
+    @property
+    def content_type(self):
+        return "{}/{}".format(self.maintype, self.subtype)
+
+    def __len__(self):
+        return len(self.content)
+
+    def __repr__(self):
+        return "Attachment({}, {} bytes)".format(self.filename, len(self))
+
+
+def sessions_csv(sessions):
+    """
+    The sessions of an InvoiceItem as csv text, with the values
+    formatted a column at a time as on the invoice
+    """
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\r\n")
+    writer.writerow([header for header, _ in SESSION_CSV_COLUMNS])
+    columns = [format_values(sessions, name) for _, name in SESSION_CSV_COLUMNS]
+    writer.writerows(zip(*columns))
+    return out.getvalue()
+
+
+def pdf_available():
+    """Whether weasyprint is installed, so invoices can be attached as PDFs"""
+    return importlib.util.find_spec("weasyprint") is not None
+
+
+def html_to_pdf(html):
+    """
+    Render invoice html as a PDF with weasyprint.
+
+    Returns
+    --------
+        the PDF as bytes, or None if weasyprint isn't installed
+    """
+    try:
+        from weasyprint import HTML
+    except ImportError:
+        return None
+    return HTML(string=html).write_pdf()
+
+
+def invoice_attachments(item, name, pdf=False):
+    """
+    Attachments holding the full invoice of an InvoiceItem, for sending
+    with a short summary in place of the whole invoice in the body.
+
+    The invoice html and a csv of the sessions are compressed into one
+    zip file. With `pdf` the invoice is also attached as a PDF if
+    weasyprint is installed.
+
+    Parameters
+    -----------
+    item : InvoiceItem
+        The rendered invoice item, `item.html` must be set
+    name : str
+        File name for the attachments, without an extension
+    pdf : bool
+        Also attach a PDF of the invoice
+
+    Returns
+    --------
+        list of Attachment
+    """
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr(name + ".html", item.html)
+        z.writestr(name + "-sessions.csv", sessions_csv(item.sessions))
+    attachments = [Attachment(name + ".zip", archive.getvalue(), *ZIP_TYPE)]
+
+    if pdf:
+        content = html_to_pdf(item.html)
+        if content is None:
+            print("weasyprint isn't installed, no PDF attached")
+        else:
+            attachments.append(Attachment(name + ".pdf", content, *PDF_TYPE))
+    return attachments
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+COLUMN_DIR = "columns"
+META_FILE = "meta.json"
+BCODE_COLUMN = "Account number"
+
+
+class ColumnStore:
+    """On-disk columnar copy of finalised invoices, kept alongside the
+    snapshots so large invoices can be opened without parsing them or
+    holding all of their sessions in memory.
+
+    Each invoice is a folder with one `.npy` file per column of the
+    invoice details, sorted by account code so each account code's
+    sessions are a contiguous run of rows, and a `meta.json` file with
+    the column names, the rows of each account code and the group json.
+    Numeric columns are stored as int64 or float64, dates as datetime64
+    and text and categorical columns as fixed width unicode so every
+    column can be memory-mapped.
+
+    Attributes
+    -----------
+    folder : str
+        Directory holding the invoices, a `columns` folder
+        inside the invoices folder
+    """
+    def __init__(self, invoice_folder):
+        self.folder = os.path.join(invoice_folder, COLUMN_DIR)
+
+    def path(self, ref):
+        return os.path.join(self.folder, ref.replace('|', '-'))
+
+    def has(self, ref):
+        return os.path.exists(os.path.join(self.path(ref), META_FILE))
+
+    def save(self, ref, details, groups):
+        """Write the invoice details of a final invoice.
+
+        Parameters
+        -----------
+        ref : str
+            The invoice reference
+        details : DataFrame
+            The parsed invoice details
+        groups : dict
+            Raw json text returned by the `getgroup` call keyed
+            by the group unitlogin
+        """
+        if 'DRAFT' in ref:
+            raise ValueError("Only final invoices can be stored")
+
+        details = details.sort_values(BCODE_COLUMN, kind='mergesort')
+        bcodes = details[BCODE_COLUMN].astype(str).to_numpy()
+        starts = np.flatnonzero(np.r_[True, bcodes[1:] != bcodes[:-1]])
+        stops = np.r_[starts[1:], len(bcodes)]
+
+        # write to a temporary folder first so a crash can't leave
+        # a half written invoice behind
+        path = self.path(ref)
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        columns = []
+        for cid, name in enumerate(details.columns):
+            column = details[name]
+            if name == BCODE_COLUMN:
+                values = bcodes.astype('U')
+            elif pd.api.types.is_datetime64_any_dtype(column):
+                values = column.to_numpy(dtype='datetime64[ns]')
+            elif pd.api.types.is_integer_dtype(column):
+                values = column.to_numpy(dtype='int64')
+            elif pd.api.types.is_numeric_dtype(column):
+                values = column.to_numpy(dtype='float64')
+            else:
+                values = column.astype(object).fillna("").astype(str).to_numpy(dtype='U')
+            fname = "{}.npy".format(cid)
+            np.save(os.path.join(tmp_path, fname), values)
+            columns.append([name, fname])
+
+        meta = {
+            "ref": ref,
+            "rows": len(details.index),
+            "columns": columns,
+            "bcodes": {
+                b: [int(start), int(stop)]
+                for b, start, stop in zip(bcodes[starts], starts, stops)
+            },
+            "groups": groups,
+        }
+        with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+            json.dump(meta, f)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    def open(self, ref):
+        """Open a stored invoice, see `InvoiceColumns`"""
+        return InvoiceColumns(self.path(ref))
+
+
+class InvoiceColumns:
+    """
+    Read-only, memory-mapped view of an invoice in the column store.
+    Columns are only mapped when first used and the rows of an account
+    code are returned as slices of the mapped files, so nothing is read
+    from disk until the values themselves are used.
+
+    Attributes
+    -----------
+    ref : str
+        The invoice reference
+    groups : dict
+        Raw group json text keyed by the group unitlogin
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        self.ref = meta["ref"]
+        self.n_rows = meta["rows"]
+        self.groups = meta["groups"]
+        # column file names keyed by column name, in column order
+        self._files = dict(meta["columns"])
+        self._rows = {b: slice(*r) for b, r in meta["bcodes"].items()}
+        self._mapped = {}
+
+    @property
+    def columns(self):
+        return list(self._files)
+
+    @property
+    def bcodes(self):
+        """The account codes on the invoice, sorted"""
+        return sorted(self._rows)
+
+    def __len__(self):
+        return self.n_rows
+
+    def __contains__(self, name):
+        return name in self._files
+
+    def __getitem__(self, name):
+        """The whole of column `name` as a memory-mapped array"""
+        if name not in self._mapped:
+            self._mapped[name] = np.load(
+                os.path.join(self.path, self._files[name]), mmap_mode='r'
+            )
+        return self._mapped[name]
+
+    def view(self, bcode, columns=None):
+        """
+        The sessions charged to `bcode` without copying them.
+
+        Returns
+        --------
+            dict mapping each column name (or those in `columns`) to a
+            slice of its memory-mapped array
+        """
+        rows = self._rows[bcode]
+        if columns is None:
+            columns = self.columns
+        return {name: self[name][rows] for name in columns}
+
+    def frame(self, columns=None):
+        """Copy the columns named in `columns`, or every column, into
+        a DataFrame"""
+        if columns is None:
+            columns = self.columns
+        return pd.DataFrame({name: np.asarray(self[name]) for name in columns})
+
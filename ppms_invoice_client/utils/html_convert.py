@@ -1,8 +1,14 @@
 # -*- coding: utf-8 -*-
 
 import os
+import re
+from itertools import chain, repeat
 from jinja2 import Environment, FileSystemLoader
 
+from .metrics import span
+from .invoice_schema import format_date
+from .money import MONEY_FIELDS, format_money
+
 
 TEMPLATE_PATH = os.path.abspath(
     os.path.join(os.path.dirname( __file__ ), '..', 'templates')
@@ -12,11 +18,100 @@ TEMPLATE_ENVIRONMENT = Environment(
     loader=FileSystemLoader(TEMPLATE_PATH),
     trim_blocks=False)
 
+INVOICE_TEMPLATE = 'invoice_template.html'
+COMPACT_TEMPLATE = 'invoice_template_compact.html'
+SUMMARY_TEMPLATE = 'invoice_summary_template.html'
+ROW_TEMPLATE = 'session_rows.html'
+SESSION_TYPES = ('autonomous', 'assisted', 'training')
+# template settings of the autonomous session columns, which are
+# left out of the compact template when unchecked
+SESSION_COLUMNS = [
+    'session_chk', 'user_chk', 'type_chk', 'system_chk', 'date_chk',
+    'start_chk', 'booked_chk', 'used_chk', 'notes_chk', 'init_amount_chk',
+    'fees_chk', 'final_amount_chk',
+]
+
 
 def render_template(template_filename, context):
     return TEMPLATE_ENVIRONMENT.get_template(template_filename).render(context)
 
 
+# placeholder for a value in a row fragment, see `row_format`
+_FIELD = re.compile(r'\x00(\w+)\x00')
+
+
+class _Placeholders:
+    """Stands in for a row of values when rendering a row macro, every
+    value renders as a placeholder naming it"""
+    def __getattr__(self, name):
+        return '\x00{}\x00'.format(name)
+
+
+_row_formats = {}
+
+
+def row_format(macro_name, columns):
+    """
+    The row macro `macro_name` of ROW_TEMPLATE with the column settings
+    applied, split into the text between its values. Each combination
+    of settings is only rendered once.
+
+    Returns
+    --------
+        tuple of the list of text pieces and the names of the Session
+        values that go between them, in order
+    """
+    key = (macro_name, tuple(sorted((k, bool(v)) for k, v in columns.items())))
+    if key not in _row_formats:
+        macro = getattr(
+            TEMPLATE_ENVIRONMENT.get_template(ROW_TEMPLATE).module, macro_name
+        )
+        pieces = _FIELD.split(str(macro(_Placeholders(), columns)))
+        _row_formats[key] = (pieces[::2], pieces[1::2])
+    return _row_formats[key]
+
+
+def _format_dates(sessions):
+    # sessions share a few dates, so each is only formatted once
+    formatted = {}
+    values = []
+    for session in sessions:
+        date = session.date
+        if date not in formatted:
+            formatted[date] = format_date(date)
+        values.append(formatted[date])
+    return values
+
+
+def format_values(sessions, name):
+    """The value `name` of every session formatted for the invoice"""
+    if name == 'date':
+        return _format_dates(sessions)
+    if name in MONEY_FIELDS:
+        return format_money(
+            [getattr(s, name, float('nan')) for s in sessions],
+            MONEY_FIELDS[name]
+        )
+    # like jinja, a value the session doesn't have is left empty
+    return [str(getattr(s, name, '')) for s in sessions]
+
+
+def render_rows(macro_name, sessions, columns):
+    """
+    Render a row of a session table for every session. The column
+    settings are resolved once (see `row_format`) and only the values
+    the row shows are formatted, a column at a time, so the rows are
+    put together with a single join.
+    """
+    count = len(sessions)
+    pieces, names = row_format(macro_name, columns)
+    parts = [repeat(pieces[0], count)]
+    for name, piece in zip(names, pieces[1:]):
+        parts.append(format_values(sessions, name))
+        parts.append(repeat(piece, count))
+    return ''.join(chain.from_iterable(zip(*parts)))
+
+
 # input here should be a dictionary
 def create_html(invoice_data, save_invoice=False):
     context = {
@@ -34,21 +129,75 @@ def create_html(invoice_data, save_invoice=False):
         'fee_flag': invoice_data['fee_flag'],
         'subsidy_flag': invoice_data['subsidy_flag'],
         'message': invoice_data['message'],
-        'columns': invoice_data['columns']
+        'columns': invoice_data['columns'],
+        'more_sessions': invoice_data.get('more_sessions', {})
     }
+    # the compact layout drops the inline styles and unchecked columns
+    # to keep emails small for groups with many sessions
+    template = INVOICE_TEMPLATE
+    if invoice_data['columns'].get('compact_layout'):
+        template = COMPACT_TEMPLATE
+        context['column_count'] = sum(
+            1 for c in SESSION_COLUMNS if invoice_data['columns'].get(c)
+        )
+
+    prefix = 'compact_' if template == COMPACT_TEMPLATE else ''
+    with span('render.rows'):
+        for session_type in SESSION_TYPES:
+            context[session_type + '_rows'] = render_rows(
+                prefix + session_type + '_row',
+                invoice_data[session_type + '_sessions'],
+                invoice_data['columns']
+            )
 
     invoice_dir = os.path.dirname(invoice_data['invoice_path'])
     if not os.path.exists(invoice_dir):
         os.makedirs(invoice_dir)
 
-    html = render_template('invoice_template.html', context)
+    with span('render.jinja'):
+        html = render_template(template, context)
     if save_invoice:
-        with open(invoice_data['invoice_path'], 'w') as f:        
-            f.write(html)
+        save_html(invoice_data['invoice_path'], html)
 
     return html
 
 
+def save_html(invoice_path, html):
+    """Save a rendered invoice, creating its folder if needed"""
+    with span('render.save'):
+        invoice_dir = os.path.dirname(invoice_path)
+        if not os.path.exists(invoice_dir):
+            os.makedirs(invoice_dir)
+        with open(invoice_path, 'w') as f:
+            f.write(html)
+
+
+def create_summary_html(invoice_data):
+    """
+    A short version of the invoice with the charges for each session
+    type but not the sessions, sent when they are attached instead.
+    """
+    sessions = [
+        invoice_data[t] for t in
+        ('autonomous_sessions', 'assisted_sessions', 'training_sessions')
+    ]
+    context = {
+        'invoice_ref': invoice_data['invoice_ref'],
+        'invoice_date': invoice_data['invoice_date'],
+        'group': invoice_data['group'],
+        'autonomous_sessions': invoice_data['autonomous_sessions'],
+        'assisted_sessions': invoice_data['assisted_sessions'],
+        'training_sessions': invoice_data['training_sessions'],
+        'autonomous_charge': invoice_data['autonomous_charge'],
+        'assisted_charge': invoice_data['assisted_charge'],
+        'training_charge': invoice_data['training_charge'],
+        'total': invoice_data['final_charge'],
+        'message': invoice_data['message'],
+        'session_count': sum(len(s) for s in sessions),
+    }
+    return render_template(SUMMARY_TEMPLATE, context)
+
+
 def main():
     create_html()
 
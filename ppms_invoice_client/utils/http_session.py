@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+import atexit
+import threading
+
+import requests
+
+
+_lock = threading.Lock()
+_sessions = {}
+
+
+def session_for(url, key):
+    """
+    The requests Session used for PUMAPI calls to `url` with API `key`,
+    made on first use. Connections to PPMS are kept open between calls,
+    and each PPMS instance and key, i.e. each facility profile, has a
+    session of its own so facilities run side by side in a batch (see
+    `threads._runBatch`) never share connections or cookies.
+    """
+    with _lock:
+        session = _sessions.get((url, key))
+        if session is None:
+            session = _sessions[(url, key)] = requests.Session()
+        return session
+
+
+def close_sessions():
+    """Close every session and its connections, done on exit"""
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+atexit.register(close_sessions)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+
+# columns of the `getinvoicedetails` csv and their dtypes. The
+# autonomous/assisted and training sections share most of them.
+CATEGORY_COLUMNS = ['Session Type', 'System Type', 'System', 'Group']
+NUMERIC_COLUMNS = [
+    'Duration (booked)', 'Duration (used)', 'Duration',
+    'Rebate', 'Fee', 'Subsidy', 'Final Amount',
+]
+TEXT_COLUMNS = ['User', 'Account number', 'Notes', 'Start time']
+DATE_COLUMNS = ['Date']
+DATE_FORMAT = '%d/%m/%Y'
+
+INVOICE_DTYPES = dict(
+    [(c, 'category') for c in CATEGORY_COLUMNS] +
+    [(c, 'float64') for c in NUMERIC_COLUMNS] +
+    [(c, str) for c in TEXT_COLUMNS] +
+    # an invoice only covers a month, so dates are read as categories
+    # and each distinct date is parsed once
+    [(c, 'category') for c in DATE_COLUMNS]
+)
+
+
+def read_section(text, header):
+    """
+    Parse one section of the `getinvoicedetails` csv with the invoice
+    schema rather than letting pandas infer every column's type.
+
+    Parameters
+    -----------
+    text : str
+        The csv text of the section
+    header : int
+        Row number of the column names
+
+    Returns
+    --------
+        DataFrame
+    """
+    frame = pd.read_csv(
+        StringIO(text), sep=",", header=header, dtype=INVOICE_DTYPES
+    )
+    for name in DATE_COLUMNS:
+        if name in frame.columns:
+            frame[name] = _parse_dates(frame[name])
+    return frame
+
+
+def _parse_dates(column):
+    """Parse a categorical column of dates, one category at a time"""
+    dates = pd.to_datetime(
+        column.cat.categories, format=DATE_FORMAT, errors='coerce'
+    ).to_numpy(dtype='datetime64[ns]')
+    # missing dates have the code -1, which picks the NaT on the end
+    dates = np.append(dates, np.datetime64('NaT', 'ns'))
+    return pd.Series(dates[column.cat.codes.to_numpy()], index=column.index)
+
+
+def join_sections(frames):
+    """
+    Join the sections of an invoice into one DataFrame. Columns missing
+    from a section are left empty and the categories of each
+    categorical column are merged across the sections.
+    """
+    columns = []
+    for frame in frames:
+        columns.extend(c for c in frame.columns if c not in columns)
+    joined = pd.concat(
+        [frame.reindex(columns=columns) for frame in frames],
+        axis=0, ignore_index=True
+    )
+    for name in CATEGORY_COLUMNS:
+        if name in joined.columns:
+            joined[name] = joined[name].astype('category')
+    return joined
+
+
+def format_date(value):
+    """Show a session date as it appears in PPMS, e.g. 16/12/2018"""
+    if isinstance(value, str):
+        return value
+    value = pd.Timestamp(value)
+    if pd.isna(value):
+        return ""
+    return value.strftime(DATE_FORMAT)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+
+JOURNAL_FILE = "send_journal.sqlite"
+
+# states an account code goes through in a send run
+PENDING = "pending"
+RENDERED = "rendered"
+SENT = "sent"
+FAILED = "failed"
+
+# test mode sends, and sends to the group admins only, are journaled
+# under the invoice reference with these added, so they never count as
+# sent for a run to everyone
+TEST_SUFFIX = " (test)"
+ADMIN_SUFFIX = " (admins)"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ref TEXT NOT NULL,
+    started TEXT NOT NULL,
+    finished TEXT,
+    resumed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS items (
+    ref TEXT NOT NULL,
+    bcode TEXT NOT NULL,
+    state TEXT NOT NULL,
+    error TEXT,
+    run_id INTEGER NOT NULL,
+    updated TEXT NOT NULL,
+    PRIMARY KEY (ref, bcode)
+);
+"""
+
+
+def journal_ref(ref, test_mode=False, admin_only=False):
+    """The reference a send run of invoice `ref` is journaled under"""
+    if admin_only:
+        ref += ADMIN_SUFFIX
+    if test_mode:
+        ref += TEST_SUFFIX
+    return ref
+
+
+class SendJournal:
+    """Durable record of which account codes have been rendered and
+    emailed for each invoice, kept in an SQLite database in the invoices
+    folder. Every state change is committed straight away so a run that
+    fails part way can be resumed without emailing anyone twice.
+
+    A new connection is made for each call since runs happen on worker
+    threads and SQLite connections can't be shared between threads.
+
+    Attributes
+    -----------
+    path : str
+        Location of the journal database
+    """
+    def __init__(self, invoice_folder):
+        if invoice_folder and not os.path.exists(invoice_folder):
+            os.makedirs(invoice_folder)
+        self.path = os.path.join(invoice_folder, JOURNAL_FILE)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """A connection that commits on success and is always closed"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _now():
+        return datetime.now().isoformat(timespec="seconds")
+
+    def start_run(self, ref, bcodes, resume=False):
+        """
+        Record the start of a send run for the account codes `bcodes`.
+        Unless resuming, their previous states are reset to pending.
+
+        Returns
+        --------
+            the id of the run
+        """
+        now = self._now()
+        with self._connect() as conn:
+            run_id = conn.execute(
+                "INSERT INTO runs (ref, started, resumed) VALUES (?, ?, ?)",
+                (ref, now, int(resume))
+            ).lastrowid
+            if resume:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO items VALUES (?, ?, ?, NULL, ?, ?)",
+                    [(ref, bcode, PENDING, run_id, now) for bcode in bcodes]
+                )
+            else:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO items VALUES (?, ?, ?, NULL, ?, ?)",
+                    [(ref, bcode, PENDING, run_id, now) for bcode in bcodes]
+                )
+        return run_id
+
+    def finish_run(self, run_id):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE runs SET finished = ? WHERE id = ?",
+                (self._now(), run_id)
+            )
+
+    def mark(self, ref, bcode, state, run_id, error=None):
+        """Record the state of an account code"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?)",
+                (ref, bcode, state, error, run_id, self._now())
+            )
+
+    def mark_many(self, ref, bcodes, state, run_id):
+        """Record the same state for several account codes at once"""
+        now = self._now()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO items VALUES (?, ?, ?, NULL, ?, ?)",
+                [(ref, bcode, state, run_id, now) for bcode in bcodes]
+            )
+
+    def states(self, ref):
+        """
+        Returns
+        --------
+            dict mapping each account code journaled for `ref` to its state
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT bcode, state FROM items WHERE ref = ?", (ref,)
+            ).fetchall()
+        return dict(rows)
+
+    def sent(self, ref):
+        """The account codes already emailed for `ref`"""
+        return set(b for b, s in self.states(ref).items() if s == SENT)
+
+    def failures(self, ref):
+        """
+        Returns
+        --------
+            dict mapping each account code that failed for `ref` to the error
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT bcode, error FROM items WHERE ref = ? AND state = ?",
+                (ref, FAILED)
+            ).fetchall()
+        return dict(rows)
+
+
+class NullJournal:
+    """Stands in for SendJournal when no invoice folder is set. Nothing
+    is recorded and nothing counts as already sent."""
+    def start_run(self, ref, bcodes, resume=False):
+        return None
+
+    def finish_run(self, run_id):
+        pass
+
+    def mark(self, ref, bcode, state, run_id, error=None):
+        pass
+
+    def mark_many(self, ref, bcodes, state, run_id):
+        pass
+
+    def states(self, ref):
+        return {}
+
+    def sent(self, ref):
+        return set()
+
+    def failures(self, ref):
+        return {}
+
+
+def open_journal(invoice_folder):
+    """
+    The send journal in `invoice_folder`, or a NullJournal if no folder
+    is set rather than a journal in whatever the working directory is.
+    """
+    if not invoice_folder:
+        return NullJournal()
+    return SendJournal(invoice_folder)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import smtplib
+from email.message import EmailMessage
+
+from exchangelib import (
+    DELEGATE, Account, Credentials,
+    Configuration, Message, HTMLBody,
+    Mailbox, FileAttachment
+)
+
+
+def _email_message(from_address, to_addresses, cc_addresses, subject, html,
+                   attachments=None):
+    """Build a MIME message with an html body and any attachments"""
+    m = EmailMessage()
+    m["Subject"] = subject
+    m["From"] = from_address
+    m["To"] = ", ".join(to_addresses)
+    if cc_addresses:
+        m["Cc"] = ", ".join(cc_addresses)
+    m.set_content(html, subtype="html")
+    for a in attachments or []:
+        m.add_attachment(
+            a.content, maintype=a.maintype, subtype=a.subtype,
+            filename=a.filename
+        )
+    return m
+
+
+class MailTransport:
+    """Base class for the ways an invoice email can be sent.
+
+    A transport is opened once for a run, `send` is called for every
+    message and it is then closed. Transports can be used as context
+    managers.
+    """
+    def open(self):
+        pass
+
+    def send(self, to_addresses, cc_addresses, subject, html,
+             attachments=None):
+        """Send one message.
+
+        Parameters
+        -----------
+        to_addresses : list
+            Email addresses for the 'To' field
+        cc_addresses : list
+            Email addresses for the 'CC' field, can be empty
+        subject : str
+            Subject line of the message
+        html : str
+            Body of the message as html
+        attachments : list
+            Attachment instances to attach to the message, if any
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ExchangeTransport(MailTransport):
+    """Send using a Microsoft Exchange account with exchangelib. A copy
+    of every message is saved in the sent folder of the account."""
+    def __init__(self, server, username, password, from_address):
+        self.server = server
+        self.username = username
+        self.password = password
+        self.from_address = from_address
+        self.account = None
+
+    def open(self):
+        credentials = Credentials(
+            username=self.username, password=self.password
+        )
+        config = Configuration(server=self.server, credentials=credentials)
+        self.account = Account(
+            primary_smtp_address=self.from_address,
+            config=config,
+            autodiscover=False,
+            access_type=DELEGATE
+        )
+
+    def send(self, to_addresses, cc_addresses, subject, html,
+             attachments=None):
+        m = Message(
+            account=self.account,
+            folder=self.account.sent,
+            subject=subject,
+            to_recipients=[Mailbox(email_address=a) for a in to_addresses],
+            cc_recipients=[]
+        )
+        if cc_addresses:
+            m.cc_recipients = [
+                Mailbox(email_address=a) for a in cc_addresses
+            ]
+        m.body = HTMLBody(html)
+        for a in attachments or []:
+            m.attach(FileAttachment(
+                name=a.filename, content=a.content,
+                content_type=a.content_type
+            ))
+        m.send_and_save()
+
+
+class SMTPTransport(MailTransport):
+    """Send through an SMTP server using STARTTLS. The server can be
+    given as `host` or `host:port`, the port defaults to 587."""
+    def __init__(self, server, username, password, from_address):
+        host, _, port = server.partition(":")
+        self.host = host
+        self.port = int(port) if port else 587
+        self.username = username
+        self.password = password
+        self.from_address = from_address
+        self.smtp = None
+
+    def open(self):
+        self.smtp = smtplib.SMTP(self.host, self.port)
+        self.smtp.starttls()
+        if self.username:
+            self.smtp.login(self.username, self.password)
+
+    def send(self, to_addresses, cc_addresses, subject, html,
+             attachments=None):
+        m = _email_message(
+            self.from_address, to_addresses, cc_addresses, subject, html,
+            attachments
+        )
+        self.smtp.send_message(m)
+
+    def close(self):
+        if self.smtp is not None:
+            self.smtp.quit()
+            self.smtp = None
+
+
+class SinkTransport(MailTransport):
+    """Keep messages in memory, and optionally write them to a folder as
+    .eml files, instead of sending them. Used for testing and for
+    measuring the send pipeline without a mail server.
+
+    Attributes
+    -----------
+    folder : str
+        If given every message is written to this folder
+    latency : float
+        Seconds each message takes to 'send'
+    sent : list
+        The messages sent, in order
+    """
+    def __init__(self, folder=None, latency=0.0, from_address=""):
+        self.folder = folder
+        self.latency = latency
+        self.from_address = from_address
+        self.sent = []
+
+    def open(self):
+        if self.folder and not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+    def send(self, to_addresses, cc_addresses, subject, html,
+             attachments=None):
+        if self.latency:
+            time.sleep(self.latency)
+
+        m = _email_message(
+            self.from_address, to_addresses, cc_addresses, subject, html,
+            attachments
+        )
+        self.sent.append(m)
+
+        if self.folder:
+            fname = "{0:06d}.eml".format(len(self.sent))
+            with open(os.path.join(self.folder, fname), "wb") as f:
+                f.write(m.as_bytes())
+
+
+TRANSPORTS = {
+    "exchange": ExchangeTransport,
+    "smtp": SMTPTransport,
+}
+
+
+def transport_from_settings(email_settings):
+    """Create the transport selected in the email settings dialog,
+    Exchange if none has been chosen."""
+    name = email_settings.get("transport") or "exchange"
+    transport = TRANSPORTS[name]
+    return transport(
+        email_settings["server"],
+        email_settings["username"],
+        email_settings["password"],
+        email_settings["from_address"],
+    )
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+import os
+import csv
+import json
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+
+
+# upper bounds of the histogram buckets in milliseconds
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+REPORT_DIR = "reports"
+
+
+class Recorder:
+    """
+    Collects how long each stage of a run takes. Stages are recorded
+    with the `span` context manager and are named `<area>.<stage>`,
+    e.g. `pumapi.getgroup` or `render.jinja`.
+
+    Recorders are thread safe since stages run on worker threads.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.started = datetime.now()
+        self._durations = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._durations.setdefault(name, []).append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._durations = {}
+        self.started = datetime.now()
+
+    def summary(self):
+        """
+        Statistics for every stage recorded.
+
+        Returns
+        --------
+            dict keyed by stage name of dicts with the count, total,
+            mean, p50, p95 and max in seconds and the histogram counts
+            for `BUCKETS`, with a final bucket for anything longer
+        """
+        with self._lock:
+            durations = {k: sorted(v) for k, v in self._durations.items()}
+
+        summary = {}
+        for name, values in sorted(durations.items()):
+            n = len(values)
+            histogram = [0] * (len(BUCKETS) + 1)
+            for v in values:
+                histogram[bisect_left(BUCKETS, v * 1000.0)] += 1
+            summary[name] = {
+                "count": n,
+                "total": sum(values),
+                "mean": sum(values) / n,
+                "p50": values[int(0.50 * (n - 1))],
+                "p95": values[int(0.95 * (n - 1))],
+                "max": values[-1],
+                "histogram": histogram,
+            }
+        return summary
+
+    def write_report(self, folder):
+        """
+        Write the summary to a json and a csv file in a `reports`
+        folder inside `folder`.
+
+        Returns
+        --------
+            list of the paths written
+        """
+        report_dir = os.path.join(folder, REPORT_DIR)
+        if not os.path.exists(report_dir):
+            os.makedirs(report_dir)
+
+        summary = self.summary()
+        fname = "timings-{}".format(datetime.now().strftime("%Y%m%d-%H%M%S"))
+        json_path = os.path.join(report_dir, fname + ".json")
+        with open(json_path, "w") as f:
+            json.dump({
+                "started": self.started.isoformat(),
+                "buckets_ms": BUCKETS,
+                "stages": summary,
+            }, f, indent=2)
+
+        csv_path = os.path.join(report_dir, fname + ".csv")
+        bucket_names = ["<={}ms".format(b) for b in BUCKETS]
+        bucket_names.append(">{}ms".format(BUCKETS[-1]))
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                ["stage", "count", "total", "mean", "p50", "p95", "max"]
+                + bucket_names
+            )
+            for name, s in summary.items():
+                writer.writerow(
+                    [name, s["count"], s["total"], s["mean"], s["p50"],
+                     s["p95"], s["max"]] + s["histogram"]
+                )
+
+        return [json_path, csv_path]
+
+
+class NullRecorder:
+    """The default recorder, which records nothing"""
+    enabled = False
+
+    def record(self, name, seconds):
+        pass
+
+    def reset(self):
+        pass
+
+    def summary(self):
+        return {}
+
+
+_recorder = NullRecorder()
+
+
+def get_recorder():
+    return _recorder
+
+
+def set_recorder(recorder):
+    """Install the recorder used by `span`, pass None to stop recording"""
+    global _recorder
+    _recorder = recorder if recorder is not None else NullRecorder()
+
+
+@contextmanager
+def span(name):
+    """Time the body of a `with` block as the stage `name`"""
+    recorder = _recorder
+    if not recorder.enabled:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.record(name, time.perf_counter() - start)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import math
+
+import numpy as np
+
+
+# how amounts are rounded to whole pence: half a penny up (away from
+# zero) for charges, and up to the next penny for the fee and initial
+# amount columns of the invoice
+ROUND_HALF_UP = 'half_up'
+ROUND_CEILING = 'ceiling'
+
+# amounts in PPMS have a few decimal places at most, so an amount in
+# pence is snapped to a millionth of a penny before rounding. This drops
+# the binary representation error, e.g. 1.005 * 100 is
+# 100.49999999999999, and rounds the decimal the csv holds.
+PENCE_SCALE = 10 ** 6
+
+# invoice values formatted as money, and their rounding
+MONEY_FIELDS = {
+    'final_amount': ROUND_HALF_UP,
+    'initial_amount': ROUND_CEILING,
+    'fee': ROUND_CEILING,
+    'subsidy': ROUND_HALF_UP,
+}
+
+
+def to_pence(amounts, rounding=ROUND_HALF_UP):
+    """
+    Round amounts in pounds to whole pence, all at once.
+
+    Parameters
+    -----------
+    amounts : array-like of float
+        Amounts in pounds. Missing amounts (NaN) count as zero.
+    rounding : str
+        ROUND_HALF_UP or ROUND_CEILING
+
+    Returns
+    --------
+        numpy array of int64 pence
+    """
+    pence = np.rint(
+        np.asarray(amounts, dtype='float64') * 100 * PENCE_SCALE
+    ) / PENCE_SCALE
+    if rounding == ROUND_CEILING:
+        pence = np.ceil(pence)
+    elif rounding == ROUND_HALF_UP:
+        pence = np.copysign(np.floor(np.abs(pence) + 0.5), pence)
+    else:
+        raise ValueError("unknown rounding {!r}".format(rounding))
+    return np.nan_to_num(pence).astype('int64')
+
+
+def format_pence(pence):
+    """Whole pence as pounds with two decimals, e.g. 1250 as '12.50'"""
+    # k / 100 is always the nearest float to the exact amount, so
+    # formatting it to two decimals is exact
+    pounds = np.asarray(pence, dtype='int64') / 100.0
+    return list(map('{:.2f}'.format, pounds.tolist()))
+
+
+def format_money(amounts, rounding=ROUND_HALF_UP):
+    """
+    Round and format a column of amounts for the invoice in one pass.
+    Missing amounts (NaN) are left empty.
+
+    Returns
+    --------
+        list of str
+    """
+    values = np.asarray(amounts, dtype='float64')
+    formatted = format_pence(to_pence(values, rounding))
+    missing = np.flatnonzero(np.isnan(values))
+    for i in missing.tolist():
+        formatted[i] = ''
+    return formatted
+
+
+def format_amount(amount, rounding=ROUND_HALF_UP):
+    """
+    `format_money` for a single amount. The same float operations are
+    done one value at a time, which is quicker than numpy for a few
+    values and gives the same result.
+    """
+    amount = float(amount)
+    if math.isnan(amount):
+        return ''
+    # round() and np.rint both round half to even
+    pence = round(amount * 100 * PENCE_SCALE) / PENCE_SCALE
+    if rounding == ROUND_CEILING:
+        pence = math.ceil(pence)
+    elif rounding == ROUND_HALF_UP:
+        pence = math.copysign(math.floor(abs(pence) + 0.5), pence)
+    else:
+        raise ValueError("unknown rounding {!r}".format(rounding))
+    return '{:.2f}'.format(int(pence) / 100.0)
+
+
+def to_pounds(pence):
+    """Whole pence as pounds, the nearest float to each exact amount"""
+    return np.asarray(pence, dtype='int64') / 100.0
+
+
+def total_pence(amounts, rounding=ROUND_HALF_UP):
+    """
+    The total of amounts as they appear on the invoice, i.e. the sum
+    of each amount rounded to pence, so a total always adds up to the
+    rows above it.
+    """
+    return int(to_pence(amounts, rounding).sum())
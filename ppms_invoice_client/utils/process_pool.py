@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+import atexit
+import itertools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import metrics
+from .profiler import profile_folder, run_profiled
+
+
+# messages sent back from a job, besides its signals
+TIMING = "timing"
+DONE = "done"
+# seconds to wait for the messages of a job that failed before it
+# may have started, e.g. because its arguments couldn't be pickled
+FAILED_FLUSH_SECONDS = 1.0
+
+# the queue back to the parent, in a pool process
+_queue = None
+
+
+def _init_process(queue):
+    global _queue
+    _queue = queue
+
+
+class QueueSignal:
+    """
+    Stands in for a worker signal in a pool process. Anything emitted
+    is sent back to the parent through the queue and emitted there by
+    the job's own signal.
+    """
+    def __init__(self, job_id, name):
+        self.job_id = job_id
+        self.name = name
+
+    def emit(self, value):
+        _queue.put((self.job_id, self.name, value))
+
+
+class QueueRecorder:
+    """Sends the stages timed in a pool process to the parent's Recorder"""
+    enabled = True
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def record(self, name, seconds):
+        _queue.put((self.job_id, TIMING, (name, seconds)))
+
+
+def _run_job(job_id, callback, args, kwargs, folder, record_timings):
+    """Run a job in a pool process, see `ProcessPool.run`"""
+    kwargs = dict(kwargs)
+    kwargs['progress_callback'] = QueueSignal(job_id, 'progress')
+    kwargs['custom_callback'] = QueueSignal(job_id, 'custom_callback')
+    if record_timings:
+        metrics.set_recorder(QueueRecorder(job_id))
+    try:
+        if folder:
+            return run_profiled(folder, callback, *args, **kwargs)
+        return callback(*args, **kwargs)
+    finally:
+        metrics.set_recorder(None)
+        # sent last, so the parent knows everything emitted has arrived
+        _queue.put((job_id, DONE, None))
+
+
+class ProcessPool:
+    """
+    Runs CPU-heavy jobs in a pool of processes so they use every core
+    and don't hold the GIL the GUI needs. The pool is started on first
+    use and kept for later jobs.
+
+    Jobs, their arguments and results must be picklable, so the job
+    is a module level function. What a job emits through its
+    `progress_callback` and `custom_callback`, and the stages it times
+    while a Recorder is installed, come back through one queue and are
+    handed to the job's signals by a thread in the parent.
+
+    Processes are spawned rather than forked, as forking a process
+    running Qt and other threads isn't safe.
+    """
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._jobs = {}
+        self._executor = None
+        self._queue = None
+        self._reader = None
+
+    def _start(self):
+        context = multiprocessing.get_context("spawn")
+        self._queue = context.Queue()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=context,
+            initializer=_init_process, initargs=(self._queue,)
+        )
+        self._reader = threading.Thread(
+            target=self._forward, args=(self._queue,), daemon=True
+        )
+        self._reader.start()
+
+    def _forward(self, queue):
+        """Hand the messages from the pool processes to their jobs"""
+        while True:
+            message = queue.get()
+            if message is None:
+                return
+            job_id, name, value = message
+            with self._lock:
+                job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            signals, done = job
+            if name == DONE:
+                done.set()
+            elif name == TIMING:
+                metrics.get_recorder().record(*value)
+            else:
+                getattr(signals, name).emit(value)
+
+    def run(self, signals, callback, *args, **kwargs):
+        """
+        Run `callback(*args, **kwargs)` in a pool process and return
+        its result, or raise its exception. Blocks until the job ends.
+
+        Parameters
+        -----------
+        signals : WorkerSignals
+            The job's `progress_callback` and `custom_callback` are
+            emitted through its `progress` and `custom_callback`
+            signals. Everything emitted is passed on before this
+            returns.
+        """
+        job_id = next(self._ids)
+        done = threading.Event()
+        with self._lock:
+            if self._executor is None:
+                self._start()
+            executor = self._executor
+            self._jobs[job_id] = (signals, done)
+        try:
+            future = executor.submit(
+                _run_job, job_id, callback, args, kwargs,
+                profile_folder(), metrics.get_recorder().enabled
+            )
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                # a process died, start a new pool for the next job
+                self._reset(executor)
+                raise
+            except Exception:
+                done.wait(FAILED_FLUSH_SECONDS)
+                raise
+            done.wait()
+            return result
+        finally:
+            with self._lock:
+                del self._jobs[job_id]
+
+    def _reset(self, executor):
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._stop()
+
+    def _stop(self):
+        self._executor.shutdown(wait=False)
+        self._queue.put(None)
+        self._executor = self._queue = self._reader = None
+
+    def shutdown(self):
+        """Stop the pool processes, a new pool starts with the next job"""
+        with self._lock:
+            if self._executor is not None:
+                self._stop()
+
+
+_pool = ProcessPool()
+atexit.register(_pool.shutdown)
+
+
+def get_pool():
+    return _pool
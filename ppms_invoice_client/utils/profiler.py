@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import inspect
+import cProfile
+from datetime import datetime
+
+
+# set to a folder to profile every worker job, "1" uses ./profiles
+PROFILE_ENV = "PPMS_PROFILE"
+PROFILE_DIR = "profiles"
+
+# arguments of the thread functions that identify the invoice
+REF_ARGS = ("ref", "invoice_ref", "refs")
+
+_folder = None
+
+
+def set_folder(folder):
+    """Profile worker jobs into `folder`, pass None to stop profiling"""
+    global _folder
+    _folder = folder
+
+
+def profile_folder():
+    """
+    The folder profiles are written to, or None if profiling is off.
+    The PPMS_PROFILE environment variable takes precedence over the
+    folder set from the settings.
+    """
+    env = os.environ.get(PROFILE_ENV, "")
+    if env:
+        return PROFILE_DIR if env == "1" else env
+    return _folder
+
+
+def _invoice_ref(callback, args, kwargs):
+    try:
+        bound = inspect.signature(callback).bind_partial(*args, **kwargs)
+    except (TypeError, ValueError):
+        return ""
+    for name in REF_ARGS:
+        value = bound.arguments.get(name)
+        if isinstance(value, str):
+            return value
+        if isinstance(value, (list, tuple)) and value:
+            return "{}-{}".format(value[0], value[-1])
+    return ""
+
+
+def profile_name(callback, args, kwargs):
+    """
+    File name, without extension, for a profile of `callback`, made from
+    the time, the callback name and the invoice ref it was called with.
+    """
+    parts = [datetime.now().strftime("%Y%m%d-%H%M%S-%f"),
+             callback.__name__.strip("_")]
+    ref = _invoice_ref(callback, args, kwargs)
+    if ref:
+        parts.append(ref)
+    return re.sub(r"[^\w.-]+", "_", "-".join(parts))
+
+
+def run_profiled(folder, callback, *args, **kwargs):
+    """
+    Run `callback` under a profiler and save the profile in `folder`.
+
+    pyinstrument, a sampling profiler, is used when it is installed and
+    writes a speedscope json file that can be viewed as a flame graph.
+    Otherwise cProfile writes a `.prof` file which can be read with
+    pstats, snakeviz or flameprof. Both only see the thread the job
+    runs on, so PUMAPI calls made from a thread pool show as waits.
+
+    Returns
+    --------
+        the value returned by `callback`
+    """
+    if not os.path.exists(folder):
+        os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, profile_name(callback, args, kwargs))
+
+    try:
+        from pyinstrument import Profiler
+        from pyinstrument.renderers import SpeedscopeRenderer
+    except ImportError:
+        Profiler = None
+
+    if Profiler is not None:
+        profiler = Profiler()
+        profiler.start()
+        try:
+            return callback(*args, **kwargs)
+        finally:
+            profiler.stop()
+            with open(path + ".speedscope.json", "w") as f:
+                f.write(profiler.output(renderer=SpeedscopeRenderer()))
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return callback(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path + ".prof")
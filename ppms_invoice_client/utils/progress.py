@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+
+# status of the item an event reports on
+STARTED = "started"
+DONE = "done"
+CACHED = "cached"
+FAILED = "failed"
+
+
+class ProgressEvent:
+    """
+    A snapshot of how far a stage of a long-running job has got, emitted
+    through a worker's progress signal each time an item is finished.
+
+    Attributes
+    ----------
+    stage: str
+        Name of the stage, e.g. 'download', 'render' or 'send'
+    completed: int
+        Number of items finished so far
+    total: int
+        Number of items in the stage
+    nbytes: int
+        Bytes handled so far, e.g. downloaded or sent
+    elapsed: float
+        Seconds since the stage started
+    item: str
+        The item this event reports on, e.g. an account code
+    status: str
+        What happened to the item, one of STARTED, DONE, CACHED or FAILED
+    """
+    def __init__(self, stage, completed, total, nbytes=0, elapsed=0.0,
+                 item=None, status=DONE):
+        self.stage = stage
+        self.completed = completed
+        self.total = total
+        self.nbytes = nbytes
+        self.elapsed = elapsed
+        self.item = item
+        self.status = status
+
+    @property
+    def items_per_sec(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return self.completed / self.elapsed
+
+    @property
+    def bytes_per_sec(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return self.nbytes / self.elapsed
+
+    @property
+    def eta(self):
+        """Estimated seconds until the stage finishes, None if unknown"""
+        if self.completed == 0 or self.completed > self.total:
+            return None
+        return (self.total - self.completed) * self.elapsed / self.completed
+
+    @property
+    def finished(self):
+        return self.completed >= self.total
+
+    def describe(self):
+        """A one line description, e.g. for a status bar"""
+        text = "{}: {}/{}".format(self.stage, self.completed, self.total)
+        if self.completed:
+            text += ", {:.1f} items/s".format(self.items_per_sec)
+        if self.eta:
+            text += ", about {:.0f}s left".format(self.eta)
+        if self.item is not None and self.status != DONE:
+            text += " ({} {})".format(self.item, self.status)
+        return text
+
+    def __repr__(self):
+        return "ProgressEvent({}, {}/{}, {})".format(
+            self.stage, self.completed, self.total, self.status
+        )
+
+
+class ProgressTracker:
+    """
+    Counts the items finished in one stage of a job and emits a
+    ProgressEvent for each through `signal`, normally the worker's
+    progress_callback. If `signal` is None nothing is emitted.
+    """
+    def __init__(self, stage, total, signal=None):
+        self.stage = stage
+        self.total = total
+        self.signal = signal
+        self.completed = 0
+        self.nbytes = 0
+        self.start_time = time.perf_counter()
+        self._emit(None, STARTED)
+
+    def advance(self, item=None, status=DONE, nbytes=0):
+        """Record that `item` has finished"""
+        self.completed += 1
+        self.nbytes += nbytes
+        self._emit(item, status)
+
+    def _emit(self, item, status):
+        if self.signal is None:
+            return
+        self.signal.emit(ProgressEvent(
+            self.stage, self.completed, self.total, self.nbytes,
+            time.perf_counter() - self.start_time, item, status
+        ))
+
+
+class LabelledSignal:
+    """
+    Stands in for a progress signal and passes each ProgressEvent on to
+    `signal` with its stage prefixed by `label`, so jobs running side by
+    side, e.g. one per facility in a batch, show as separate stages.
+    """
+    def __init__(self, label, signal):
+        self.label = label
+        self.signal = signal
+
+    def emit(self, event):
+        if self.signal is None:
+            return
+        event.stage = "{} {}".format(self.label, event.stage)
+        self.signal.emit(event)
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import copy
 from datetime import datetime
 import json
 
@@ -100,6 +101,20 @@ class Recipient:
     def send_only_admin(self, value):
         self._send_only_admin = value
 
+    def for_bcode(self, bcode):
+        """
+        A copy of the recipient for one account code on an invoice.
+        The group details are shared with this recipient but the state
+        of the invoice item (`bcode`, `invoice`, `cc_admin` and
+        `send_only_admin`) belongs to the copy.
+        """
+        recipient = copy.copy(self)
+        recipient._bcode = bcode
+        recipient._invoice = None
+        recipient._cc_admin = False
+        recipient._send_only_admin = False
+        return recipient
+
     def __repr__(self):
         """"""
         return "<Recipient: {0}>".format(self.heademail)
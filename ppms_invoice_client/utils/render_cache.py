@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+
+def render_key(ref, folder, message_text, facility_info, invoice_columns):
+    """
+    Everything besides the InvoiceItem that goes into rendering its
+    invoice, as a hashable key. A cached render is only used while the
+    key is the same, so changing the template or facility settings
+    makes the invoices render again.
+    """
+    return (
+        ref, folder, message_text,
+        tuple(sorted(facility_info.items())),
+        tuple(sorted(invoice_columns.items())),
+    )
+
+
+class RenderCache:
+    """
+    Invoices rendered in the background after an invoice is fetched
+    (see `threads._prerenderItem`), so sending doesn't have to wait
+    for every selected item to render.
+
+    Entries are kept per account code and only used for the same
+    InvoiceItem rendered with the same `render_key`. `invalidate` drops
+    every entry and starts a new generation, renders started in an
+    older generation are discarded when they finish.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.generation = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def current(self, generation):
+        """Whether renders started in `generation` are still wanted"""
+        return generation == self.generation
+
+    def get(self, item, key):
+        """The rendered content of `item` for `key`, or None"""
+        with self._lock:
+            entry = self._entries.get(item.bcode)
+        if entry is None:
+            return None
+        cached_item, cached_key, content = entry
+        if cached_item is not item or cached_key != key:
+            return None
+        return content
+
+    def put(self, item, key, content, generation):
+        """
+        Cache the rendered content of `item`, unless the cache was
+        invalidated since the render started.
+
+        Returns
+        --------
+            True if the content was cached
+        """
+        with self._lock:
+            if generation != self.generation:
+                return False
+            self._entries[item.bcode] = (item, key, content)
+            return True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -1,14 +1,74 @@
 # -*- coding: utf-8 -*-
 
-import os
-from exchangelib import (
-    DELEGATE, Account, Credentials,
-    Configuration, Message, HTMLBody,
-    Mailbox
-)
+from .attachments import invoice_attachments
+from .mail_transport import transport_from_settings
+from .metrics import span
+from .progress import ProgressTracker, FAILED
 
 
-def send(recipients, invoice_ref, email_settings, progress=None):
+# how the sessions of an invoice are delivered: in the body of the
+# email, attached to a short summary, or attached only when the email
+# would be larger than the `attach_threshold` setting
+DELIVERY_INLINE = "inline"
+DELIVERY_ATTACH = "attachment"
+DELIVERY_AUTO = "auto"
+ATTACH_THRESHOLD = 1024 * 1024
+
+
+def _addresses(recipient, email_settings):
+    """Work out the 'To' and 'CC' addresses for a recipient.
+
+    Returns
+    --------
+        tuple of lists of 'To' and 'CC' addresses
+    """
+    if email_settings["test_mode"]:
+        return [email_settings["test_address"]], []
+
+    to_address = list(recipient.addresses["to_email"])
+    cc_address = list(recipient.addresses["cc_email"])
+    if email_settings["copy_manager"]:
+        cc_address.append(email_settings["manager_address"])
+
+    if recipient.group.send_only_admin:
+        to_address = list(recipient.addresses["cc_email"])
+        cc_address = []
+
+    return to_address, cc_address
+
+
+def attach_sessions(html, email_settings):
+    """Whether to attach the sessions rather than send `html` as the
+    body of the email, see DELIVERY_AUTO"""
+    delivery = email_settings.get("delivery") or DELIVERY_INLINE
+    if delivery == DELIVERY_AUTO:
+        threshold = email_settings.get("attach_threshold", ATTACH_THRESHOLD)
+        return len(html.encode("utf-8")) > threshold
+    return delivery == DELIVERY_ATTACH
+
+
+def _content(recipient, invoice_ref, email_settings):
+    """The body and attachments of the email for a recipient.
+
+    Returns
+    --------
+        tuple of the html body and a list of Attachment, empty
+        when the invoice is sent in the body
+    """
+    summary_html = getattr(recipient, "summary_html", None)
+    if summary_html is None or not attach_sessions(
+            recipient.html, email_settings):
+        return recipient.html, []
+    name = "invoice_{0}-{1}".format(invoice_ref, recipient.bcode)
+    attachments = invoice_attachments(
+        recipient, name.replace('|', '-'),
+        pdf=email_settings.get("attach_pdf", False)
+    )
+    return summary_html, attachments
+
+
+def send(recipients, invoice_ref, email_settings, progress=None,
+         transport=None, on_result=None):
     """Construct email from Recipient object and send.
 
     Parameters
@@ -18,70 +78,54 @@ def send(recipients, invoice_ref, email_settings, progress=None):
     invoice_ref : str
         Identifier of the invoice being emailed
     email_settings : dict
-        configuration settings for exchange server
-    progress: PyQt progress bar
+        configuration settings for the mail server
+    progress: PyQt progress signal
+        Emits a ProgressEvent for the 'send' stage as each message is sent
+    transport : MailTransport
+        How to send the messages, by default the transport chosen
+        in the email settings
+    on_result : callable
+        Called as `on_result(recipient, error)` after each message, with
+        error None if it was sent. When given, a failed message doesn't
+        stop the rest being sent.
+
+    Invoices are sent in the body of the email unless the `delivery`
+    email setting says to attach them, in which case the body is the
+    recipient's `summary_html` and the invoice and a csv of its
+    sessions are attached as a zip file (see `attach_sessions`).
     """
-    username = email_settings["username"]
-    password = email_settings["password"]
+    if transport is None:
+        transport = transport_from_settings(email_settings)
 
-    credentials = Credentials(username=username, password=password)
+    subject = 'NIC@KCL: Invoice {0}'.format(invoice_ref)
+    tracker = ProgressTracker('send', len(recipients), progress)
+    with span('send.connect'):
+        transport.open()
+    try:
+        for recipient in recipients:
+            print(recipient.bcode)
 
-    config = Configuration(
-        server=email_settings["server"],
-        credentials=credentials
-    )
-    account = Account(
-        primary_smtp_address=email_settings["from_address"],
-        config=config,
-        autodiscover=False,
-        access_type=DELEGATE
-    )
-    cc_address = None
-    for rid, recipient in enumerate(recipients):
-        print(recipient.bcode)
-
-        if email_settings["test_mode"]:
-            to_address = [
-                Mailbox(email_address=email_settings["test_address"])
-            ]
-        else:
-            to_address = [
-                Mailbox(email_address=address)
-                for address in recipient.addresses["to_email"]
-            ]
-            cc_address = [
-                Mailbox(email_address=address)
-                for address in recipient.addresses["cc_email"]
-            ]
-            if email_settings["copy_manager"]:
-               cc_address.append(
-                   Mailbox(email_address=email_settings["manager_address"])
-               )
-
-            if recipient.group.send_only_admin:
-                address = [
-                    Mailbox(email_address=address)
-                    for address in recipient.addresses["cc_email"]
-                ]
-                cc_address = ""
- 
-        m = Message(
-            account=account,
-            folder=account.sent,
-            subject=(
-                'NIC@KCL: Invoice {0}'
-                .format(invoice_ref)
-            ),
-            to_recipients=to_address,
-            cc_recipients=[]
-        )
-        if cc_address:
-            m.cc_recipients = cc_address
-
-        print("address: {}".format(m.to_recipients))
-        print("cc_address: {}".format(m.cc_recipients))
-        m.body = HTMLBody(recipient.html)
-        m.send_and_save()
-        
-        if progress is not None:
-            progress.emit(rid)
+            to_address, cc_address = _addresses(recipient, email_settings)
+            print("address: {}".format(to_address))
+            print("cc_address: {}".format(cc_address))
+            try:
+                body, attachments = _content(
+                    recipient, invoice_ref, email_settings
+                )
+                with span('send.message'):
+                    transport.send(
+                        to_address, cc_address, subject, body,
+                        attachments=attachments
+                    )
+            except Exception as err:
+                tracker.advance(recipient.bcode, FAILED)
+                if on_result is None:
+                    raise
+                on_result(recipient, err)
+                continue
+            nbytes = len(body) + sum(len(a) for a in attachments)
+            tracker.advance(recipient.bcode, nbytes=nbytes)
+            if on_result is not None:
+                on_result(recipient, None)
+    finally:
+        transport.close()
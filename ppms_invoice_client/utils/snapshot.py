@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import os
+import gzip
+import json
+from datetime import datetime
+
+
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_EXT = ".json.gz"
+
+
+class SnapshotStore:
+    """Local archive of invoices fetched from PPMS. Only finalised
+    invoices are stored since DRAFT invoices change during the month.
+
+    Each invoice is kept as a single gzip compressed json file holding
+    the raw `getinvoicedetails` payload and the `getgroup` payload of
+    every group on the invoice, so it can be replayed through the same
+    parsing code as a live PUMAPI call.
+
+    Attributes
+    -----------
+    folder : str
+        Directory holding the snapshots, a `snapshots` folder
+        inside the invoices folder
+    """
+    def __init__(self, invoice_folder):
+        self.folder = os.path.join(invoice_folder, SNAPSHOT_DIR)
+
+    @staticmethod
+    def is_final(ref):
+        return 'DRAFT' not in ref
+
+    def path(self, ref):
+        fname = ref.replace('|', '-') + SNAPSHOT_EXT
+        return os.path.join(self.folder, fname)
+
+    def has(self, ref):
+        return os.path.exists(self.path(ref))
+
+    def refs(self):
+        """References of all invoices in the store, newest first"""
+        if not os.path.exists(self.folder):
+            return []
+        refs = [
+            f[:-len(SNAPSHOT_EXT)] for f in os.listdir(self.folder)
+            if f.endswith(SNAPSHOT_EXT)
+        ]
+        return sorted(refs, reverse=True)
+
+    def save(self, ref, details, groups):
+        """Write a snapshot of an invoice.
+
+        Parameters
+        -----------
+        ref : str
+            The invoice reference
+        details : str
+            Raw text returned by the `getinvoicedetails` call
+        groups : dict
+            Raw json text returned by the `getgroup` call keyed
+            by the group unitlogin
+        """
+        if not self.is_final(ref):
+            raise ValueError("Only final invoices can be saved as snapshots")
+
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+        snapshot = {
+            "ref": ref,
+            "saved": datetime.now().isoformat(),
+            "details": details,
+            "groups": groups,
+        }
+        # write to a temporary file first so a crash can't leave
+        # a half written snapshot behind
+        path = self.path(ref)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def load(self, ref):
+        """Read a snapshot of an invoice.
+
+        Returns
+        --------
+            tuple of the raw invoice details text and a dict
+            of raw group json text keyed by unitlogin
+        """
+        with gzip.open(self.path(ref), 'rt', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        return snapshot["details"], snapshot["groups"]
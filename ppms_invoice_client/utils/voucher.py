@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+import os
+import csv
+
+from openpyxl import Workbook
+
+
+# column headings of the finance voucher template
+VOUCHER_COLUMNS = ['Description', 'Amounnt', 'account code', 'activity code']
+VOUCHER_SHEET = 'Voucher Data'
+
+# account codes for the charge to the group and the
+# matching credit to the facility
+TRANSACTION_ACCOUNT = 4213
+FACILITY_ACCOUNT = 4113
+
+# number of rows written to parquet at a time
+PARQUET_BATCH = 10000
+
+
+def voucher_rows(items, facility_code, sessions_month, sessions_year):
+    """
+    Generate the finance voucher rows for InvoiceItems. Each item gives
+    a charge to its account code followed by a credit of the same amount
+    to the facility.
+
+    Parameters
+    -----------
+    items : iterable
+        InvoiceItem instances
+    facility_code : str
+        The facility account code
+    sessions_month : str
+        Name of the month the sessions took place in
+    sessions_year : str
+        Year the sessions took place in
+
+    Yields
+    -------
+        tuple of description, amount, account code and activity code
+    """
+    period = '{} {}'.format(sessions_month, sessions_year)
+    for item in items:
+        for row in _charge_rows(period, item.final_amount,
+                                item.group.heademail, item.bcode,
+                                facility_code):
+            yield row
+
+
+def total_rows(periods, amounts, head_emails, bcodes, facility_code):
+    """
+    Generate finance voucher rows from columns of charge totals, such
+    as the per account code sums of a consolidated export.
+
+    Parameters
+    -----------
+    periods : iterable
+        Description of the period each total covers, e.g. 'December 2019'
+    amounts : iterable
+        The total charged to each account code
+    head_emails : iterable
+        Email address of the group head for each total
+    bcodes : iterable
+        The account code for each total
+    facility_code : str
+        The facility account code
+
+    Yields
+    -------
+        tuple of description, amount, account code and activity code
+    """
+    for period, amount, head_email, bcode in zip(
+            periods, amounts, head_emails, bcodes):
+        for row in _charge_rows(period, float(amount), head_email, bcode,
+                                facility_code):
+            yield row
+
+
+def _charge_rows(period, amount, head_email, bcode, facility_code):
+    description = 'NIC charges for {} for {}'.format(period, head_email)
+    yield (description, amount, TRANSACTION_ACCOUNT, bcode)
+    yield (description, amount * -1, FACILITY_ACCOUNT, facility_code)
+
+
+def write_xlsx(path, rows):
+    """Stream rows into an Excel workbook using openpyxl's write-only
+    mode, so memory use doesn't grow with the number of rows."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(VOUCHER_SHEET)
+    ws.append(VOUCHER_COLUMNS)
+    n = 0
+    for row in rows:
+        ws.append(row)
+        n += 1
+    wb.save(path)
+    return n
+
+
+def write_csv(path, rows):
+    n = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(VOUCHER_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            n += 1
+    return n
+
+
+def write_parquet(path, rows):
+    """Write rows to parquet in batches. Needs pyarrow to be installed."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("pyarrow is needed to export parquet files")
+
+    schema = pa.schema([
+        (VOUCHER_COLUMNS[0], pa.string()),
+        (VOUCHER_COLUMNS[1], pa.float64()),
+        (VOUCHER_COLUMNS[2], pa.int64()),
+        (VOUCHER_COLUMNS[3], pa.string()),
+    ])
+
+    def write_batch(writer, batch):
+        columns = [list(c) for c in zip(*batch)]
+        writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+
+    n = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == PARQUET_BATCH:
+                write_batch(writer, batch)
+                n += len(batch)
+                batch = []
+        if batch:
+            write_batch(writer, batch)
+            n += len(batch)
+    return n
+
+
+WRITERS = {
+    'xlsx': write_xlsx,
+    'csv': write_csv,
+    'parquet': write_parquet,
+}
+
+
+def write_voucher(path, rows):
+    """
+    Write voucher rows to `path`, the format is taken from the
+    file extension (xlsx, csv or parquet).
+
+    Returns
+    --------
+        The number of rows written
+    """
+    ext = os.path.splitext(path)[1].lstrip('.').lower()
+    if ext not in WRITERS:
+        raise ValueError("Unknown voucher format: {}".format(ext))
+    return WRITERS[ext](path, rows)